@@ -3,6 +3,7 @@
 
 import logging
 import sys
+from pathlib import Path
 
 import click
 import requests
@@ -12,13 +13,17 @@ from bdfr.archiver import Archiver
 from bdfr.cloner import RedditCloner
 from bdfr.completion import Completion
 from bdfr.configuration import Configuration
+from bdfr.deduplicator import Deduplicator
 from bdfr.downloader import RedditDownloader
+from bdfr.scheme_migrator import SchemeMigrator
+from bdfr.verifier import Verifier
 
 logger = logging.getLogger()
 
 _common_options = [
     click.argument("directory", type=str),
     click.option("--authenticate", is_flag=True, default=None),
+    click.option("--combine-subreddits", is_flag=True, default=None),
     click.option("--config", type=str, default=None),
     click.option("--disable-module", multiple=True, default=None, type=str),
     click.option("--exclude-id", default=None, multiple=True),
@@ -28,10 +33,13 @@ _common_options = [
     click.option("--folder-scheme", default=None, type=str),
     click.option("--ignore-user", type=str, multiple=True, default=None),
     click.option("--include-id-file", multiple=True, default=None),
+    click.option("--incremental", is_flag=True, default=None),
+    click.option("--listing-threads", type=int, default=None),
     click.option("--log", type=str, default=None),
     click.option("--opts", type=str, default=None),
     click.option("--saved", is_flag=True, default=None),
     click.option("--search", default=None, type=str),
+    click.option("--storage", type=click.Choice(("local", "s3")), default=None),
     click.option("--submitted", is_flag=True, default=None),
     click.option("--subscribed", is_flag=True, default=None),
     click.option("--time-format", type=str, default=None),
@@ -49,13 +57,24 @@ _common_options = [
 ]
 
 _downloader_options = [
+    click.option("--download-index", type=str, default=None),
+    click.option("--exclude-hash-file", type=str, multiple=True, default=None),
+    click.option("--hash-index", type=str, default=None),
+    click.option("--index-root", type=str, multiple=True, default=None),
     click.option("--make-hard-links", is_flag=True, default=None),
+    click.option("--make-reflinks", is_flag=True, default=None),
     click.option("--max-wait-time", type=int, default=None),
     click.option("--no-dupes", is_flag=True, default=None),
+    click.option("--pack-format", type=click.Choice(("tar", "zip")), default=None),
+    click.option("--pack-max-count", type=int, default=None),
+    click.option("--pack-max-size", type=int, default=None),
+    click.option("--preview-width", type=int, default=None),
+    click.option("--revalidate-urls", is_flag=True, default=None),
     click.option("--search-existing", is_flag=True, default=None),
     click.option("--skip", default=None, multiple=True),
     click.option("--skip-domain", default=None, multiple=True),
     click.option("--skip-subreddit", default=None, multiple=True),
+    click.option("--watch-index", is_flag=True, default=None),
     click.option("--min-score", type=int, default=None),
     click.option("--max-score", type=int, default=None),
     click.option("--min-score-ratio", type=float, default=None),
@@ -69,6 +88,15 @@ _archiver_options = [
 ]
 
 
+_migrator_options = [
+    click.option("--download-index", type=str, default=None),
+    click.option("--hash-index", type=str, default=None),
+    click.option("--make-hard-links", is_flag=True, default=None),
+    click.option("--old-file-scheme", type=str, default=None),
+    click.option("--old-folder-scheme", type=str, default=None),
+]
+
+
 def _add_options(opts: list):
     def wrap(func):
         for opt in opts:
@@ -166,6 +194,73 @@ def cli_clone(context: click.Context, **_):
         logger.info("Program complete")
 
 
+@cli.command("migrate-scheme")
+@_add_options(_common_options)
+@_add_options(_migrator_options)
+@click.help_option("-h", "--help")
+@click.pass_context
+def cli_migrate_scheme(context: click.Context, **_):
+    """Moves downloaded files to the paths given by new file and folder schemes."""
+    config = Configuration()
+    config.process_click_arguments(context)
+    silence_module_loggers()
+    stream = make_console_logging_handler(config.verbose)
+    try:
+        scheme_migrator = SchemeMigrator(config, [stream])
+        scheme_migrator.download()
+    except Exception:
+        logger.exception("Migrator exited unexpectedly")
+        raise
+    else:
+        logger.info("Program complete")
+
+
+@cli.command("verify")
+@click.argument("directory", type=str)
+@click.option("--hash-index", type=str, required=True)
+@click.option("--state-file", type=str, default=None)
+@click.option("--threads", type=int, default=None)
+@click.option("-v", "--verbose", default=None, count=True)
+@click.help_option("-h", "--help")
+@click.pass_context
+def cli_verify(
+    context: click.Context,
+    directory: str,
+    hash_index: str,
+    state_file: str,
+    threads: int,
+    verbose: int,
+):
+    """Checks downloaded files against the hashes in a hash index."""
+    stream = make_console_logging_handler(verbose or 0)
+    logger.addHandler(stream)
+    try:
+        verifier = Verifier(Path(directory), Path(hash_index), Path(state_file) if state_file else None, threads)
+        report = verifier.verify()
+    except Exception:
+        logger.exception("Verifier exited unexpectedly")
+        raise
+    if report.problems:
+        context.exit(1)
+
+
+@cli.command("dedupe")
+@click.argument("directory", type=str)
+@click.option("--dry-run", is_flag=True, default=False)
+@click.option("--reflink", is_flag=True, default=False)
+@click.option("-v", "--verbose", default=None, count=True)
+@click.help_option("-h", "--help")
+def cli_dedupe(directory: str, dry_run: bool, reflink: bool, verbose: int):
+    """Replaces identical files in a directory with links to a single copy."""
+    stream = make_console_logging_handler(verbose or 0)
+    logger.addHandler(stream)
+    try:
+        Deduplicator(Path(directory), reflink, dry_run).deduplicate()
+    except Exception:
+        logger.exception("Deduplicator exited unexpectedly")
+        raise
+
+
 @cli.command("completion")
 @click.argument("shell", type=click.Choice(("all", "bash", "fish", "zsh"), case_sensitive=False), default="all")
 @click.help_option("-h", "--help")
@@ -5,8 +5,6 @@ import json
 import logging
 import re
 from collections.abc import Iterable, Iterator
-from pathlib import Path
-from time import sleep
 from typing import Union
 
 import dict2xml
@@ -17,6 +15,7 @@ import yaml
 from bdfr.archive_entry.base_archive_entry import BaseArchiveEntry
 from bdfr.archive_entry.comment_archive_entry import CommentArchiveEntry
 from bdfr.archive_entry.submission_archive_entry import SubmissionArchiveEntry
+from bdfr.batch_fetcher import BatchFetcher
 from bdfr.configuration import Configuration
 from bdfr.connector import RedditConnector
 from bdfr.exceptions import ArchiverError
@@ -30,40 +29,38 @@ class Archiver(RedditConnector):
         super(Archiver, self).__init__(args, logging_handlers)
 
     def download(self):
-        for generator in self.reddit_lists:
-            try:
-                for submission in generator:
-                    try:
-                        if (submission.author and submission.author.name in self.args.ignore_user) or (
-                            submission.author is None and "DELETED" in self.args.ignore_user
-                        ):
-                            logger.debug(
-                                f"Submission {submission.id} in {submission.subreddit.display_name} skipped due to"
-                                f" {submission.author.name if submission.author else 'DELETED'} being an ignored user"
-                            )
-                            continue
-                        if submission.id in self.excluded_submission_ids:
-                            logger.debug(f"Object {submission.id} in exclusion list, skipping")
-                            continue
-                        logger.debug(f"Attempting to archive submission {submission.id}")
-                        self.write_entry(submission)
-                    except prawcore.PrawcoreException as e:
-                        logger.error(f"Submission {submission.id} failed to be archived due to a PRAW exception: {e}")
-            except prawcore.PrawcoreException as e:
-                logger.error(f"The submission after {submission.id} failed to download due to a PRAW exception: {e}")
-                logger.debug("Waiting 60 seconds to continue")
-                sleep(60)
+        try:
+            for submission in self.iterate_submissions():
+                try:
+                    if (submission.author and submission.author.name in self.args.ignore_user) or (
+                        submission.author is None and "DELETED" in self.args.ignore_user
+                    ):
+                        logger.debug(
+                            f"Submission {submission.id} in {submission.subreddit.display_name} skipped due"
+                            f" to {submission.author.name if submission.author else 'DELETED'} being an"
+                            " ignored user"
+                        )
+                        continue
+                    if submission.id in self.excluded_submission_ids:
+                        logger.debug(f"Object {submission.id} in exclusion list, skipping")
+                        continue
+                    logger.debug(f"Attempting to archive submission {submission.id}")
+                    self.write_entry(submission)
+                except prawcore.PrawcoreException as e:
+                    logger.error(f"Submission {submission.id} failed to be archived due to a PRAW exception: {e}")
+        finally:
+            self.close()
 
-    def get_submissions_from_link(self) -> list[list[praw.models.Submission]]:
-        supplied_submissions = []
+    def get_submissions_from_link(self) -> list[BatchFetcher]:
+        fullnames = []
         for sub_id in self.args.link:
             if len(sub_id) == 6:
-                supplied_submissions.append(self.reddit_instance.submission(id=sub_id))
+                fullnames.append(f"t3_{sub_id}")
             elif re.match(r"^\w{7}$", sub_id):
-                supplied_submissions.append(self.reddit_instance.comment(id=sub_id))
+                fullnames.append(f"t1_{sub_id}")
             else:
-                supplied_submissions.append(self.reddit_instance.submission(url=sub_id))
-        return [supplied_submissions]
+                fullnames.append(f"t3_{praw.models.Submission.id_from_url(sub_id)}")
+        return [BatchFetcher(self.reddit_instance, fullnames, self._fallback_item)]
 
     def get_user_data(self) -> list[Iterator]:
         results = super(Archiver, self).get_user_data()
@@ -114,11 +111,11 @@ class Archiver(RedditConnector):
         self._write_content_to_disk(resource, content)
 
     def _write_content_to_disk(self, resource: Resource, content: str):
+        resource.content = content.encode("utf-8")
+        resource.create_hash()
         file_path = self.file_name_formatter.format_path(resource, self.download_directory)
-        file_path.parent.mkdir(exist_ok=True, parents=True)
-        with Path(file_path).open(mode="w", encoding="utf-8") as file:
-            logger.debug(
-                f"Writing entry {resource.source_submission.id} to file in {resource.extension[1:].upper()}"
-                f" format at {file_path}"
-            )
-            file.write(content)
+        logger.debug(
+            f"Writing entry {resource.source_submission.id} to file in {resource.extension[1:].upper()}"
+            f" format at {file_path}"
+        )
+        self.storage.write(file_path, resource.content)
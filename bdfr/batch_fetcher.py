@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Union
+
+import praw
+import praw.models
+import prawcore
+
+from bdfr.exceptions import is_transient
+
+logger = logging.getLogger(__name__)
+
+RedditItem = Union[praw.models.Submission, praw.models.Comment]
+
+
+class BatchFetcher:
+    """Retrieve submissions and comments by fullname through /api/info, 100 to a request
+
+    Iterating yields the items in the order that they were given. Upcoming batches are requested in the background
+    while earlier items are being processed. Items that Reddit does not return are made with the fallback instead, so
+    that they fail in the same way as they would have when requested one at a time. A batch that still fails after
+    being retried is made entirely with the fallback, so one bad request never loses the rest of the items.
+
+    Like a PRAW listing, iteration can be continued after an exception.
+    """
+
+    batch_size = 100
+    prefetch_batches = 2
+    batch_retries = 2
+    retry_delay = 5
+
+    def __init__(self, reddit_instance: praw.Reddit, fullnames: list[str], fallback: Callable[[str], RedditItem]):
+        self.reddit_instance = reddit_instance
+        self.fullnames = fullnames
+        self.fallback = fallback
+        self._next_batch = 0
+        self._position = 0
+        self._pending: deque[tuple[list[str], Future]] = deque()
+        self._current: Optional[tuple[list[str], dict[str, RedditItem]]] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __len__(self) -> int:
+        return len(self.fullnames)
+
+    def __iter__(self) -> Iterator[RedditItem]:
+        return self
+
+    def __next__(self) -> RedditItem:
+        if self._current is None:
+            self._current = self._take_batch()
+            self._position = 0
+        batch, results = self._current
+        fullname = batch[self._position]
+        item = results.get(fullname)
+        if item is None:
+            logger.debug(f"{fullname} was not returned by Reddit")
+            item = self.fallback(fullname)
+        # Only move on once the item has been made, so that the same item is tried again after an exception
+        self._position += 1
+        if self._position >= len(batch):
+            self._current = None
+        return item
+
+    def _take_batch(self) -> tuple[list[str], dict[str, RedditItem]]:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.prefetch_batches, thread_name_prefix="BatchFetcher")
+        while self._next_batch * self.batch_size < len(self.fullnames) and len(self._pending) < self.prefetch_batches:
+            start = self._next_batch * self.batch_size
+            end = start + self.batch_size
+            batch = self.fullnames[start:end]
+            self._pending.append((batch, self._executor.submit(self._fetch_batch, batch)))
+            self._next_batch += 1
+        if not self._pending:
+            self._executor.shutdown(wait=False)
+            raise StopIteration
+        batch, future = self._pending.popleft()
+        return batch, future.result()
+
+    def _fetch_batch(self, batch: list[str]) -> dict[str, RedditItem]:
+        for attempt in range(self.batch_retries + 1):
+            logger.log(9, f"Retrieving {len(batch)} items from /api/info")
+            try:
+                return {item.fullname: item for item in self.reddit_instance.info(fullnames=batch)}
+            except prawcore.PrawcoreException as e:
+                if not is_transient(e) or attempt == self.batch_retries:
+                    logger.warning(f"Failed to retrieve {len(batch)} items from /api/info, requesting each alone: {e}")
+                    return {}
+                logger.debug(f"Failed to retrieve {len(batch)} items from /api/info, trying again: {e}")
+                time.sleep(self.retry_delay * (attempt + 1))
@@ -3,7 +3,6 @@
 
 import logging
 from collections.abc import Iterable
-from time import sleep
 
 import prawcore
 
@@ -19,15 +18,12 @@ class RedditCloner(RedditDownloader, Archiver):
         super(RedditCloner, self).__init__(args, logging_handlers)
 
     def download(self):
-        for generator in self.reddit_lists:
-            try:
-                for submission in generator:
-                    try:
-                        self._download_submission(submission)
-                        self.write_entry(submission)
-                    except prawcore.PrawcoreException as e:
-                        logger.error(f"Submission {submission.id} failed to be cloned due to a PRAW exception: {e}")
-            except prawcore.PrawcoreException as e:
-                logger.error(f"The submission after {submission.id} failed to download due to a PRAW exception: {e}")
-                logger.debug("Waiting 60 seconds to continue")
-                sleep(60)
+        try:
+            for submission in self.iterate_submissions():
+                try:
+                    self._download_submission(submission)
+                    self.write_entry(submission)
+                except prawcore.PrawcoreException as e:
+                    logger.error(f"Submission {submission.id} failed to be cloned due to a PRAW exception: {e}")
+        finally:
+            self.close()
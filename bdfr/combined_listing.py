@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from collections.abc import Iterable, Iterator
+from typing import Optional
+
+import praw.models
+
+logger = logging.getLogger(__name__)
+
+# Reddit rejects combined subreddit names much past this length, and long URLs are refused by some proxies
+MAX_COMBINED_LENGTH = 1500
+MAX_COMBINED_SUBREDDITS = 100
+# Reddit stops returning a listing after this many items, however many are asked for
+MAX_LISTING_ITEMS = 1000
+
+
+def chunk_subreddit_names(
+    names: Iterable[str],
+    max_length: int = MAX_COMBINED_LENGTH,
+    max_subreddits: int = MAX_COMBINED_SUBREDDITS,
+) -> list[list[str]]:
+    """Split subreddit names into groups that can each be requested as one `a+b+c` subreddit"""
+    out = []
+    chunk = []
+    length = 0
+    for name in names:
+        added_length = len(name) + (1 if chunk else 0)
+        if chunk and (length + added_length > max_length or len(chunk) >= max_subreddits):
+            out.append(chunk)
+            chunk = []
+            added_length = len(name)
+            length = 0
+        chunk.append(name)
+        length += added_length
+    if chunk:
+        out.append(chunk)
+    return out
+
+
+class CombinedListing:
+    """A listing of several subreddits requested together, with the limit applied to each subreddit separately
+
+    The underlying listing should be created with a limit large enough to cover every subreddit in it. Submissions
+    from a subreddit that has already reached the limit are dropped, and iteration stops once every subreddit has.
+    Like a PRAW listing, iteration can be continued after an exception from Reddit.
+    """
+
+    def __init__(self, listing: Iterator[praw.models.Submission], names: list[str], limit: Optional[int]):
+        self.listing = listing
+        self.names = names
+        self.limit = limit
+        self._iterator = iter(listing)
+        self._counts = {name.lower(): 0 for name in names}
+        self._full = 0
+
+    def __iter__(self) -> Iterator[praw.models.Submission]:
+        return self
+
+    def __next__(self) -> praw.models.Submission:
+        if self.limit is None:
+            return next(self._iterator)
+        if self._full >= len(self._counts):
+            raise StopIteration
+        while True:
+            try:
+                submission = next(self._iterator)
+            except StopIteration:
+                for name, count in self._counts.items():
+                    if count < self.limit:
+                        logger.log(9, f"Combined listing returned {count} of {self.limit} submissions for {name}")
+                raise
+            name = submission.subreddit.display_name.lower()
+            count = self._counts.get(name, 0)
+            if count >= self.limit:
+                continue
+            self._counts[name] = count + 1
+            if self._counts[name] == self.limit:
+                self._full += 1
+            return submission
+
+    def __str__(self) -> str:
+        return "+".join(self.names)
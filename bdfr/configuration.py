@@ -16,24 +16,39 @@ class Configuration(Namespace):
     def __init__(self):
         super(Configuration, self).__init__()
         self.authenticate = False
+        self.combine_subreddits: bool = False
         self.config = None
         self.opts: Optional[str] = None
         self.directory: str = "."
         self.disable_module: list[str] = []
+        self.download_index: Optional[str] = None
         self.exclude_id = []
         self.exclude_id_file = []
+        self.exclude_hash_file: list[str] = []
         self.file_scheme: str = "{REDDITOR}_{TITLE}_{POSTID}"
         self.filename_restriction_scheme = None
         self.folder_scheme: str = "{SUBREDDIT}"
+        self.hash_index: Optional[str] = None
+        self.incremental: bool = False
+        self.listing_threads: int = 1
         self.ignore_user = []
         self.include_id_file = []
+        self.index_root: list[str] = []
         self.limit: Optional[int] = None
         self.link: list[str] = []
         self.log: Optional[str] = None
         self.make_hard_links = False
+        self.make_reflinks: bool = False
         self.max_wait_time = None
         self.multireddit: list[str] = []
         self.no_dupes: bool = False
+        self.old_file_scheme: str = "{REDDITOR}_{TITLE}_{POSTID}"
+        self.old_folder_scheme: str = "{SUBREDDIT}"
+        self.pack_format: Optional[str] = None
+        self.pack_max_count: Optional[int] = None
+        self.pack_max_size: Optional[int] = None
+        self.preview_width: Optional[int] = None
+        self.revalidate_urls: bool = False
         self.saved: bool = False
         self.search: Optional[str] = None
         self.search_existing: bool = False
@@ -45,12 +60,14 @@ class Configuration(Namespace):
         self.min_score_ratio = None
         self.max_score_ratio = None
         self.sort: str = "hot"
+        self.storage: str = "local"
         self.submitted: bool = False
         self.subscribed: bool = False
         self.subreddit: list[str] = []
         self.time: str = "all"
         self.time_format = None
         self.upvoted: bool = False
+        self.watch_index: bool = False
         self.user: list[str] = []
         self.verbose: int = 0
 
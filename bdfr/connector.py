@@ -2,19 +2,26 @@
 # -*- coding: utf-8 -*-
 
 import configparser
+import functools
 import importlib.resources
 import itertools
 import logging
 import logging.handlers
+import os
+import queue
 import re
 import shutil
 import socket
+import threading
+import time
 from abc import ABCMeta, abstractmethod
 from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from enum import Enum, auto
 from pathlib import Path
 from time import sleep
+from typing import Optional, Union
 
 import appdirs
 import praw
@@ -23,11 +30,23 @@ import praw.models
 import prawcore
 
 from bdfr import exceptions as errors
+from bdfr.batch_fetcher import BatchFetcher
+from bdfr.combined_listing import MAX_COMBINED_SUBREDDITS, MAX_LISTING_ITEMS, CombinedListing, chunk_subreddit_names
 from bdfr.configuration import Configuration
 from bdfr.download_filter import DownloadFilter
+from bdfr.file_lock import FileLock
 from bdfr.file_name_formatter import FileNameFormatter
+from bdfr.incremental_state import IncrementalState
+from bdfr.listing_checkpoints import ListingCheckpoints, listing_key, unwrap_listing
 from bdfr.oauth2 import OAuth2Authenticator, OAuth2TokenManager
+from bdfr.persistent_state import PersistentState
+from bdfr.reddit_instance_pool import RedditInstancePool
+from bdfr.request_lock import lock_requests
 from bdfr.site_authenticator import SiteAuthenticator
+from bdfr.storage.base_storage import BaseStorage
+from bdfr.storage.local_storage import LocalStorage
+from bdfr.storage.pack_storage import PackStorage
+from bdfr.storage.s3_storage import S3Storage
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +70,8 @@ class RedditTypes:
 
 
 class RedditConnector(metaclass=ABCMeta):
+    listing_retries = 3
+
     def __init__(self, args: Configuration, logging_handlers: Iterable[logging.Handler] = ()):
         self.args = args
         self.config_directories = appdirs.AppDirs("bdfr", "BDFR")
@@ -63,6 +84,7 @@ class RedditConnector(metaclass=ABCMeta):
         self._setup_internal_objects()
 
         self.reddit_lists = self.retrieve_reddit_lists()
+        self.seen_ids: set[int] = set()
 
     def _setup_internal_objects(self):
 
@@ -76,8 +98,13 @@ class RedditConnector(metaclass=ABCMeta):
         logger.log(9, "Created sort filter")
         self.file_name_formatter = self.create_file_name_formatter()
         logger.log(9, "Create file name formatter")
+        self.storage = self.create_storage()
+        logger.log(9, f"Created {type(self.storage).__name__}")
 
         self.create_reddit_instance()
+        self.source_cache = self.create_source_cache()
+        self.incremental_state = self.create_incremental_state()
+        self.listing_checkpoints = ListingCheckpoints(Path(self.config_directory, "listing_checkpoints.json"))
         self.args.user = list(filter(None, [self.resolve_user_name(user) for user in self.args.user]))
 
         self.excluded_submission_ids = set.union(
@@ -154,6 +181,9 @@ class RedditConnector(metaclass=ABCMeta):
                 user_agent=socket.gethostname(),
                 token_manager=token_manager,
             )
+            self.reddit_pool = None
+            if any(section.startswith("client.") for section in self.cfg_parser.sections()):
+                logger.warning("Additional Reddit apps are only used without --authenticate")
         else:
             logger.debug("Using unauthenticated Reddit instance")
             self.authenticated = False
@@ -162,6 +192,33 @@ class RedditConnector(metaclass=ABCMeta):
                 client_secret=self.cfg_parser.get("DEFAULT", "client_secret"),
                 user_agent=socket.gethostname(),
             )
+            self.reddit_pool = self.create_reddit_pool()
+        # Sources, source checks and batches of IDs can all be read from several threads at once
+        lock_requests(self.reddit_instance)
+
+    def create_reddit_pool(self) -> Optional[RedditInstancePool]:
+        """Create an instance for every additional app in a [client.NAME] section of the configuration"""
+        instances = [self.reddit_instance]
+        client_ids = {self.cfg_parser.get("DEFAULT", "client_id")}
+        for section in self.cfg_parser.sections():
+            if not section.startswith("client."):
+                continue
+            client_id = self.cfg_parser.get(section, "client_id")
+            if client_id in client_ids:
+                logger.warning(f"Skipping configuration section {section} as its client_id is already in use")
+                continue
+            client_ids.add(client_id)
+            instance = praw.Reddit(
+                client_id=client_id,
+                client_secret=self.cfg_parser.get(section, "client_secret"),
+                user_agent=socket.gethostname(),
+            )
+            lock_requests(instance)
+            instances.append(instance)
+        if len(instances) == 1:
+            return None
+        logger.debug(f"Spreading requests across {len(instances)} Reddit apps")
+        return RedditInstancePool(instances)
 
     def retrieve_reddit_lists(self) -> list[praw.models.ListingGenerator]:
         master_list = []
@@ -217,6 +274,11 @@ class RedditConnector(metaclass=ABCMeta):
             if not log_path.parent.exists():
                 raise errors.BulkDownloaderException("Designated location for logfile does not exist")
         backup_count = self.cfg_parser.getint("DEFAULT", "backup_log_count", fallback=3)
+        # The lock is held for the whole run so that other processes never roll over a logfile that is in use
+        self.log_lock = FileLock(Path(log_path.parent, f".{log_path.name}.lock"))
+        if not self.log_lock.acquire(blocking=False):
+            log_path = self._process_log_path(log_path)
+            logger.warning(f"Logfile is in use by another BDFR process, logging to {log_path} instead")
         file_handler = logging.handlers.RotatingFileHandler(
             log_path,
             mode="a",
@@ -226,16 +288,20 @@ class RedditConnector(metaclass=ABCMeta):
             try:
                 file_handler.doRollover()
             except PermissionError:
-                logger.critical(
-                    "Cannot rollover logfile, make sure this is the only "
-                    "BDFR process or specify alternate logfile location"
-                )
-                raise
+                # Without advisory locks, as on Windows, the file being open elsewhere is the first sign of sharing
+                file_handler.close()
+                log_path = self._process_log_path(log_path)
+                logger.warning(f"Cannot rollover logfile, logging to {log_path} instead")
+                file_handler = logging.handlers.RotatingFileHandler(log_path, mode="a", backupCount=backup_count)
         formatter = logging.Formatter("[%(asctime)s - %(name)s - %(levelname)s] - %(message)s")
         file_handler.setFormatter(formatter)
         file_handler.setLevel(0)
         return file_handler
 
+    @staticmethod
+    def _process_log_path(log_path: Path) -> Path:
+        return Path(log_path.parent, f"{log_path.stem}.{os.getpid()}{log_path.suffix}")
+
     @staticmethod
     def sanitise_subreddit_name(subreddit: str) -> str:
         pattern = re.compile(r"^(?:https://www\.reddit\.com/)?(?:r/)?(.*?)/?$")
@@ -266,36 +332,60 @@ class RedditConnector(metaclass=ABCMeta):
             else:
                 logger.error("Cannot find subscribed subreddits without an authenticated instance")
         if self.args.subreddit or subscribed_subreddits:
+            subreddits = {}
             for reddit in self.split_args_input(self.args.subreddit) | subscribed_subreddits:
                 if reddit == "friends" and self.authenticated is False:
                     logger.error("Cannot read friends subreddit without an authenticated instance")
                     continue
+                subreddits[reddit] = self.reddit_instance.subreddit(reddit)
+            source_errors = self.check_sources(
+                "subreddit",
+                {name: (lambda s=subreddit: self.check_subreddit_status(s)) for name, subreddit in subreddits.items()},
+            )
+            combine = self.args.combine_subreddits
+            if combine and not self.args.limit:
+                logger.warning("Subreddits can only be combined when --limit is given, reading each one separately")
+                combine = False
+            to_combine = []
+            for name, reddit in subreddits.items():
                 try:
-                    reddit = self.reddit_instance.subreddit(reddit)
                     try:
-                        self.check_subreddit_status(reddit)
+                        if error := source_errors.get(name):
+                            raise error
                     except errors.BulkDownloaderException as e:
                         logger.error(e)
                         continue
-                    if self.args.search:
-                        out.append(
-                            reddit.search(
-                                self.args.search,
-                                sort=self.sort_filter.name.lower(),
-                                limit=self.args.limit,
-                                time_filter=self.time_filter.value,
-                            )
-                        )
-                        logger.debug(
-                            f'Added submissions from subreddit {reddit} with the search term "{self.args.search}"'
-                        )
+                    if combine and name.lower() not in ("all", "friends", "popular"):
+                        to_combine.append(name)
                     else:
-                        out.append(self.create_filtered_listing_generator(reddit))
-                        logger.debug(f"Added submissions from subreddit {reddit}")
+                        out.append(self.create_subreddit_listing(reddit))
                 except (errors.BulkDownloaderException, praw.exceptions.PRAWException) as e:
                     logger.error(f"Failed to get submissions for subreddit {reddit}: {e}")
+            # The whole group shares one listing, so it must fit within the most that Reddit will return for one
+            group_size = min(MAX_COMBINED_SUBREDDITS, MAX_LISTING_ITEMS // self.args.limit) if combine else 1
+            for chunk in chunk_subreddit_names(sorted(to_combine, key=str.lower), max_subreddits=max(group_size, 1)):
+                if len(chunk) == 1:
+                    out.append(self.create_subreddit_listing(subreddits[chunk[0]]))
+                    continue
+                combined = self.reddit_instance.subreddit("+".join(chunk))
+                listing = self.create_subreddit_listing(combined, limit_multiplier=len(chunk))
+                out.append(CombinedListing(listing, chunk, self.args.limit))
+                logger.debug(f"Combined {len(chunk)} subreddits into one listing")
         return out
 
+    def create_subreddit_listing(self, reddit: praw.models.Subreddit, limit_multiplier: int = 1) -> Iterator:
+        limit = self.args.limit * limit_multiplier if self.args.limit is not None else None
+        if self.args.search:
+            logger.debug(f'Added submissions from subreddit {reddit} with the search term "{self.args.search}"')
+            return reddit.search(
+                self.args.search,
+                sort=self.sort_filter.name.lower(),
+                limit=limit,
+                time_filter=self.time_filter.value,
+            )
+        logger.debug(f"Added submissions from subreddit {reddit}")
+        return self.create_filtered_listing_generator(reddit, limit_multiplier)
+
     def resolve_user_name(self, in_name: str) -> str:
         if in_name == "me":
             if self.authenticated:
@@ -307,14 +397,19 @@ class RedditConnector(metaclass=ABCMeta):
         else:
             return in_name
 
-    def get_submissions_from_link(self) -> list[list[praw.models.Submission]]:
-        supplied_submissions = []
+    def get_submissions_from_link(self) -> list[BatchFetcher]:
+        fullnames = []
         for sub_id in self.args.link:
-            if len(sub_id) in (6, 7):
-                supplied_submissions.append(self.reddit_instance.submission(id=sub_id))
-            else:
-                supplied_submissions.append(self.reddit_instance.submission(url=sub_id))
-        return [supplied_submissions]
+            if len(sub_id) not in (6, 7):
+                sub_id = praw.models.Submission.id_from_url(sub_id)
+            fullnames.append(f"t3_{sub_id}")
+        return [BatchFetcher(self.reddit_instance, fullnames, self._fallback_item)]
+
+    def _fallback_item(self, fullname: str) -> Union[praw.models.Submission, praw.models.Comment]:
+        kind, item_id = fullname.split("_", 1)
+        if kind == "t1":
+            return self.reddit_instance.comment(id=item_id)
+        return self.reddit_instance.submission(id=item_id)
 
     def determine_sort_function(self) -> Callable:
         if self.sort_filter is RedditTypes.SortType.NEW:
@@ -348,12 +443,13 @@ class RedditConnector(metaclass=ABCMeta):
         else:
             return []
 
-    def create_filtered_listing_generator(self, reddit_source) -> Iterator:
+    def create_filtered_listing_generator(self, reddit_source, limit_multiplier: int = 1) -> Iterator:
+        limit = self.args.limit * limit_multiplier if self.args.limit is not None else None
         sort_function = self.determine_sort_function()
         if self.sort_filter in (RedditTypes.SortType.TOP, RedditTypes.SortType.CONTROVERSIAL):
-            return sort_function(reddit_source, limit=self.args.limit, time_filter=self.time_filter.value)
+            return sort_function(reddit_source, limit=limit, time_filter=self.time_filter.value)
         else:
-            return sort_function(reddit_source, limit=self.args.limit)
+            return sort_function(reddit_source, limit=limit)
 
     def get_user_data(self) -> list[Iterator]:
         if any([self.args.submitted, self.args.upvoted, self.args.saved]):
@@ -361,10 +457,15 @@ class RedditConnector(metaclass=ABCMeta):
                 logger.warning("At least one user must be supplied to download user data")
                 return []
             generators = []
+            source_errors = self.check_sources(
+                "user",
+                {user: (lambda u=user: self.check_user_existence(u)) for user in self.args.user},
+            )
             for user in self.args.user:
                 try:
                     try:
-                        self.check_user_existence(user)
+                        if error := source_errors.get(user):
+                            raise error
                     except errors.BulkDownloaderException as e:
                         logger.error(e)
                         continue
@@ -403,11 +504,71 @@ class RedditConnector(metaclass=ABCMeta):
             if hasattr(user, "is_suspended"):
                 raise errors.BulkDownloaderException(f"User {name} is banned")
 
+    def create_incremental_state(self) -> Optional[IncrementalState]:
+        if not self.args.incremental:
+            return None
+        if self.sort_filter is not RedditTypes.SortType.NEW:
+            logger.warning("Incremental mode only stops early in listings sorted by new")
+        known_limit = self.cfg_parser.getint("DEFAULT", "incremental_known_limit", fallback=3)
+        return IncrementalState(
+            Path(self.config_directory, "incremental_state.json"), self.download_directory, known_limit
+        )
+
+    def create_source_cache(self) -> Optional[PersistentState]:
+        self.source_cache_ttl = self.cfg_parser.getfloat("DEFAULT", "source_cache_ttl", fallback=24) * 60 * 60
+        if self.source_cache_ttl <= 0:
+            return None
+        return PersistentState(Path(self.config_directory, "source_cache.json"))
+
+    def check_sources(self, kind: str, checks: dict[str, Callable[[], None]]) -> dict[str, Exception]:
+        """Run the checks that sources exist concurrently, skipping sources that passed recently
+
+        Returns the exception raised by each source that failed its check. Only sources that pass are cached, so
+        failures are always checked again.
+        """
+        now = time.time()
+        to_check = {}
+        for name, check in checks.items():
+            cached = self.source_cache.get(f"{kind}:{name.lower()}", 0) if self.source_cache is not None else 0
+            if now - cached < self.source_cache_ttl:
+                logger.log(9, f"Skipping check of {kind} {name} as it was checked recently")
+            else:
+                to_check[name] = check
+        if not to_check:
+            return {}
+        logger.debug(f"Checking {len(to_check)} {kind} sources")
+
+        def run_check(check: Callable[[], None]) -> Optional[Exception]:
+            try:
+                check()
+            except (errors.BulkDownloaderException, prawcore.PrawcoreException) as e:
+                return e
+            return None
+
+        with ThreadPoolExecutor(max_workers=min(8, len(to_check))) as executor:
+            results = dict(zip(to_check, executor.map(run_check, to_check.values())))
+        out = {name: error for name, error in results.items() if error is not None}
+        if self.source_cache is not None:
+            for name in results.keys() - out.keys():
+                self.source_cache[f"{kind}:{name.lower()}"] = now
+            self.source_cache.save()
+        return out
+
     def create_file_name_formatter(self) -> FileNameFormatter:
         return FileNameFormatter(
             self.args.file_scheme, self.args.folder_scheme, self.args.time_format, self.args.filename_restriction_scheme
         )
 
+    def create_storage(self) -> BaseStorage:
+        if self.args.storage == "s3":
+            if self.args.pack_format:
+                raise errors.BulkDownloaderException("Packs can only be written to local storage")
+            return S3Storage.from_config(self.download_directory, self.cfg_parser)
+        elif self.args.pack_format:
+            max_size = self.args.pack_max_size * 1024 * 1024 if self.args.pack_max_size else None
+            return PackStorage(self.download_directory, self.args.pack_format, max_size, self.args.pack_max_count)
+        return LocalStorage(self.download_directory)
+
     def create_time_filter(self) -> RedditTypes.TimeType:
         try:
             return RedditTypes.TimeType[self.args.time.upper()]
@@ -430,6 +591,153 @@ class RedditConnector(metaclass=ABCMeta):
     def download(self):
         pass
 
+    def iterate_submissions(self) -> Iterator[Union[praw.models.Submission, praw.models.Comment]]:
+        """Yield every item from every source, skipping items that an earlier source has already yielded
+
+        With more than one listing thread, sources are read concurrently and their items are yielded as they arrive.
+        """
+        if self.args.listing_threads > 1 and len(self.reddit_lists) > 1:
+            entries = self._read_sources_concurrently(min(self.args.listing_threads, len(self.reddit_lists)))
+        else:
+            entries = itertools.chain.from_iterable(map(self._read_source, self.reddit_lists))
+        for entry in entries:
+            if isinstance(entry, functools.partial):
+                entry()
+            elif self.already_seen(entry):
+                logger.log(9, f"Skipping {entry.id} as it has already been retrieved from another source")
+            else:
+                if self.reddit_pool is not None:
+                    # Requests made while processing an item, such as expanding its comments, go through its instance
+                    entry._reddit = self.reddit_pool.choose()
+                yield entry
+
+    def _read_sources_concurrently(self, threads: int) -> Iterator:
+        """Read sources in a pool of threads, which all share one Reddit instance and so one rate limit"""
+        entries = queue.Queue(maxsize=100 * threads)
+        stopping = threading.Event()
+        finished = object()
+
+        def put(entry) -> bool:
+            # Give up once the consumer has stopped, rather than waiting on a full queue that will never empty
+            while not stopping.is_set():
+                try:
+                    entries.put(entry, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read(generator):
+            error = None
+            try:
+                for entry in self._read_source(generator):
+                    if not put(entry):
+                        return
+            except BaseException as e:
+                error = e
+            put((finished, error))
+
+        logger.debug(f"Reading {len(self.reddit_lists)} sources with {threads} threads")
+        executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="ListingReader")
+        try:
+            for generator in self.reddit_lists:
+                executor.submit(read, generator)
+            remaining = len(self.reddit_lists)
+            while remaining:
+                entry = entries.get()
+                if isinstance(entry, tuple) and entry[0] is finished:
+                    if entry[1] is not None:
+                        raise entry[1]
+                    remaining -= 1
+                    continue
+                yield entry
+        finally:
+            stopping.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _read_source(self, generator) -> Iterator:
+        """Read every item from one source, yielding them along with the checkpoint updates to make after them
+
+        A failed page is requested again, and the page reached is checkpointed so that a listing cut short by a crash
+        is continued on the next run. Updates are yielded as partials, to be run only once every item yielded before
+        them has been processed.
+        """
+        listing = unwrap_listing(generator)
+        checkpoint = listing_key(listing, self.download_directory) if listing is not None else None
+        if checkpoint:
+            self.listing_checkpoints.restore(checkpoint, listing)
+        after = listing.params.get("after") if listing is not None else None
+        name = listing.url if listing is not None else type(generator).__name__
+        source = self.incremental_state.source_key(generator) if self.incremental_state else None
+        mark = self.incremental_state.get(source) if source else None
+        newest = None
+        known = 0
+        failures = 0
+        finished = False
+        iterator = iter(generator)
+        while not finished:
+            if self.reddit_pool is not None and listing is not None:
+                # PRAW requests each page through the listing's instance, so this spreads pages across the apps
+                listing._reddit = self.reddit_pool.choose()
+            try:
+                submission = next(iterator)
+            except StopIteration:
+                finished = True
+                break
+            except prawcore.PrawcoreException as e:
+                failures += 1
+                logger.error(f"Failed to retrieve submissions from {name} due to a PRAW exception: {e}")
+                # Errors such as a private or banned subreddit will not go away by waiting
+                if failures > self.listing_retries or not errors.is_transient(e):
+                    logger.error(f"Giving up on {name} for this run")
+                    if checkpoint and after is not None:
+                        # Only the page being fetched failed, so every item read so far has been processed
+                        yield functools.partial(self.listing_checkpoints.save, checkpoint, after, listing.yielded)
+                    break
+                logger.debug("Waiting 60 seconds to continue")
+                sleep(60)
+                continue
+            failures = 0
+            if listing is not None and listing.params.get("after") != after:
+                # A new page has been fetched, so every item before it can be checkpointed
+                if after is not None:
+                    yield functools.partial(self.listing_checkpoints.save, checkpoint, after, listing.yielded - 1)
+                after = listing.params.get("after")
+            if source:
+                if newest is None or submission.created_utc > newest.created_utc:
+                    newest = submission
+                if mark and self.incremental_state.is_known(submission, mark):
+                    known += 1
+                    if submission.id == mark["id"] or known >= self.incremental_state.known_limit:
+                        logger.debug(f"Reached submissions retrieved by an earlier run in {source}")
+                        finished = True
+                    continue
+                known = 0
+            yield submission
+        if finished:
+            if checkpoint:
+                yield functools.partial(self.listing_checkpoints.clear, checkpoint)
+            # The mark only moves once the listing has been read through, so an interrupted run is repeated
+            if newest is not None:
+                yield functools.partial(self.incremental_state.record, source, newest)
+
+    def already_seen(self, item: Union[praw.models.Submission, praw.models.Comment]) -> bool:
+        # Reddit IDs are base 36, so storing them as integers takes much less memory than storing the strings
+        try:
+            key = int(item.id, 36) * 2 + isinstance(item, praw.models.Comment)
+        except ValueError:
+            return False
+        if key in self.seen_ids:
+            return True
+        self.seen_ids.add(key)
+        return False
+
+    def close(self):
+        if self.reddit_pool is not None:
+            self.reddit_pool.log_usage()
+        self.storage.close()
+        self.log_lock.release()
+
     @staticmethod
     def check_subreddit_status(subreddit: praw.models.Subreddit):
         if subreddit.display_name in ("all", "friends"):
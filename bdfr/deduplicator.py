@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+import os
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from pathlib import Path
+
+from bdfr.linking import replace_with_link
+
+logger = logging.getLogger(__name__)
+
+
+class DeduplicationReport:
+    def __init__(self):
+        self.duplicate_groups = 0
+        self.replaced = 0
+        self.failed = 0
+        self.reclaimed_bytes = 0
+
+
+class Deduplicator:
+    """Find byte-identical files in a directory and replace all but one copy with links to it
+
+    Files are grouped by size first, then by a hash of their first block, and only files that still match are hashed
+    in full. Files that are already hard links to each other count as a single copy.
+    """
+
+    partial_hash_size = 64 * 1024
+
+    def __init__(self, directory: Path, use_reflinks: bool = False, dry_run: bool = False):
+        self.directory = directory.resolve().expanduser()
+        self.use_reflinks = use_reflinks
+        self.dry_run = dry_run
+
+    def deduplicate(self) -> DeduplicationReport:
+        report = DeduplicationReport()
+        for group in self.find_duplicates():
+            report.duplicate_groups += 1
+            original, *duplicates = group
+            for inode_paths in duplicates:
+                self._replace(inode_paths, original[0], report)
+        action = "would reclaim" if self.dry_run else "reclaimed"
+        logger.info(
+            f"Found {report.duplicate_groups} sets of duplicates; {action} {report.reclaimed_bytes} bytes"
+            f" by replacing {report.replaced} files"
+            + (f", {report.failed} files could not be replaced" if report.failed else "")
+        )
+        return report
+
+    def find_duplicates(self) -> list[list[list[Path]]]:
+        """Return groups of identical files, each a list of inodes that are given as the list of their paths"""
+        by_size = self._group_by_size()
+        candidates = [group for group in by_size.values() if len(group) > 1]
+        logger.debug(f"{sum(len(group) for group in candidates)} files share their size with another file")
+        candidates = self._split_groups(candidates, lambda path: self._hash(path, self.partial_hash_size))
+        logger.debug(f"{sum(len(group) for group in candidates)} files share their first block with another file")
+        candidates = self._split_groups(candidates, lambda path: self._hash(path))
+        out = []
+        for group in candidates:
+            # Keep the copy with the most names as the original, as replacing it would reclaim the least
+            out.append(sorted(group, key=lambda paths: (-len(paths), str(paths[0]))))
+        return out
+
+    def _group_by_size(self) -> dict[tuple[int, int], list[list[Path]]]:
+        inodes: dict[tuple[int, int], list[Path]] = defaultdict(list)
+        sizes: dict[tuple[int, int], int] = {}
+        for dirpath, _dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = Path(dirpath, filename)
+                try:
+                    stats = path.lstat()
+                except OSError:
+                    continue
+                if not path.is_file() or path.is_symlink() or stats.st_size == 0:
+                    continue
+                inodes[(stats.st_dev, stats.st_ino)].append(path)
+                sizes[(stats.st_dev, stats.st_ino)] = stats.st_size
+        out = defaultdict(list)
+        for (device, inode), paths in inodes.items():
+            # Links cannot span filesystems, so only files on the same device are compared
+            out[(device, sizes[(device, inode)])].append(sorted(paths))
+        return out
+
+    @staticmethod
+    def _split_groups(groups: Iterable[list[list[Path]]], key: Callable[[Path], str]) -> list[list[list[Path]]]:
+        out = []
+        for group in groups:
+            split = defaultdict(list)
+            for paths in group:
+                try:
+                    split[key(paths[0])].append(paths)
+                except OSError as e:
+                    logger.warning(f"Could not read {paths[0]}: {e}")
+            out.extend(subgroup for subgroup in split.values() if len(subgroup) > 1)
+        return out
+
+    @staticmethod
+    def _hash(path: Path, limit: int = None) -> str:
+        md5_hash = hashlib.md5()
+        remaining = limit
+        with path.open("rb") as file:
+            while chunk := file.read(1024 * 1024 if remaining is None else min(remaining, 1024 * 1024)):
+                md5_hash.update(chunk)
+                if remaining is not None:
+                    remaining -= len(chunk)
+                    if remaining <= 0:
+                        break
+        return md5_hash.hexdigest()
+
+    def _replace(self, paths: list[Path], original: Path, report: DeduplicationReport):
+        stats = paths[0].stat()
+        replaced = 0
+        for path in paths:
+            if self.dry_run:
+                logger.info(f"Would replace {path} with a link to {original}")
+                replaced += 1
+                continue
+            try:
+                replace_with_link(path, original, self.use_reflinks)
+            except OSError as e:
+                logger.error(f"Failed to replace {path} with a link to {original}: {e}")
+                report.failed += 1
+                continue
+            logger.debug(f"Replaced {path} with a link to {original}")
+            replaced += 1
+        report.replaced += replaced
+        # The blocks are only freed once every name of the duplicate inode points elsewhere
+        if replaced == len(paths) == stats.st_nlink:
+            report.reclaimed_bytes += stats.st_size
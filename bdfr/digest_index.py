@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import heapq
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from collections.abc import Iterator, Mapping, MutableMapping
+from pathlib import Path
+from typing import Optional
+
+from bdfr.exceptions import BulkDownloaderException
+from bdfr.file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+
+
+class DigestIndex(MutableMapping):
+    """A mapping of MD5 hex digests to paths that is backed by a memory-mapped file of sorted binary digests
+
+    The file holds a header, a sorted table of fixed-size records pairing each 16-byte digest with the offset of its
+    path, and then the table of paths. Lookups binary search the mapped records, so loading is instant and only the
+    pages that are touched are ever read into memory. Changes are held in memory until the index is saved.
+    """
+
+    magic = b"BDFRDIG1"
+    header = struct.Struct("<8sQQ")
+    record = struct.Struct("<16sQ")
+    path_length = struct.Struct("<I")
+
+    def __init__(self, entries: Optional[Mapping[str, Path]] = None):
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._count = 0
+        self._paths_offset = 0
+        self._added: dict[str, Path] = {}
+        self._removed: set[str] = set()
+        if entries:
+            self.update(entries)
+
+    @classmethod
+    def load(cls, index_path: Path) -> "DigestIndex":
+        out = cls()
+        out._open(index_path)
+        return out
+
+    def _open(self, index_path: Path):
+        self._close_mapping()
+        self._file = index_path.open("rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, self._paths_offset = self.header.unpack_from(self._mmap, 0)
+        if magic != self.magic:
+            self._close_mapping()
+            raise BulkDownloaderException(f"{index_path} is not a BDFR hash index")
+        self._added = {}
+        self._removed = set()
+        logger.debug(f"Mapped {self._count} hashes from {index_path}")
+
+    def _close_mapping(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+        self._mmap = None
+        self._file = None
+        self._count = 0
+
+    def _read_record(self, position: int) -> tuple[bytes, int]:
+        return self.record.unpack_from(self._mmap, self.header.size + position * self.record.size)
+
+    def _read_path(self, offset: int) -> str:
+        start = self._paths_offset + offset
+        (length,) = self.path_length.unpack_from(self._mmap, start)
+        start += self.path_length.size
+        end = start + length
+        return self._mmap[start:end].decode("utf-8")
+
+    def _find_base(self, digest: bytes) -> Optional[int]:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._read_record(middle)[0] < digest:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._read_record(low)[0] == digest:
+            return low
+        return None
+
+    def _base_get(self, key: str) -> Optional[Path]:
+        if self._mmap is None:
+            return None
+        try:
+            digest = bytes.fromhex(key)
+        except (TypeError, ValueError):
+            return None
+        position = self._find_base(digest)
+        if position is None:
+            return None
+        return Path(self._read_path(self._read_record(position)[1]))
+
+    def _iter_base(self) -> Iterator[tuple[bytes, str]]:
+        for position in range(self._count):
+            digest, offset = self._read_record(position)
+            yield digest, self._read_path(offset)
+
+    def __getitem__(self, key: str) -> Path:
+        if key in self._added:
+            return self._added[key]
+        if key not in self._removed:
+            result = self._base_get(key)
+            if result is not None:
+                return result
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Path):
+        self._added[key] = value
+        self._removed.discard(key)
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self._added.pop(key, None)
+        if self._base_get(key) is not None:
+            self._removed.add(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for digest, _ in self._iter_base():
+            key = digest.hex()
+            if key not in self._removed and key not in self._added:
+                yield key
+        yield from list(self._added.keys())
+
+    def __len__(self) -> int:
+        overlapping = sum(1 for key in self._added if self._base_get(key) is not None)
+        return self._count - len(self._removed) + len(self._added) - overlapping
+
+    def _iter_sorted(self) -> Iterator[tuple[bytes, str]]:
+        base = (
+            (digest, path)
+            for digest, path in self._iter_base()
+            if digest.hex() not in self._removed and digest.hex() not in self._added
+        )
+        added = sorted((bytes.fromhex(key), str(value)) for key, value in self._added.items())
+        return heapq.merge(base, added)
+
+    def _is_mapped(self, index_path: Path) -> bool:
+        if self._file is None:
+            return False
+        return os.path.samestat(os.fstat(self._file.fileno()), index_path.stat())
+
+    def _rebase(self, index_path: Path):
+        """Replace the mapped entries with those in the given file, keeping the changes held in memory"""
+        added, removed = self._added, self._removed
+        self._open(index_path)
+        self._added = added
+        self._removed = {key for key in removed if self._base_get(key) is not None}
+
+    def save(self, index_path: Path, merge: bool = False):
+        """Write the merged index to a temporary file, swap it into place, and map the new file
+
+        If merge is set and the file has been replaced since it was loaded, such as by another run sharing the index,
+        the changes held in memory are applied on top of the newer file rather than the one that was loaded. Merging
+        saves hold a lock so that runs saving at the same time cannot lose each other's changes.
+        """
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        if not merge:
+            self._write(index_path)
+            return
+        with FileLock(Path(index_path.parent, f".{index_path.name}.lock")):
+            if index_path.exists() and not self._is_mapped(index_path):
+                self._rebase(index_path)
+            self._write(index_path)
+
+    def _write(self, index_path: Path):
+        count = len(self)
+        paths_offset = self.header.size + count * self.record.size
+        temp_path = Path(index_path.parent, f".{index_path.name}.{os.getpid()}.tmp")
+        with temp_path.open("wb") as file, tempfile.TemporaryFile() as paths_file:
+            file.write(self.header.pack(self.magic, count, paths_offset))
+            path_offset = 0
+            for digest, path in self._iter_sorted():
+                encoded = path.encode("utf-8")
+                file.write(self.record.pack(digest, path_offset))
+                paths_file.write(self.path_length.pack(len(encoded)) + encoded)
+                path_offset += self.path_length.size + len(encoded)
+            paths_file.seek(0)
+            shutil.copyfileobj(paths_file, file)
+        self._close_mapping()
+        os.replace(temp_path, index_path)
+        self._open(index_path)
+        logger.debug(f"Saved {count} hashes to {index_path}")
+
+    def close(self):
+        self._close_mapping()
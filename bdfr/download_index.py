@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import sqlite3
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SeenUrl(NamedTuple):
+    hash: str
+    path: Path
+    etag: Optional[str]
+    size: Optional[int]
+
+
+class DownloadIndex:
+    """A persistent record of which files each submission was stored to, independent of the naming schemes
+
+    A submission is only marked complete once all of its resources have been handled, so a run that is interrupted
+    part-way through a gallery will resolve it again next time.
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS files (
+            submission_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            path TEXT NOT NULL,
+            PRIMARY KEY (submission_id, url, path)
+        );
+        CREATE TABLE IF NOT EXISTS submissions (
+            submission_id TEXT PRIMARY KEY,
+            completed_utc REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS urls (
+            url TEXT PRIMARY KEY,
+            hash TEXT NOT NULL,
+            path TEXT NOT NULL,
+            etag TEXT,
+            size INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS files_path ON files (path);
+        CREATE INDEX IF NOT EXISTS urls_path ON urls (path);
+    """
+
+    def __init__(self, index_path: Path):
+        self.index_path = index_path
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(index_path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(self.schema)
+        logger.debug(f"Opened download index at {index_path}")
+
+    def record_file(self, submission_id: str, url: str, path: Path):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO files (submission_id, url, path) VALUES (?, ?, ?)",
+                (submission_id, url, str(path)),
+            )
+
+    def mark_complete(self, submission_id: str):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO submissions (submission_id, completed_utc) VALUES (?, ?)",
+                (submission_id, time.time()),
+            )
+
+    def is_complete(self, submission_id: str) -> bool:
+        row = self.connection.execute(
+            "SELECT 1 FROM submissions WHERE submission_id = ?",
+            (submission_id,),
+        ).fetchone()
+        return row is not None
+
+    def get_files(self, submission_id: str) -> list[tuple[str, Path]]:
+        rows = self.connection.execute(
+            "SELECT url, path FROM files WHERE submission_id = ? ORDER BY rowid",
+            (submission_id,),
+        )
+        return [(url, Path(path)) for url, path in rows]
+
+    def iter_files(self) -> Iterator[tuple[str, str, Path]]:
+        """Yield the submission ID, URL, and path of every recorded file, grouped by submission in the order stored"""
+        rows = self.connection.execute("SELECT submission_id, url, path FROM files ORDER BY submission_id, rowid")
+        for submission_id, url, path in rows:
+            yield submission_id, url, Path(path)
+
+    def move_files(self, moves: Iterable[tuple[Path, Path]]):
+        """Update every record of each old path to the new path in a single transaction"""
+        moves = [(str(new), str(old)) for old, new in moves]
+        with self.connection:
+            self.connection.executemany("UPDATE OR REPLACE files SET path = ? WHERE path = ?", moves)
+            self.connection.executemany("UPDATE urls SET path = ? WHERE path = ?", moves)
+
+    def link_files(self, links: Iterable[tuple[Path, Path]]):
+        """Record each new path against every submission and URL that the existing path is recorded for"""
+        links = [(str(new), str(existing)) for existing, new in links]
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO files (submission_id, url, path) SELECT submission_id, url, ? FROM files"
+                " WHERE path = ?",
+                links,
+            )
+
+    def record_url(self, url: str, resource_hash: str, path: Path, etag: Optional[str] = None, size: int = None):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO urls (url, hash, path, etag, size) VALUES (?, ?, ?, ?, ?)",
+                (url, resource_hash, str(path), etag, size),
+            )
+
+    def get_url(self, url: str) -> Optional[SeenUrl]:
+        row = self.connection.execute("SELECT hash, path, etag, size FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return SeenUrl(row[0], Path(row[1]), row[2], row[3])
+
+    def close(self):
+        self.connection.close()
@@ -4,12 +4,13 @@
 import hashlib
 import logging.handlers
 import os
+import re
 import time
 from collections.abc import Iterable
 from datetime import datetime
 from multiprocessing import Pool
 from pathlib import Path
-from time import sleep
+from typing import Optional
 
 import praw
 import praw.exceptions
@@ -19,7 +20,13 @@ import prawcore
 from bdfr import exceptions as errors
 from bdfr.configuration import Configuration
 from bdfr.connector import RedditConnector
+from bdfr.digest_index import DigestIndex
+from bdfr.download_index import DownloadIndex
+from bdfr.index_watcher import IndexWatcher
+from bdfr.resource import Resource
 from bdfr.site_downloaders.download_factory import DownloadFactory
+from bdfr.site_downloaders.preview import Preview
+from bdfr.submission_record import SubmissionRecord
 
 logger = logging.getLogger(__name__)
 
@@ -39,21 +46,100 @@ def _calc_hash(existing_file: Path):
 class RedditDownloader(RedditConnector):
     def __init__(self, args: Configuration, logging_handlers: Iterable[logging.Handler] = ()):
         super(RedditDownloader, self).__init__(args, logging_handlers)
-        if self.args.search_existing:
-            self.master_hash_list = self.scan_existing_files(self.download_directory)
+        self.download_index = self.create_download_index()
+        self.excluded_hashes = self.read_hash_files(self.args.exclude_hash_file)
+        if self.args.hash_index:
+            self.master_hash_list = self.load_hash_index()
+        elif self.args.search_existing:
+            self.master_hash_list = self.find_existing_hashes()
+        self.index_watcher = IndexWatcher(self.download_directory, self.master_hash_list) if args.watch_index else None
 
     def download(self):
-        for generator in self.reddit_lists:
-            try:
-                for submission in generator:
-                    try:
-                        self._download_submission(submission)
-                    except prawcore.PrawcoreException as e:
-                        logger.error(f"Submission {submission.id} failed to download due to a PRAW exception: {e}")
-            except prawcore.PrawcoreException as e:
-                logger.error(f"The submission after {submission.id} failed to download due to a PRAW exception: {e}")
-                logger.debug("Waiting 60 seconds to continue")
-                sleep(60)
+        if self.index_watcher:
+            self.index_watcher.start()
+        try:
+            for submission in self.iterate_submissions():
+                try:
+                    self._download_submission(submission)
+                except prawcore.PrawcoreException as e:
+                    logger.error(f"Submission {submission.id} failed to download due to a PRAW exception: {e}")
+        finally:
+            self.close()
+
+    def close(self):
+        if self.index_watcher:
+            self.index_watcher.stop()
+        if self.args.hash_index:
+            self.master_hash_list.save(self.hash_index_path, merge=True)
+            logger.info(f"Saved {len(self.master_hash_list)} hashes to {self.hash_index_path}")
+        if self.download_index:
+            self.download_index.close()
+        super(RedditDownloader, self).close()
+
+    def create_download_index(self) -> Optional[DownloadIndex]:
+        if not self.args.download_index:
+            return None
+        return DownloadIndex(Path(self.args.download_index).resolve().expanduser())
+
+    def _recorded_as_downloaded(self, submission: praw.models.Submission) -> bool:
+        if not self.download_index.is_complete(submission.id):
+            return False
+        files = self.download_index.get_files(submission.id)
+        # Resources with an excluded hash are recorded at the path they would have had, but never stored
+        return bool(files) and all(self._stored(path) or self._known_url_excluded(url) for url, path in files)
+
+    def _stored(self, path: Path) -> bool:
+        try:
+            return self.storage.exists(path)
+        except errors.BulkDownloaderException as e:
+            # The index is shared between download directories, and some backends can only see their own
+            logger.debug(f"Not looking for {path} in storage: {e}")
+            return False
+
+    def find_existing_hashes(self) -> dict[str, Path]:
+        hashes = {}
+        for index_root in self.args.index_root:
+            index_root = Path(index_root).resolve().expanduser()
+            logger.info(f"Searching for existing files in {index_root}")
+            hashes.update(self.scan_existing_files(index_root))
+        own_hashes = self.storage.hash_list()
+        if own_hashes is None:
+            own_hashes = self.scan_existing_files(self.download_directory)
+        hashes.update(own_hashes)
+        return hashes
+
+    @staticmethod
+    def read_hash_files(file_locations: list[str]) -> set[str]:
+        """Read MD5 hex digests from files with one per line, optionally followed by a path as md5sum writes them"""
+        out = set()
+        for hash_file in file_locations:
+            hash_file = Path(hash_file).resolve().expanduser()
+            if not hash_file.exists():
+                logger.warning(f"Hash file at {hash_file} does not exist")
+                continue
+            with hash_file.open("r") as file:
+                for line in file:
+                    fields = line.split(maxsplit=1)
+                    if not fields or fields[0].startswith("#"):
+                        continue
+                    if not re.fullmatch(r"[0-9a-fA-F]{32}", fields[0]):
+                        logger.warning(f"Ignoring line in {hash_file} that is not an MD5 hash: {line.strip()}")
+                        continue
+                    out.add(fields[0].lower())
+        if out:
+            logger.debug(f"Loaded {len(out)} excluded hashes")
+        return out
+
+    def load_hash_index(self) -> DigestIndex:
+        self.hash_index_path = Path(self.args.hash_index).resolve().expanduser()
+        if self.hash_index_path.exists():
+            hash_index = DigestIndex.load(self.hash_index_path)
+            logger.info(f"Loaded hash index {self.hash_index_path}")
+        elif self.args.search_existing:
+            hash_index = DigestIndex(self.find_existing_hashes())
+        else:
+            hash_index = DigestIndex()
+        return hash_index
 
     def _download_submission(self, submission: praw.models.Submission):
         if submission.id in self.excluded_submission_ids:
@@ -91,67 +177,189 @@ class RedditDownloader(RedditConnector):
         elif not self.download_filter.check_url(submission.url):
             logger.debug(f"Submission {submission.id} filtered due to URL {submission.url}")
             return
+        elif self.download_index and self._recorded_as_downloaded(submission):
+            logger.debug(f"Submission {submission.id} already downloaded according to the download index")
+            return
 
         logger.debug(f"Attempting to download submission {submission.id}")
-        try:
-            downloader_class = DownloadFactory.pull_lever(submission.url)
-            downloader = downloader_class(submission)
-            logger.debug(f"Using {downloader_class.__name__} with url {submission.url}")
-        except errors.NotADownloadableLinkError as e:
-            logger.error(f"Could not download submission {submission.id}: {e}")
-            return
-        if downloader_class.__name__.lower() in self.args.disable_module:
-            logger.debug(f"Submission {submission.id} skipped due to disabled module {downloader_class.__name__}")
-            return
-        try:
-            content = downloader.find_resources(self.authenticator)
-        except errors.SiteDownloaderError as e:
-            logger.error(f"Site {downloader_class.__name__} failed to download submission {submission.id}: {e}")
-            return
+        if self.args.preview_width and (content := self._find_preview_resources(submission)):
+            downloader_class = Preview
+        else:
+            try:
+                downloader_class = DownloadFactory.pull_lever(submission.url)
+                downloader = downloader_class(submission)
+                logger.debug(f"Using {downloader_class.__name__} with url {submission.url}")
+            except errors.NotADownloadableLinkError as e:
+                logger.error(f"Could not download submission {submission.id}: {e}")
+                return
+            if downloader_class.__name__.lower() in self.args.disable_module:
+                logger.debug(f"Submission {submission.id} skipped due to disabled module {downloader_class.__name__}")
+                return
+            try:
+                content = downloader.find_resources(self.authenticator)
+            except errors.SiteDownloaderError as e:
+                logger.error(f"Site {downloader_class.__name__} failed to download submission {submission.id}: {e}")
+                return
+        record = SubmissionRecord.from_submission(submission)
+        for res in content:
+            res.source_submission = record
+        if self.file_name_formatter.requires_content_hash:
+            content = self._download_before_formatting(content, record, downloader_class.__name__)
+            if content is None:
+                return
         for destination, res in self.file_name_formatter.format_resource_paths(content, self.download_directory):
-            if destination.exists():
-                logger.debug(f"File {destination} from submission {submission.id} already exists, continuing")
+            if self.storage.exists(destination):
+                logger.debug(f"File {destination} from submission {record.id} already exists, continuing")
+                if self.download_index:
+                    self.download_index.record_file(record.id, res.url, destination)
                 continue
             elif not self.download_filter.check_resource(res):
-                logger.debug(f"Download filter removed {submission.id} file with URL {submission.url}")
+                logger.debug(f"Download filter removed {record.id} file with URL {record.url}")
+                continue
+            elif self.download_index and self._known_url_excluded(res.url):
+                logger.debug(f"Resource at {res.url} from submission {record.id} is known to have an excluded hash")
+                self.download_index.record_file(record.id, res.url, destination)
+                continue
+            elif self.download_index and self._reuse_seen_url(record, res, destination):
                 continue
             try:
                 res.download({"max_wait_time": self.args.max_wait_time})
             except errors.BulkDownloaderException as e:
                 logger.error(
-                    f"Failed to download resource {res.url} in submission {submission.id} "
+                    f"Failed to download resource {res.url} in submission {record.id} "
                     f"with downloader {downloader_class.__name__}: {e}"
                 )
                 return
             resource_hash = res.hash.hexdigest()
-            destination.parent.mkdir(parents=True, exist_ok=True)
+            if resource_hash in self.excluded_hashes:
+                logger.info(f"Resource hash {resource_hash} from submission {record.id} is excluded, discarding")
+                if self.download_index:
+                    self.download_index.record_file(record.id, res.url, destination)
+                    self._record_url(res, destination)
+                continue
             if resource_hash in self.master_hash_list:
                 if self.args.no_dupes:
-                    logger.info(f"Resource hash {resource_hash} from submission {submission.id} downloaded elsewhere")
+                    logger.info(f"Resource hash {resource_hash} from submission {record.id} downloaded elsewhere")
                     return
-                elif self.args.make_hard_links:
+                elif self.args.make_hard_links or self.args.make_reflinks:
                     try:
-                        destination.hardlink_to(self.master_hash_list[resource_hash])
-                    except AttributeError:
-                        self.master_hash_list[resource_hash].link_to(destination)
-                    logger.info(
-                        f"Hard link made linking {destination} to {self.master_hash_list[resource_hash]}"
-                        f" in submission {submission.id}"
-                    )
-                    return
+                        link_kind = self._link_duplicate(
+                            destination, self.master_hash_list[resource_hash], resource_hash
+                        )
+                    except (OSError, errors.BulkDownloaderException) as e:
+                        logger.warning(
+                            f"Failed to link {destination} to {self.master_hash_list[resource_hash]},"
+                            f" writing the file instead: {e}"
+                        )
+                    else:
+                        if self.download_index:
+                            self.download_index.record_file(record.id, res.url, destination)
+                            self._record_url(res, destination)
+                        logger.info(
+                            f"{link_kind} made linking {destination} to {self.master_hash_list[resource_hash]}"
+                            f" in submission {record.id}"
+                        )
+                        return
+            creation_time = time.mktime(datetime.fromtimestamp(record.created_utc).timetuple())
+            if self.index_watcher:
+                self.index_watcher.expect(destination, resource_hash)
             try:
-                with destination.open("wb") as file:
-                    file.write(res.content)
+                self.storage.write(destination, res.content, creation_time, exclusive=True)
                 logger.debug(f"Written file to {destination}")
+            except FileExistsError:
+                logger.debug(f"File {destination} from submission {record.id} was written by another process")
+                continue
             except OSError as e:
                 logger.exception(e)
-                logger.error(f"Failed to write file in submission {submission.id} to {destination}: {e}")
+                logger.error(f"Failed to write file in submission {record.id} to {destination}: {e}")
                 return
-            creation_time = time.mktime(datetime.fromtimestamp(submission.created_utc).timetuple())
-            os.utime(destination, (creation_time, creation_time))
             self.master_hash_list[resource_hash] = destination
             logger.debug(f"Hash added to master list: {resource_hash}")
-        logger.info(f"Downloaded submission {submission.id} from {submission.subreddit.display_name}")
+            if self.download_index:
+                self.download_index.record_file(record.id, res.url, destination)
+                self._record_url(res, destination)
+        if self.download_index:
+            self.download_index.mark_complete(record.id)
+        logger.info(f"Downloaded submission {record.id} from {record.subreddit}")
+
+    def _known_url_excluded(self, url: str) -> bool:
+        if not self.excluded_hashes:
+            return False
+        seen = self.download_index.get_url(url)
+        return seen is not None and seen.hash in self.excluded_hashes
+
+    def _reuse_seen_url(self, submission: SubmissionRecord, res: Resource, destination: Path) -> bool:
+        """Link or skip a resource whose URL was stored in an earlier run, without requesting it again"""
+        seen = self.download_index.get_url(res.url)
+        if seen is None or not self._stored(seen.path):
+            return False
+        if self.args.revalidate_urls and not Resource.revalidate(res.url, seen.etag):
+            logger.debug(f"Resource at {res.url} could not be revalidated, downloading again")
+            return False
+        if self.args.make_hard_links or self.args.make_reflinks:
+            try:
+                link_kind = self._link_duplicate(destination, seen.path, seen.hash)
+            except (OSError, errors.BulkDownloaderException) as e:
+                logger.warning(f"Failed to link {destination} to {seen.path}, downloading again: {e}")
+                return False
+            self.download_index.record_file(submission.id, res.url, destination)
+            logger.info(f"{link_kind} made linking {destination} to {seen.path} in submission {submission.id}")
+        else:
+            self.download_index.record_file(submission.id, res.url, seen.path)
+            logger.debug(f"Resource at {res.url} from submission {submission.id} already stored at {seen.path}")
+        self.master_hash_list.setdefault(seen.hash, seen.path)
+        return True
+
+    def _link_duplicate(self, destination: Path, target: Path, resource_hash: str) -> str:
+        if self.index_watcher:
+            self.index_watcher.expect(destination, resource_hash)
+        if self.args.make_reflinks:
+            return self.storage.clone(destination, target)
+        self.storage.link(destination, target)
+        return "Hard link"
+
+    def _record_url(self, res: Resource, destination: Path):
+        self.download_index.record_url(
+            res.url,
+            res.hash.hexdigest(),
+            destination,
+            res.response_info.get("etag"),
+            len(res.content),
+        )
+
+    def _download_before_formatting(
+        self,
+        resources: list[Resource],
+        submission: SubmissionRecord,
+        downloader_name: str,
+    ) -> Optional[list[Resource]]:
+        """Download resources up front, as their paths depend on the content hash"""
+        out = []
+        for res in resources:
+            if not self.download_filter.check_resource(res):
+                logger.debug(f"Download filter removed {submission.id} file with URL {submission.url}")
+                continue
+            try:
+                res.download({"max_wait_time": self.args.max_wait_time})
+            except errors.BulkDownloaderException as e:
+                logger.error(
+                    f"Failed to download resource {res.url} in submission {submission.id} "
+                    f"with downloader {downloader_name}: {e}"
+                )
+                return None
+            out.append(res)
+        return out
+
+    def _find_preview_resources(self, submission: praw.models.Submission) -> list[Resource]:
+        if "preview" in self.args.disable_module:
+            return []
+        try:
+            content = Preview(submission, self.args.preview_width).find_resources(self.authenticator)
+        except errors.SiteDownloaderError as e:
+            logger.debug(f"Preview not used for submission {submission.id}: {e}")
+            return []
+        logger.debug(f"Using previews of at most {self.args.preview_width} pixels wide for {submission.id}")
+        return content
 
     @staticmethod
     def scan_existing_files(directory: Path) -> dict[str, Path]:
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import prawcore
+
 
 class BulkDownloaderException(Exception):
     pass
@@ -28,3 +30,15 @@ class NotADownloadableLinkError(SiteDownloaderError):
 
 class ResourceNotFound(SiteDownloaderError):
     pass
+
+
+class ContentMismatchError(SiteDownloaderError):
+    pass
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a request to Reddit failed in a way that may succeed if it is made again"""
+    if isinstance(error, (prawcore.ServerError, prawcore.RequestException)):
+        return True
+    # Checked by status rather than class, as TooManyRequests is missing from older versions of prawcore
+    return isinstance(error, prawcore.ResponseException) and error.response.status_code == 429
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from pathlib import Path
+from typing import Optional, TextIO
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """An advisory lock held on a separate lock file, shared by every BDFR process that uses the same path
+
+    Platforms without fcntl, such as Windows, are not locked at all.
+    """
+
+    def __init__(self, lock_path: Path):
+        self.lock_path = lock_path
+        self._file: Optional[TextIO] = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if fcntl is None:
+            return True
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.lock_path.open("a")
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+        logger.log(9, f"Acquired lock {self.lock_path}")
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *_):
+        self.release()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import datetime
+import hashlib
 import logging
 import platform
 import re
@@ -13,6 +14,7 @@ from praw.models import Comment, Submission
 
 from bdfr.exceptions import BulkDownloaderException
 from bdfr.resource import Resource
+from bdfr.submission_record import SubmissionRecord
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +29,9 @@ class FileNameFormatter:
         "title",
         "upvotes",
     )
+    shard_pattern = re.compile(r"(?i){(postid_shard|hash_shard)(?::(\d+))?}")
+    default_shard_length = 2
+    max_shard_length = 8
     WINDOWS_MAX_PATH_LENGTH = 260
     LINUX_MAX_PATH_LENGTH = 4096
 
@@ -39,6 +44,9 @@ class FileNameFormatter:
     ):
         if not self.validate_string(file_format_string):
             raise BulkDownloaderException(f'"{file_format_string}" is not a valid format string')
+        for match in re.finditer(self.shard_pattern, file_format_string + directory_format_string):
+            if match.group(2) and not 0 < int(match.group(2)) <= self.max_shard_length:
+                raise BulkDownloaderException(f"Shard length must be between 1 and {self.max_shard_length}")
         self.file_format_string = file_format_string
         self.directory_format_string: list[str] = directory_format_string.split("/")
         self.time_format_string = time_format_string
@@ -48,14 +56,32 @@ class FileNameFormatter:
         else:
             self.max_path = self.find_max_path_length()
 
-    def _format_name(self, submission: Union[Comment, Submission], format_string: str) -> str:
-        if isinstance(submission, Submission):
+    @property
+    def requires_content_hash(self) -> bool:
+        """Whether resources must be downloaded before their paths can be formatted"""
+        schemes = [self.file_format_string, *self.directory_format_string]
+        return any(match.group(1).lower() == "hash_shard" for s in schemes for match in self.shard_pattern.finditer(s))
+
+    @property
+    def requires_submission_details(self) -> bool:
+        """Whether paths depend on anything about a submission other than its ID"""
+        schemes = "/".join([self.file_format_string, *self.directory_format_string])
+        return any(re.search(rf"(?i){{{key}}}", schemes) for key in self.key_terms if key != "postid")
+
+    def _format_name(
+        self,
+        submission: Union[Comment, Submission, SubmissionRecord],
+        format_string: str,
+        content_hash: Optional[str] = None,
+    ) -> str:
+        if isinstance(submission, (Submission, SubmissionRecord)):
             attributes = self._generate_name_dict_from_submission(submission)
         elif isinstance(submission, Comment):
             attributes = self._generate_name_dict_from_comment(submission)
         else:
             raise BulkDownloaderException(f"Cannot name object {type(submission).__name__}")
-        result = format_string
+        # Shards are expanded first, so that text in a title or flair that looks like a shard key is left alone
+        result = re.sub(self.shard_pattern, lambda m: self._format_shard(m, submission.id, content_hash), format_string)
         for key in attributes.keys():
             if re.search(rf"(?i).*{{{key}}}.*", result):
                 key_value = str(attributes.get(key, "unknown"))
@@ -73,6 +99,15 @@ class FileNameFormatter:
             result = FileNameFormatter._format_for_windows(result)
         return result
 
+    def _format_shard(self, match: re.Match, post_id: str, content_hash: Optional[str]) -> str:
+        length = int(match.group(2)) if match.group(2) else self.default_shard_length
+        if match.group(1).lower() == "postid_shard":
+            # Reddit IDs are sequential, so they are hashed to spread posts evenly across the shards
+            return hashlib.md5(post_id.encode("utf-8")).hexdigest()[:length]
+        if content_hash is None:
+            raise BulkDownloaderException("The content hash is required to format {HASH_SHARD}")
+        return content_hash[:length]
+
     @staticmethod
     def _convert_unicode_escapes(in_string: str) -> str:
         pattern = re.compile(r"(\\u\d{4})")
@@ -83,11 +118,13 @@ class FileNameFormatter:
                 in_string = in_string.replace(match, converted_match)
         return in_string
 
-    def _generate_name_dict_from_submission(self, submission: Submission) -> dict:
+    def _generate_name_dict_from_submission(self, submission: Union[Submission, SubmissionRecord]) -> dict:
+        if isinstance(submission, Submission):
+            submission = SubmissionRecord.from_submission(submission)
         submission_attributes = {
             "title": submission.title,
-            "subreddit": submission.subreddit.display_name,
-            "redditor": submission.author.name if submission.author else "DELETED",
+            "subreddit": submission.subreddit,
+            "redditor": submission.author or "DELETED",
             "postid": submission.id,
             "upvotes": submission.score,
             "flair": submission.link_flair_text,
@@ -120,14 +157,18 @@ class FileNameFormatter:
         destination_directory: Path,
         index: Optional[int] = None,
     ) -> Path:
+        content_hash = resource.hash.hexdigest() if resource.hash else None
         subfolder = Path(
             destination_directory,
-            *[self._format_name(resource.source_submission, part) for part in self.directory_format_string],
+            *[
+                self._format_name(resource.source_submission, part, content_hash)
+                for part in self.directory_format_string
+            ],
         )
         index = f"_{index}" if index else ""
         if not resource.extension:
             raise BulkDownloaderException(f"Resource from {resource.url} has no extension")
-        file_name = str(self._format_name(resource.source_submission, self.file_format_string))
+        file_name = str(self._format_name(resource.source_submission, self.file_format_string, content_hash))
 
         file_name = re.sub(r"\n", " ", file_name)
 
@@ -202,7 +243,9 @@ class FileNameFormatter:
     def validate_string(test_string: str) -> bool:
         if not test_string:
             return False
-        result = any([f"{{{key}}}" in test_string.lower() for key in FileNameFormatter.key_terms])
+        result = any([f"{{{key}}}" in test_string.lower() for key in FileNameFormatter.key_terms]) or bool(
+            re.search(FileNameFormatter.shard_pattern, test_string)
+        )
         if result:
             if "POSTID" not in test_string:
                 logger.warning(
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from pathlib import Path
+from typing import Optional, Union
+
+import praw.models
+
+from bdfr.file_lock import FileLock
+from bdfr.listing_checkpoints import listing_key, unwrap_listing
+from bdfr.persistent_state import PersistentState
+
+logger = logging.getLogger(__name__)
+
+RedditItem = Union[praw.models.Submission, praw.models.Comment]
+
+
+class IncrementalState:
+    """The newest item seen in each listing sorted by new, kept between runs for each download directory
+
+    A listing can stop being read once it reaches items that are no older than its high-water mark, as everything
+    past that point was read on an earlier run. Marks are only ever moved forward.
+    """
+
+    def __init__(self, state_path: Path, download_directory: Path, known_limit: int):
+        self.state_path = state_path
+        self.lock = FileLock(Path(state_path.parent, f".{state_path.name}.lock"))
+        self.download_directory = download_directory
+        self.known_limit = known_limit
+        self.marks = PersistentState(state_path)
+
+    def source_key(self, generator) -> Optional[str]:
+        """Identify a listing between runs, or return None if it is not ordered by time"""
+        listing = unwrap_listing(generator)
+        if listing is None:
+            return None
+        if not (listing.url.rstrip("/").endswith("/new") or listing.params.get("sort") == "new"):
+            return None
+        return listing_key(listing, self.download_directory)
+
+    def get(self, source: str) -> Optional[dict]:
+        return self.marks.get(source)
+
+    @staticmethod
+    def is_known(item: RedditItem, mark: dict) -> bool:
+        return item.id == mark["id"] or item.created_utc <= mark["created_utc"]
+
+    def record(self, source: str, item: RedditItem):
+        mark = {"id": item.id, "created_utc": item.created_utc}
+        with self.lock:
+            # Reread the file so that marks saved by other runs since this one started are kept
+            self.marks = PersistentState(self.state_path)
+            previous = self.marks.get(source)
+            if previous is not None and previous["created_utc"] >= mark["created_utc"]:
+                return
+            self.marks[source] = mark
+            self.marks.save()
+        logger.debug(f"Moved incremental mark for {source} to {item.id}")
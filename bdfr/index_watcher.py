@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+from collections.abc import Callable, MutableMapping
+from pathlib import Path
+from typing import Optional
+
+from bdfr.exceptions import BulkDownloaderException
+
+logger = logging.getLogger(__name__)
+
+# From sys/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+
+class IndexWatcher(threading.Thread):
+    """Keep a mapping of hashes to paths up to date with changes made to a directory while the BDFR is running
+
+    Files written, moved, or linked into the directory are hashed and added, and files that are deleted or moved out
+    of it are removed. This uses Linux inotify, so it is only available on Linux.
+
+    Only the paths of files seen while watching are kept in memory. The hashes of indexed files that are removed or
+    replaced are found with one pass over the mapping for each batch of changes read from inotify, so removing many
+    files at once costs few passes. Files that the downloader expects to write are not hashed again.
+    """
+
+    watch_mask = IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+    event_header = struct.Struct("iIII")
+    ignored_prefix = ".bdfr-"
+
+    def __init__(self, directory: Path, hash_list: MutableMapping[str, Path]):
+        super(IndexWatcher, self).__init__(name="IndexWatcher", daemon=True)
+        if not sys.platform.startswith("linux"):
+            raise BulkDownloaderException("Watching the download directory requires Linux")
+        self.directory = directory
+        self.hash_list = hash_list
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise BulkDownloaderException(f"Could not start inotify: {os.strerror(ctypes.get_errno())}")
+        self._watches: dict[int, Path] = {}
+        self._paths: dict[Path, str] = {}
+        self._expected: set[Path] = set()
+        self._created: set[Path] = set()
+        self._looked_up: dict[Path, str] = {}
+        self._stop_event = threading.Event()
+        self._add_tree(directory)
+        logger.debug(f"Watching {len(self._watches)} directories in {directory}")
+
+    def expect(self, path: Path, file_hash: str):
+        """Note a file that is about to be written or linked with content of a known hash"""
+        self._paths[path] = file_hash
+        self._expected.add(path)
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        os.close(self._fd)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([self._fd], [], [], 0.5)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            self._handle_events(self._parse_events(data))
+
+    def _handle_events(self, events: list[tuple[int, int, str]]):
+        self._look_up_indexed(events)
+        try:
+            for watch, mask, name in events:
+                try:
+                    self._handle_event(watch, mask, name)
+                except OSError as e:
+                    logger.debug(f"Could not process change to {name}: {e}")
+        finally:
+            self._looked_up = {}
+
+    def _look_up_indexed(self, events: list[tuple[int, int, str]]):
+        """Find the hashes of every indexed file that a batch of events removes or replaces in one pass"""
+        files = set()
+        directories = []
+        created = set()
+        for watch, mask, name in events:
+            parent = self._watches.get(watch)
+            if parent is None or name.startswith(self.ignored_prefix):
+                continue
+            path = Path(parent, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_MOVED_FROM | IN_DELETE):
+                    directories.append(path)
+            elif mask & IN_CREATE:
+                created.add(path)
+            elif path not in self._paths and path not in self._created and path not in created:
+                if mask & (IN_MOVED_FROM | IN_DELETE | IN_CLOSE_WRITE | IN_MOVED_TO):
+                    files.add(path)
+        if files or directories:
+            self._looked_up = self._find_indexed(
+                lambda indexed: indexed in files or any(indexed.is_relative_to(d) for d in directories)
+            )
+
+    def _parse_events(self, data: bytes) -> list[tuple[int, int, str]]:
+        out = []
+        offset = 0
+        while offset < len(data):
+            watch, mask, _cookie, length = self.event_header.unpack_from(data, offset)
+            start = offset + self.event_header.size
+            offset = start + length
+            name = data[start:offset].rstrip(b"\0").decode("utf-8", errors="surrogateescape")
+            out.append((watch, mask, name))
+        return out
+
+    def _handle_event(self, watch: int, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            logger.warning("Too many changes to track in the download directory; the hash index may be out of date")
+            return
+        if mask & IN_IGNORED:
+            self._watches.pop(watch, None)
+            return
+        parent = self._watches.get(watch)
+        if parent is None or name.startswith(self.ignored_prefix):
+            return
+        path = Path(parent, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_tree(path)
+                self._add_files(path)
+            elif mask & (IN_MOVED_FROM | IN_DELETE):
+                self._remove_tree(path)
+            return
+        if mask & IN_CREATE:
+            self._created.add(path)
+        if mask & (IN_MOVED_FROM | IN_DELETE):
+            self._remove_file(path)
+        elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) or (mask & IN_CREATE and path.stat().st_size > 0):
+            # New hard links are never followed by a write; a file still being written is hashed again once closed
+            if path in self._expected:
+                self._expected.discard(path)
+                return
+            # Only a file that replaced an existing one can already be in the index under this path
+            self._add_file(path, replaced=path not in self._created)
+
+    def _add_tree(self, directory: Path):
+        for dirpath, _dirnames, _filenames in os.walk(directory):
+            watch = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), self.watch_mask)
+            if watch < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    logger.warning("The inotify watch limit has been reached; raise fs.inotify.max_user_watches")
+                    return
+                logger.debug(f"Could not watch {dirpath}: {os.strerror(error)}")
+                continue
+            self._watches[watch] = Path(dirpath)
+
+    def _add_files(self, directory: Path):
+        for dirpath, _dirnames, filenames in os.walk(directory):
+            for filename in filenames:
+                if not filename.startswith(self.ignored_prefix):
+                    self._add_file(Path(dirpath, filename), replaced=False)
+
+    def _add_file(self, path: Path, replaced: bool = True):
+        md5_hash = hashlib.md5()
+        with path.open("rb") as file:
+            while chunk := file.read(1024 * 1024):
+                md5_hash.update(chunk)
+        file_hash = md5_hash.hexdigest()
+        self._remove_file(path, lookup=replaced)
+        self.hash_list[file_hash] = path
+        self._paths[path] = file_hash
+        logger.log(9, f"Added {path} to the hash index")
+
+    def _remove_file(self, path: Path, file_hash: Optional[str] = None, lookup: bool = True):
+        self._created.discard(path)
+        file_hash = self._paths.pop(path, file_hash)
+        if file_hash is None and lookup:
+            file_hash = self._looked_up.get(path)
+        if file_hash is not None and self.hash_list.get(file_hash) == path:
+            del self.hash_list[file_hash]
+            logger.log(9, f"Removed {path} from the hash index")
+
+    def _remove_tree(self, directory: Path):
+        # Collected before any are removed, as removing a path changes the maps being read
+        removed = {path: file_hash for path, file_hash in self._looked_up.items() if path.is_relative_to(directory)}
+        removed.update(
+            {path: file_hash for path, file_hash in list(self._paths.items()) if path.is_relative_to(directory)}
+        )
+        for path, file_hash in removed.items():
+            self._remove_file(path, file_hash)
+
+    def _find_indexed(self, matches: Callable[[Path], bool]) -> dict[Path, str]:
+        # The downloader can add to the mapping while it is being read, which ends the iteration early
+        while True:
+            try:
+                return {Path(path): file_hash for file_hash, path in self.hash_list.items() if matches(Path(path))}
+            except RuntimeError:
+                continue
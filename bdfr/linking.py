@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# From linux/fs.h, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+def hard_link(destination: Path, target: Path):
+    try:
+        destination.hardlink_to(target)
+    except AttributeError:
+        target.link_to(destination)
+
+
+def reflink(destination: Path, target: Path):
+    """Create a copy-on-write clone of the target, which shares its blocks until either file is changed
+
+    Raises an OSError if the platform or filesystem does not support cloning, such as ext4 or files on
+    different filesystems.
+    """
+    if fcntl is None or not hasattr(fcntl, "ioctl"):
+        raise OSError("Reflinks are not supported on this platform")
+    with target.open("rb") as source, destination.open("xb") as clone:
+        try:
+            fcntl.ioctl(clone.fileno(), FICLONE, source.fileno())
+        except OSError:
+            clone.close()
+            destination.unlink()
+            raise
+    shutil.copystat(target, destination)
+
+
+def claim(temp_path: Path, destination: Path):
+    """Give a finished temporary file the destination name, raising FileExistsError if anything is already there"""
+    # Linking fails if the destination exists, so only one process can ever claim it
+    try:
+        os.link(temp_path, destination)
+    except FileExistsError:
+        raise
+    except OSError:
+        # Filesystems without hard links can still claim the name atomically, but briefly show an empty file
+        os.close(os.open(destination, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        os.replace(temp_path, destination)
+
+
+def clone_file(destination: Path, target: Path) -> str:
+    """Reflink the target to the destination, falling back to a hard link and then to a copy
+
+    Returns a description of the kind of link that was made. Nothing already at the destination is ever replaced; a
+    FileExistsError is raised instead.
+    """
+    try:
+        reflink(destination, target)
+        return "Reflink"
+    except FileExistsError:
+        raise
+    except OSError as e:
+        logger.debug(f"Could not reflink {destination} to {target}: {e}")
+    try:
+        hard_link(destination, target)
+        return "Hard link"
+    except FileExistsError:
+        raise
+    except OSError as e:
+        logger.debug(f"Could not hard link {destination} to {target}: {e}")
+    fd, temp_name = tempfile.mkstemp(prefix=".bdfr-", suffix=".part", dir=destination.parent)
+    os.close(fd)
+    temp_path = Path(temp_name)
+    try:
+        shutil.copy2(target, temp_path)
+        claim(temp_path, destination)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    return "Copy"
+
+
+def replace_with_link(duplicate: Path, original: Path, use_reflink: bool = False):
+    """Replace a file with a link to another, so the duplicate is never missing if this is interrupted
+
+    The link is made at a temporary name in the same directory and then renamed over the duplicate.
+    """
+    temp_path = Path(duplicate.parent, f".{duplicate.name}.{os.getpid()}.link")
+    if use_reflink:
+        reflink(temp_path, original)
+    else:
+        hard_link(temp_path, original)
+    try:
+        os.replace(temp_path, duplicate)
+    except OSError:
+        temp_path.unlink()
+        raise
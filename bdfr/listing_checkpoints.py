@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlencode
+
+import praw.models
+
+from bdfr.combined_listing import CombinedListing
+from bdfr.file_lock import FileLock
+from bdfr.persistent_state import PersistentState
+
+logger = logging.getLogger(__name__)
+
+# Parameters that PRAW changes while paging through a listing, or that do not change which listing it is
+PAGING_PARAMS = ("after", "before", "count", "limit")
+
+
+def unwrap_listing(generator) -> Optional[praw.models.ListingGenerator]:
+    """Find the PRAW listing that a source reads from, if it has one"""
+    listing = generator.listing if isinstance(generator, CombinedListing) else generator
+    return listing if isinstance(listing, praw.models.ListingGenerator) else None
+
+
+def listing_key(listing: praw.models.ListingGenerator, download_directory: Path) -> str:
+    """Identify a listing between runs into the same download directory"""
+    params = {key: value for key, value in listing.params.items() if key not in PAGING_PARAMS}
+    query = urlencode(sorted(params.items()))
+    return f"{download_directory}|{listing.url}" + (f"?{query}" if query else "")
+
+
+class ListingCheckpoints:
+    """The page that each listing had reached, so that reading it can continue after a crash
+
+    A checkpoint is the `after` fullname that Reddit gave for the page being read, along with how many items had been
+    read before it. It is saved when a new page is started, so that resuming repeats at most one page.
+    """
+
+    def __init__(self, state_path: Path):
+        self.state_path = state_path
+        self.lock = FileLock(Path(state_path.parent, f".{state_path.name}.lock"))
+        self.checkpoints = PersistentState(state_path)
+
+    def restore(self, key: str, listing: praw.models.ListingGenerator) -> bool:
+        checkpoint = self.checkpoints.get(key)
+        if checkpoint is None:
+            return False
+        listing.params["after"] = checkpoint["after"]
+        listing.yielded = checkpoint["yielded"]
+        logger.info(f"Resuming {listing.url} after {checkpoint['after']}, {checkpoint['yielded']} items in")
+        return True
+
+    def save(self, key: str, after: str, yielded: int):
+        self._update(key, {"after": after, "yielded": yielded})
+
+    def clear(self, key: str):
+        if key in self.checkpoints:
+            self._update(key, None)
+
+    def _update(self, key: str, checkpoint: Optional[dict]):
+        with self.lock:
+            # Reread the file so that checkpoints saved by other runs since this one started are kept
+            self.checkpoints = PersistentState(self.state_path)
+            if checkpoint is None:
+                self.checkpoints.pop(key, None)
+            else:
+                self.checkpoints[key] = checkpoint
+            self.checkpoints.save()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import tempfile
+from collections.abc import Iterator, MutableMapping
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentState(MutableMapping):
+    """A JSON object stored in a file that is kept between runs
+
+    Saving writes a temporary file and moves it into place, so an interrupted save leaves the previous state intact.
+    A missing or unreadable file is treated as empty.
+    """
+
+    def __init__(self, state_path: Path):
+        self.state_path = state_path
+        self._data: dict[str, Any] = {}
+        if state_path.exists():
+            try:
+                with state_path.open("r", encoding="utf-8") as file:
+                    self._data = json.load(file)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Could not read state from {state_path}, starting again: {e}")
+                self._data = {}
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __setitem__(self, key: str, value: Any):
+        self._data[key] = value
+
+    def __delitem__(self, key: str):
+        del self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def save(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(prefix=f".{self.state_path.name}.", dir=self.state_path.parent)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(self._data, file)
+            os.replace(temp_name, self.state_path)
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
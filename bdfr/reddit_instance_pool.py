@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import math
+import threading
+import time
+
+import praw
+
+logger = logging.getLogger(__name__)
+
+
+class RedditInstancePool:
+    """Several Reddit instances, each using a different API app and so each with its own rate limit
+
+    Work is given to whichever instance has the most requests left in its current rate limit window, as last reported
+    by Reddit. Instances that have not been used yet, or whose window has reset, are treated as having the full limit,
+    and ties go to the instance that has been chosen least.
+    """
+
+    def __init__(self, instances: list[praw.Reddit]):
+        if not instances:
+            raise ValueError("A pool needs at least one Reddit instance")
+        self.instances = instances
+        self._uses = [0] * len(instances)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.instances)
+
+    def choose(self) -> praw.Reddit:
+        with self._lock:
+            now = time.time()
+            best = max(
+                range(len(self.instances)), key=lambda i: (self._remaining(self.instances[i], now), -self._uses[i])
+            )
+            self._uses[best] += 1
+            return self.instances[best]
+
+    @staticmethod
+    def _remaining(instance: praw.Reddit, now: float) -> float:
+        limits = instance.auth.limits
+        if limits.get("remaining") is None:
+            return math.inf
+        if limits.get("reset_timestamp") is not None and limits["reset_timestamp"] <= now:
+            return math.inf
+        return limits["remaining"]
+
+    def log_usage(self):
+        for instance, uses in zip(self.instances, self._uses):
+            limits = instance.auth.limits
+            logger.debug(
+                f"Reddit app {instance.config.client_id} was chosen {uses} times"
+                f" with {limits.get('remaining')} requests remaining"
+            )
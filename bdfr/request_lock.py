@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools
+import logging
+import threading
+
+import praw
+
+logger = logging.getLogger(__name__)
+
+
+def lock_requests(reddit_instance: praw.Reddit):
+    """Make the requests sent through a Reddit instance one at a time, so that it can be shared between threads
+
+    The prawcore rate limiter waits, makes the request, and then records the remaining limit from the response, with
+    nothing to stop another thread from doing the same in between. Threads sharing an instance would then each wait on
+    the same out of date figures and send their requests together. Holding a lock over the whole of each rate limited
+    call keeps the limiter's figures current for every request, and also covers refreshing the access token.
+    """
+    sessions = {getattr(reddit_instance, "_read_only_core", None), getattr(reddit_instance, "_authorized_core", None)}
+    for session in sessions - {None}:
+        rate_limiter = session._rate_limiter
+        lock = threading.Lock()
+        call = rate_limiter.call
+
+        @functools.wraps(call)
+        def locked_call(*args, _call=call, _lock=lock, **kwargs):
+            with _lock:
+                return _call(*args, **kwargs)
+
+        rate_limiter.call = locked_call
@@ -13,18 +13,46 @@ import _hashlib
 import requests
 from praw.models import Submission
 
-from bdfr.exceptions import BulkDownloaderException
+from bdfr.exceptions import BulkDownloaderException, ContentMismatchError
 
 logger = logging.getLogger(__name__)
 
 
 class Resource:
+    # Magic numbers for the media types that hosts commonly substitute with error pages
+    content_signatures = {
+        "image": (
+            (0, b"\xff\xd8\xff"),
+            (0, b"\x89PNG\r\n\x1a\n"),
+            (0, b"GIF87a"),
+            (0, b"GIF89a"),
+            (8, b"WEBP"),
+            (0, b"BM"),
+        ),
+        "video": (
+            (4, b"ftyp"),
+            (0, b"\x1a\x45\xdf\xa3"),
+            (0, b"FLV"),
+            (0, b"OggS"),
+        ),
+    }
+    media_extensions = {
+        "image": (".bmp", ".gif", ".jpeg", ".jpg", ".png", ".webp"),
+        "video": (".flv", ".m4v", ".mkv", ".mov", ".mp4", ".ogv", ".webm"),
+    }
+    # MD5 digests of the "this image was removed" placeholders served with a 200 code
+    placeholder_hashes = {
+        "d835884373f4d6c8f24742ceabe74946",  # i.imgur.com/removed.png
+    }
+    sniff_length = 512
+
     def __init__(self, source_submission: Submission, url: str, download_function: Callable, extension: str = None):
         self.source_submission = source_submission
         self.content: Optional[bytes] = None
         self.url = url
         self.hash: Optional[_hashlib.HASH] = None
         self.extension = extension
+        self.response_info: dict = {}
         self.download_function = download_function
         if not self.extension:
             self.extension = self._determine_extension()
@@ -37,6 +65,10 @@ class Resource:
         if download_parameters is None:
             download_parameters = {}
         if not self.content:
+            download_parameters = download_parameters | {
+                "expected_extension": self.extension,
+                "response_info": self.response_info,
+            }
             try:
                 content = self.download_function(download_parameters)
             except requests.exceptions.ConnectionError as e:
@@ -47,6 +79,10 @@ class Resource:
                 self.content = content
         if not self.hash and self.content:
             self.create_hash()
+            if self.hash.hexdigest() in self.placeholder_hashes:
+                self.content = None
+                self.hash = None
+                raise ContentMismatchError(f"Resource at {self.url} is a known placeholder image")
 
     def create_hash(self):
         self.hash = hashlib.md5(self.content)
@@ -58,9 +94,49 @@ class Resource:
         if match:
             return match.group(1)
 
+    @staticmethod
+    def _media_category(extension: Optional[str]) -> Optional[str]:
+        if not extension:
+            return None
+        extension = extension.lower() if extension.startswith(".") else "." + extension.lower()
+        for category, extensions in Resource.media_extensions.items():
+            if extension in extensions:
+                return category
+        return None
+
+    @staticmethod
+    def _sniff_category(first_bytes: bytes) -> Optional[str]:
+        for category, signatures in Resource.content_signatures.items():
+            if any(first_bytes.startswith(magic, offset) for offset, magic in signatures):
+                return category
+        stripped = first_bytes.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+        if re.match(rb"<(!doctype html|html|head|body|\?xml)", stripped) or stripped.startswith((b"{", b"[")):
+            return "markup"
+        return None
+
+    @staticmethod
+    def check_content_type(content_type: Optional[str], expected_extension: Optional[str]):
+        """Raise if the server declares a page or document where the extension promises media"""
+        expected = Resource._media_category(expected_extension)
+        markup_types = r"\s*(text/html|application/(json|xhtml\+xml))"
+        if expected and content_type and re.match(markup_types, content_type.lower()):
+            raise ContentMismatchError(f"Expected {expected} for {expected_extension} but server sent {content_type}")
+
+    @staticmethod
+    def check_content(first_bytes: bytes, expected_extension: Optional[str]):
+        """Raise if the start of a transfer cannot be the media type that the extension promises"""
+        expected = Resource._media_category(expected_extension)
+        found = Resource._sniff_category(first_bytes)
+        if expected is None or found is None:
+            return
+        # Hosts regularly serve animated images as video under an image extension, but never the reverse
+        if found == "markup" or (expected == "video" and found == "image"):
+            raise ContentMismatchError(f"Expected {expected} for {expected_extension} but content is {found}")
+
     @staticmethod
     def http_download(url: str, download_parameters: dict) -> Optional[bytes]:
         headers = download_parameters.get("headers")
+        expected_extension = download_parameters.get("expected_extension")
         current_wait_time = 60
         if "max_wait_time" in download_parameters:
             max_wait_time = download_parameters["max_wait_time"]
@@ -68,10 +144,17 @@ class Resource:
             max_wait_time = 300
         while True:
             try:
-                response = requests.get(url, headers=headers)
-                if re.match(r"^2\d{2}", str(response.status_code)) and response.content:
-                    return response.content
-                elif response.status_code in (408, 429):
+                with requests.get(url, headers=headers, stream=True) as response:
+                    if re.match(r"^2\d{2}", str(response.status_code)):
+                        content = Resource._read_checked_response(response, expected_extension)
+                        if content:
+                            if "response_info" in download_parameters:
+                                download_parameters["response_info"].update(
+                                    {"etag": response.headers.get("ETag"), "size": len(content)}
+                                )
+                            return content
+                        raise BulkDownloaderException(f"Server returned no content for resource at {url}")
+                if response.status_code in (408, 429):
                     raise requests.exceptions.ConnectionError(f"Response code {response.status_code}")
                 else:
                     raise BulkDownloaderException(
@@ -85,3 +168,33 @@ class Resource:
                 else:
                     logger.error(f"Max wait time exceeded for resource at url {url}")
                     raise
+
+    @staticmethod
+    def revalidate(url: str, etag: Optional[str], headers: Optional[dict] = None) -> bool:
+        """Check with a conditional GET whether the resource at the URL still matches the given ETag"""
+        if not etag:
+            return False
+        headers = (headers or {}) | {"If-None-Match": etag}
+        try:
+            with requests.get(url, headers=headers, stream=True) as response:
+                return response.status_code == 304
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"Could not revalidate {url}: {e}")
+            return False
+
+    @staticmethod
+    def _read_checked_response(response: requests.Response, expected_extension: Optional[str]) -> bytes:
+        Resource.check_content_type(response.headers.get("Content-Type"), expected_extension)
+        chunks = []
+        checked = False
+        received = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunks.append(chunk)
+            received += len(chunk)
+            if not checked and received >= Resource.sniff_length:
+                Resource.check_content(b"".join(chunks), expected_extension)
+                checked = True
+        content = b"".join(chunks)
+        if not checked and content:
+            Resource.check_content(content, expected_extension)
+        return content
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import re
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from bdfr import exceptions as errors
+from bdfr.configuration import Configuration
+from bdfr.connector import RedditConnector
+from bdfr.digest_index import DigestIndex
+from bdfr.download_index import DownloadIndex
+from bdfr.file_name_formatter import FileNameFormatter
+from bdfr.linking import hard_link
+from bdfr.resource import Resource
+from bdfr.storage.local_storage import LocalStorage
+from bdfr.submission_record import SubmissionRecord
+
+logger = logging.getLogger(__name__)
+
+
+class MigrationEntry(NamedTuple):
+    submission_id: str
+    path: Path
+    url: str
+    index: Optional[int]
+
+
+class SchemeMigrator(RedditConnector):
+    """Move files downloaded with one file and folder scheme to the paths that the current schemes give them
+
+    Submissions are looked up in batches, and files that have already been moved are skipped, so an interrupted
+    migration can be run again to finish it. The download index is updated as each file is moved, and a file that
+    was moved without its new path being recorded is found at that path on the next run.
+    """
+
+    batch_size = 100
+
+    def __init__(self, args: Configuration, logging_handlers: Iterable[logging.Handler] = ()):
+        super(SchemeMigrator, self).__init__(args, logging_handlers)
+        if not isinstance(self.storage, LocalStorage):
+            raise errors.BulkDownloaderException("Only local storage can be migrated to a new scheme")
+        self._submission_cache: dict[str, SubmissionRecord] = {}
+        self._created_directories: set[Path] = set()
+        self.download_index = DownloadIndex(Path(args.download_index).expanduser()) if args.download_index else None
+
+    def download(self):
+        try:
+            entries = list(self.find_entries())
+            logger.info(f"Found {len(entries)} files to check")
+            moves = []
+            for start in range(0, len(entries), self.batch_size):
+                end = start + self.batch_size
+                batch = entries[start:end]
+                self._fetch_submissions([entry.submission_id for entry in batch])
+                for entry in batch:
+                    move = self._migrate_entry(entry)
+                    if move is None:
+                        continue
+                    if self.download_index:
+                        self._update_download_index([move])
+                    moves.append(move)
+            if self.args.hash_index and moves:
+                self._update_hash_index(moves)
+            action = "Linked" if self.args.make_hard_links else "Moved"
+            logger.info(f"{action} {len(moves)} files to the new scheme")
+        finally:
+            if self.download_index:
+                self.download_index.close()
+            self.close()
+
+    def find_entries(self) -> Iterator[MigrationEntry]:
+        if self.download_index:
+            yield from self._entries_from_index()
+        else:
+            yield from self._entries_from_names()
+
+    def _entries_from_index(self) -> Iterator[MigrationEntry]:
+        current_id, files = None, []
+        for submission_id, url, path in list(self.download_index.iter_files()):
+            if submission_id != current_id:
+                yield from self._index_group(current_id, files)
+                current_id, files = submission_id, []
+            if path.is_relative_to(self.download_directory):
+                files.append((url, path))
+        yield from self._index_group(current_id, files)
+
+    @staticmethod
+    def _index_group(submission_id: Optional[str], files: list[tuple[str, Path]]) -> Iterator[MigrationEntry]:
+        # Resources are numbered only when a submission has more than one, in the order they were stored
+        for i, (url, path) in enumerate(files, start=1):
+            yield MigrationEntry(submission_id, path, url, i if len(files) > 1 else None)
+
+    def _entries_from_names(self) -> Iterator[MigrationEntry]:
+        pattern = self.scheme_pattern(self.args.old_file_scheme, self.args.old_folder_scheme)
+        for dirpath, _dirnames, filenames in os.walk(self.download_directory):
+            for filename in filenames:
+                path = Path(dirpath, filename)
+                match = pattern.match(path.relative_to(self.download_directory).as_posix())
+                if match is None:
+                    logger.debug(f"Could not find a submission ID in {path}")
+                    continue
+                index = int(match.group("index")) if match.group("index") else None
+                yield MigrationEntry(match.group("postid"), path, "", index)
+
+    @staticmethod
+    def scheme_pattern(file_scheme: str, folder_scheme: str) -> re.Pattern:
+        """Build a regular expression that matches the paths that the given schemes produce"""
+        if "{postid}" not in (file_scheme + folder_scheme).lower():
+            raise errors.BulkDownloaderException(
+                "The old scheme must contain {POSTID} unless a download index is given"
+            )
+        key_pattern = re.compile(
+            r"(?i){(postid_shard|hash_shard)(?::(\d+))?}|{(" + "|".join(FileNameFormatter.key_terms) + ")}"
+        )
+        parts = []
+        postid_seen = False
+        for part in [*filter(None, folder_scheme.split("/")), file_scheme]:
+            out = ""
+            position = 0
+            for match in key_pattern.finditer(part):
+                start = match.start()
+                out += re.escape(part[position:start])
+                position = match.end()
+                if match.group(1):
+                    length = match.group(2) or FileNameFormatter.default_shard_length
+                    out += f"[0-9a-f]{{{length}}}"
+                elif match.group(3).lower() == "postid":
+                    out += "(?P=postid)" if postid_seen else "(?P<postid>[0-9a-z]+)"
+                    postid_seen = True
+                else:
+                    out += "[^/]*?"
+            out += re.escape(part[position:])
+            parts.append(out)
+        return re.compile("/".join(parts) + r"(?:_(?P<index>\d+))?(?P<extension>\.[^/.]+)$")
+
+    def _fetch_submissions(self, submission_ids: list[str]):
+        # Only the current batch is kept, and as plain records, so memory does not grow with the size of the library
+        self._submission_cache = {i: self._submission_cache[i] for i in submission_ids if i in self._submission_cache}
+        if not self.file_name_formatter.requires_submission_details:
+            # The new schemes only use the ID, so there is nothing to ask Reddit for
+            for submission_id in submission_ids:
+                self._submission_cache.setdefault(submission_id, SubmissionRecord.from_id(submission_id))
+            return
+        missing = {f"t3_{i}" for i in submission_ids if i not in self._submission_cache}
+        if not missing:
+            return
+        for submission in self.reddit_instance.info(fullnames=sorted(missing)):
+            self._submission_cache[submission.id] = SubmissionRecord.from_submission(submission)
+
+    def _migrate_entry(self, entry: MigrationEntry) -> Optional[tuple[Path, Path]]:
+        already_moved = not entry.path.exists()
+        if already_moved and (not self.download_index or self.file_name_formatter.requires_content_hash):
+            # Already moved by an earlier, interrupted migration
+            return None
+        submission = self._submission_cache.get(entry.submission_id)
+        if submission is None:
+            logger.warning(f"Could not retrieve submission {entry.submission_id} for {entry.path}")
+            return None
+        resource = Resource(submission, entry.url, lambda _: None, entry.path.suffix)
+        if self.file_name_formatter.requires_content_hash:
+            resource.content = entry.path.read_bytes()
+            resource.create_hash()
+        try:
+            new_path = self.file_name_formatter.format_path(resource, self.download_directory, entry.index)
+        except errors.BulkDownloaderException as e:
+            logger.error(f"Could not generate a new path for {entry.path}: {e}")
+            return None
+        if new_path == entry.path:
+            return None
+        if already_moved:
+            # The index still has the old path, so an earlier migration stopped before recording the move
+            if not new_path.exists():
+                logger.debug(f"{entry.path} no longer exists")
+                return None
+            logger.debug(f"Recording earlier move of {entry.path} to {new_path}")
+            return entry.path, new_path
+        if new_path.exists():
+            if not new_path.samefile(entry.path):
+                logger.warning(f"Not moving {entry.path} as {new_path} already exists")
+                return None
+            if not self.args.make_hard_links:
+                entry.path.unlink()
+            return entry.path, new_path
+        if new_path.parent not in self._created_directories:
+            new_path.parent.mkdir(parents=True, exist_ok=True)
+            self._created_directories.add(new_path.parent)
+        if self.args.make_hard_links:
+            hard_link(new_path, entry.path)
+        else:
+            os.rename(entry.path, new_path)
+        logger.debug(f"Moved {entry.path} to {new_path}")
+        return entry.path, new_path
+
+    def _update_download_index(self, moves: list[tuple[Path, Path]]):
+        if self.args.make_hard_links:
+            self.download_index.link_files(moves)
+        else:
+            self.download_index.move_files(moves)
+
+    def _update_hash_index(self, moves: list[tuple[Path, Path]]):
+        hash_index_path = Path(self.args.hash_index).resolve().expanduser()
+        if not hash_index_path.exists():
+            return
+        new_paths = dict(moves)
+        hash_index = DigestIndex.load(hash_index_path)
+        updates = {digest: new_paths[path] for digest, path in hash_index.items() if path in new_paths}
+        hash_index.update(updates)
+        hash_index.save(hash_index_path, merge=True)
+        hash_index.close()
+        logger.info(f"Updated {len(updates)} paths in hash index {hash_index_path}")
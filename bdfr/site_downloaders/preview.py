@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import html
+import logging
+from typing import Optional
+
+from praw.models import Submission
+
+from bdfr.exceptions import NotADownloadableLinkError
+from bdfr.resource import Resource
+from bdfr.site_authenticator import SiteAuthenticator
+from bdfr.site_downloaders.base_downloader import BaseDownloader
+
+logger = logging.getLogger(__name__)
+
+
+class Preview(BaseDownloader):
+    def __init__(self, post: Submission, max_width: int):
+        super().__init__(post)
+        self.max_width = max_width
+        # Only data already in the listing is read so that unloaded attributes never trigger a fetch
+        self.post_data = vars(post)
+
+    def find_resources(self, authenticator: Optional[SiteAuthenticator] = None) -> list[Resource]:
+        if self.post_data.get("is_gallery"):
+            image_urls = self._get_gallery_previews()
+        elif self.post_data.get("post_hint") == "image":
+            image_urls = self._get_image_previews()
+        else:
+            raise NotADownloadableLinkError(f"Submission {self.post.id} is not an image post")
+        if not image_urls:
+            raise NotADownloadableLinkError(f"No preview images found in submission {self.post.id}")
+        return [Resource(self.post, url, Resource.retry_download(url), extension) for url, extension in image_urls]
+
+    def _get_image_previews(self) -> list[tuple[str, Optional[str]]]:
+        out = []
+        for image in (self.post_data.get("preview") or {}).get("images", []):
+            # The resolutions of an animated image are still frames, so the animated variants are used instead
+            animated = image.get("variants", {})
+            if "gif" in animated:
+                image, extension = animated["gif"], None
+            elif "mp4" in animated:
+                image, extension = animated["mp4"], ".mp4"
+            else:
+                extension = None
+            variants = [*image.get("resolutions", []), image["source"]]
+            chosen = self._choose_variant([(v["width"], v["url"]) for v in variants])
+            out.append((chosen, extension))
+        return out
+
+    def _get_gallery_previews(self) -> list[tuple[str, Optional[str]]]:
+        out = []
+        metadata = self.post_data.get("media_metadata") or {}
+        for item in (self.post_data.get("gallery_data") or {}).get("items", []):
+            media = metadata.get(item["media_id"])
+            if not media or media.get("status") != "valid":
+                continue
+            source = media["s"]
+            if "u" not in source:
+                # Animated gallery items only have their full size in animated form, with still frames in "p"
+                if "gif" in source:
+                    out.append((html.unescape(source["gif"]), None))
+                elif "mp4" in source:
+                    out.append((html.unescape(source["mp4"]), ".mp4"))
+                continue
+            variants = [*media.get("p", []), source]
+            chosen = self._choose_variant([(v["x"], v["u"]) for v in variants if "u" in v])
+            out.append((chosen, None))
+        return out
+
+    def _choose_variant(self, variants: list[tuple[int, str]]) -> str:
+        """Pick the widest variant no wider than the maximum, or the narrowest if all are too wide"""
+        variants = sorted(variants)
+        fitting = [variant for variant in variants if variant[0] <= self.max_width]
+        width, url = fitting[-1] if fitting else variants[0]
+        logger.log(9, f"Chose preview of width {width} for submission {self.post.id}")
+        return html.unescape(url)
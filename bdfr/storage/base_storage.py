@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+
+class BaseStorage(ABC):
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    @abstractmethod
+    def exists(self, destination: Path) -> bool:
+        """Return whether anything is already stored at the destination"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(
+        self,
+        destination: Path,
+        content: bytes,
+        modified_time: Optional[float] = None,
+        exclusive: bool = False,
+    ):
+        """Store the content at the destination, which is a path within the download directory
+
+        If exclusive is set, a FileExistsError is raised instead of replacing anything already stored there.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def link(self, destination: Path, target: Path):
+        """Make the destination share the stored content of the target without writing it again"""
+        raise NotImplementedError
+
+    def clone(self, destination: Path, target: Path) -> str:
+        """Make the destination an independent copy of the target, sharing its stored content where possible
+
+        Returns a description of the kind of link that was made. Backends without copy-on-write support link instead.
+        """
+        self.link(destination, target)
+        return "Link"
+
+    def hash_list(self) -> Optional[dict[str, Path]]:
+        """Return the MD5 hashes of stored content if the backend keeps them, or None if they must be calculated"""
+        return None
+
+    def close(self):
+        pass
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from bdfr.linking import claim, clone_file, hard_link
+from bdfr.storage.base_storage import BaseStorage
+
+logger = logging.getLogger(__name__)
+
+
+def _read_umask() -> int:
+    # The umask can only be read by setting it, so do it once, before any threads are writing files
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+
+# Temporary files are created readable only by their owner, so give them the mode a normal file would have had
+FILE_MODE = 0o666 & ~_read_umask()
+
+
+class LocalStorage(BaseStorage):
+    def exists(self, destination: Path) -> bool:
+        return destination.exists()
+
+    def write(
+        self,
+        destination: Path,
+        content: bytes,
+        modified_time: Optional[float] = None,
+        exclusive: bool = False,
+    ):
+        """Write the content to a temporary file and move it into place, so a partial file is never seen"""
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(prefix=".bdfr-", suffix=".part", dir=destination.parent)
+        temp_path = Path(temp_name)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                if hasattr(os, "fchmod"):
+                    os.fchmod(file.fileno(), FILE_MODE)
+                file.write(content)
+            if modified_time is not None:
+                os.utime(temp_path, (modified_time, modified_time))
+            if exclusive:
+                claim(temp_path, destination)
+            else:
+                os.replace(temp_path, destination)
+        finally:
+            temp_path.unlink(missing_ok=True)
+
+    def link(self, destination: Path, target: Path):
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        hard_link(destination, target)
+
+    def clone(self, destination: Path, target: Path) -> str:
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        return clone_file(destination, target)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import struct
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Optional, Union
+
+from bdfr.exceptions import BulkDownloaderException
+from bdfr.file_lock import FileLock
+from bdfr.storage.base_storage import BaseStorage
+
+logger = logging.getLogger(__name__)
+
+
+class PackStorage(BaseStorage):
+    """Appends downloaded files into rolling tar or zip packs instead of individual files
+
+    Every member is recorded in an index file alongside the packs so that existence and duplicate checks never need
+    to open the packs themselves. Members keep the path that the folder and file schemes would have given them.
+
+    A pack left unfinished by a process that was killed is repaired when the packs are next opened: it is cut back to
+    its last complete member, and index entries for members that did not survive are removed so they are downloaded
+    again.
+    """
+
+    index_name = "pack_index.jsonl"
+    default_max_size = 1024 * 1024 * 1024
+
+    def __init__(
+        self,
+        directory: Path,
+        pack_format: str,
+        max_size: Optional[int] = None,
+        max_count: Optional[int] = None,
+    ):
+        super(PackStorage, self).__init__(directory)
+        if pack_format not in ("tar", "zip"):
+            raise BulkDownloaderException(f"Unknown pack format {pack_format}")
+        self.pack_format = pack_format
+        self.max_count = max_count
+        self.max_size = max_size if max_size or max_count else self.default_max_size
+        self.index_path = Path(directory, self.index_name)
+        self.members: dict[str, dict] = {}
+        self.pack_counts: dict[str, int] = {}
+        self._current_pack: Optional[Union[tarfile.TarFile, zipfile.ZipFile]] = None
+        self._current_name: Optional[str] = None
+        self._lock = FileLock(Path(directory, f"{self.index_name}.lock"))
+        self._load_index()
+        self._recover_packs()
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return
+        with self.index_path.open("r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring corrupt line in pack index {self.index_path}")
+                    continue
+                self.members[entry["name"]] = entry
+                if entry["member"] == entry["name"]:
+                    self.pack_counts[entry["pack"]] = self.pack_counts.get(entry["pack"], 0) + 1
+        logger.debug(f"Loaded {len(self.members)} pack members from {self.index_path}")
+
+    def _recover_packs(self):
+        # A process holding the lock is still writing its pack, and will have repaired the packs when it started
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            pack_paths = self._pack_paths()
+            # Only the newest pack is ever appended to, so it is the only one that can have been left unfinished
+            if not pack_paths:
+                return
+            pack_path = pack_paths[-1]
+            if self.pack_format == "tar":
+                complete = self._recover_tar(pack_path)
+            else:
+                complete = self._recover_zip(pack_path)
+            if complete is None:
+                return
+            lost = {
+                name
+                for name, entry in self.members.items()
+                if entry["pack"] == pack_path.name and entry["member"] not in complete
+            }
+            if lost:
+                logger.warning(f"Removing {len(lost)} members lost from {pack_path.name} from {self.index_path}")
+                self._rewrite_index(lost)
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _recover_tar(pack_path: Path) -> Optional[set[str]]:
+        """Cut a tar back to its last complete member, returning the members kept if it needed repairing"""
+        size = pack_path.stat().st_size
+        complete = set()
+        valid_end = 0
+        try:
+            with tarfile.open(pack_path, mode="r:") as pack:
+                while True:
+                    try:
+                        info = pack.next()
+                    except tarfile.ReadError:
+                        break
+                    if info is None:
+                        break
+                    end = info.offset_data + -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                    if end > size:
+                        break
+                    complete.add(info.name)
+                    valid_end = end
+        except tarfile.ReadError:
+            pass
+        with pack_path.open("r+b") as file:
+            file.seek(valid_end)
+            # A finished tar ends with two empty blocks, which append mode needs to find the end of the archive
+            if file.read(2 * tarfile.BLOCKSIZE) == bytes(2 * tarfile.BLOCKSIZE):
+                return None
+            logger.warning(f"Repairing unfinished pack {pack_path}, keeping {len(complete)} members")
+            file.truncate(valid_end)
+            file.seek(valid_end)
+            file.write(bytes(2 * tarfile.BLOCKSIZE))
+        return complete
+
+    @staticmethod
+    def _recover_zip(pack_path: Path) -> Optional[set[str]]:
+        """Rebuild a zip without a central directory from its local headers, returning the members kept"""
+        try:
+            with zipfile.ZipFile(pack_path) as pack:
+                return set(pack.namelist())
+        except zipfile.BadZipFile:
+            pass
+        logger.warning(f"Repairing unfinished pack {pack_path}")
+        header = struct.Struct("<4s5H3L2H")
+        complete = set()
+        temp_path = Path(pack_path.parent, f".{pack_path.name}.repair")
+        with pack_path.open("rb") as source, zipfile.ZipFile(temp_path, mode="w") as repaired:
+            while True:
+                fields = source.read(header.size)
+                if len(fields) < header.size:
+                    break
+                signature, _, flags, compression, mod_time, mod_date, _, size, _, name_length, extra_length = (
+                    header.unpack(fields)
+                )
+                # Only whole stored members written with their sizes up front can be recovered
+                if signature != b"PK\x03\x04" or compression != zipfile.ZIP_STORED or flags & 0x08:
+                    break
+                name = source.read(name_length).decode("utf-8" if flags & 0x800 else "cp437")
+                source.seek(extra_length, 1)
+                content = source.read(size)
+                if len(content) < size:
+                    break
+                date_time = (
+                    (mod_date >> 9) + 1980,
+                    (mod_date >> 5) & 0xF,
+                    mod_date & 0x1F,
+                    mod_time >> 11,
+                    (mod_time >> 5) & 0x3F,
+                    (mod_time & 0x1F) * 2,
+                )
+                repaired.writestr(zipfile.ZipInfo(name, date_time=date_time), content, compress_type=zipfile.ZIP_STORED)
+                complete.add(name)
+        os.replace(temp_path, pack_path)
+        logger.warning(f"Kept {len(complete)} members of {pack_path}")
+        return complete
+
+    def _rewrite_index(self, removed: set[str]):
+        temp_path = Path(self.directory, f".{self.index_name}.tmp")
+        with temp_path.open("w", encoding="utf-8") as file:
+            for name, entry in self.members.items():
+                if name not in removed:
+                    file.write(json.dumps(entry) + "\n")
+        os.replace(temp_path, self.index_path)
+        self.members = {}
+        self.pack_counts = {}
+        self._load_index()
+
+    def member_name(self, destination: Path) -> str:
+        try:
+            return destination.relative_to(self.directory).as_posix()
+        except ValueError:
+            raise BulkDownloaderException(f"Cannot pack {destination} as it is outside {self.directory}")
+
+    def exists(self, destination: Path) -> bool:
+        return self.member_name(destination) in self.members
+
+    def hash_list(self) -> dict[str, Path]:
+        return {entry["hash"]: Path(self.directory, name) for name, entry in self.members.items()}
+
+    def write(
+        self,
+        destination: Path,
+        content: bytes,
+        modified_time: Optional[float] = None,
+        exclusive: bool = False,
+    ):
+        if exclusive and self.exists(destination):
+            raise FileExistsError(f"{destination} is already in a pack")
+        modified_time = time.time() if modified_time is None else modified_time
+        name = self.member_name(destination)
+        pack = self._select_pack(len(content))
+        if self.pack_format == "tar":
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = modified_time
+            pack.addfile(info, io.BytesIO(content))
+            pack.fileobj.flush()
+        else:
+            info = zipfile.ZipInfo(name, date_time=time.localtime(max(modified_time, 315532800))[:6])
+            pack.writestr(info, content, compress_type=zipfile.ZIP_STORED)
+            pack.fp.flush()
+        self.pack_counts[self._current_name] = self.pack_counts.get(self._current_name, 0) + 1
+        self._record({"name": name, "pack": self._current_name, "member": name, "hash": self._hash(content)})
+
+    def link(self, destination: Path, target: Path):
+        """Record a member that shares the stored bytes of an existing one"""
+        target_entry = self.members.get(self.member_name(target))
+        if target_entry is None:
+            raise BulkDownloaderException(f"Cannot link to {target} as it is not in a pack")
+        self._record(target_entry | {"name": self.member_name(destination)})
+
+    def close(self):
+        self._close_pack()
+        self._lock.release()
+
+    def _close_pack(self):
+        if self._current_pack is not None:
+            self._current_pack.close()
+            logger.debug(f"Closed pack {self._current_name}")
+        self._current_pack = None
+        self._current_name = None
+
+    @staticmethod
+    def _hash(content: bytes) -> str:
+        return hashlib.md5(content).hexdigest()
+
+    def _record(self, entry: dict):
+        self.members[entry["name"]] = entry
+        with self.index_path.open("a", encoding="utf-8") as file:
+            file.write(json.dumps(entry) + "\n")
+
+    def _pack_paths(self) -> list[Path]:
+        pattern = re.compile(rf"^pack_(\d+)\.{self.pack_format}$")
+        return sorted(
+            (path for path in self.directory.iterdir() if pattern.match(path.name)),
+            key=lambda path: int(pattern.match(path.name).group(1)),
+        )
+
+    def _is_full(self, pack_path: Path, incoming_size: int) -> bool:
+        if self.max_count and self.pack_counts.get(pack_path.name, 0) >= self.max_count:
+            return True
+        if self.max_size and pack_path.exists():
+            size = pack_path.stat().st_size
+            # A member larger than the limit gets a pack of its own rather than leaving an empty pack behind
+            return size > 0 and size + incoming_size > self.max_size
+        return False
+
+    def _select_pack(self, incoming_size: int) -> Union[tarfile.TarFile, zipfile.ZipFile]:
+        if self._current_pack is not None:
+            if not self._is_full(Path(self.directory, self._current_name), incoming_size):
+                return self._current_pack
+        self._close_pack()
+        if not self._lock.held and not self._lock.acquire(blocking=False):
+            raise BulkDownloaderException(f"Another process is already writing packs in {self.directory}")
+        existing = self._pack_paths()
+        if existing and not self._is_full(existing[-1], incoming_size):
+            pack_path = existing[-1]
+        else:
+            number = int(re.search(r"(\d+)", existing[-1].stem).group(1)) + 1 if existing else 1
+            pack_path = Path(self.directory, f"pack_{number:05}.{self.pack_format}")
+        mode = "a" if pack_path.exists() else "w"
+        if self.pack_format == "tar":
+            self._current_pack = tarfile.open(pack_path, mode=mode)
+        else:
+            self._current_pack = zipfile.ZipFile(pack_path, mode=mode)
+        self._current_name = pack_path.name
+        logger.debug(f"Writing to pack {pack_path}")
+        return self._current_pack
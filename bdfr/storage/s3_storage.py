@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import configparser
+import logging
+from pathlib import Path
+from typing import Any, Optional
+
+from bdfr.exceptions import BulkDownloaderException
+from bdfr.storage.base_storage import BaseStorage
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+
+class S3Storage(BaseStorage):
+    """Stores files as objects in an S3-compatible bucket, keyed by their path within the download directory
+
+    Content larger than one part is sent as a multipart upload, so no single request has to carry a whole video.
+    Links are made with server-side copies, which move no data through the client.
+    """
+
+    minimum_part_size = 5 * 1024 * 1024
+
+    def __init__(self, directory: Path, bucket: str, prefix: str = "", part_size: int = 8 * 1024 * 1024, client=None):
+        super(S3Storage, self).__init__(directory)
+        if not bucket:
+            raise BulkDownloaderException("A bucket must be configured to use S3 storage")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.part_size = max(part_size, self.minimum_part_size)
+        self.client = client if client is not None else self.create_client()
+
+    @staticmethod
+    def create_client(**client_options) -> Any:
+        if boto3 is None:
+            raise BulkDownloaderException(
+                "S3 storage requires boto3, which can be installed with 'pip install bdfr[s3]'"
+            )
+        return boto3.client("s3", **{key: value for key, value in client_options.items() if value})
+
+    @classmethod
+    def from_config(cls, directory: Path, cfg_parser: configparser.ConfigParser) -> "S3Storage":
+        if not cfg_parser.has_section("S3"):
+            raise BulkDownloaderException("S3 storage requires an [S3] section in the configuration file")
+        section = cfg_parser["S3"]
+        client = cls.create_client(
+            endpoint_url=section.get("endpoint_url"),
+            region_name=section.get("region"),
+            aws_access_key_id=section.get("access_key_id"),
+            aws_secret_access_key=section.get("secret_access_key"),
+        )
+        return cls(
+            directory,
+            section.get("bucket"),
+            section.get("prefix", ""),
+            section.getint("part_size", 8) * 1024 * 1024,
+            client,
+        )
+
+    def key_for(self, destination: Path) -> str:
+        try:
+            relative = destination.relative_to(self.directory).as_posix()
+        except ValueError:
+            raise BulkDownloaderException(f"Cannot store {destination} as it is outside {self.directory}")
+        return f"{self.prefix}/{relative}" if self.prefix else relative
+
+    def exists(self, destination: Path) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key_for(destination))
+        except Exception as e:
+            if self._is_not_found(e):
+                return False
+            raise
+        return True
+
+    def write(
+        self,
+        destination: Path,
+        content: bytes,
+        modified_time: Optional[float] = None,
+        exclusive: bool = False,
+    ):
+        # S3 has no portable conditional put, so this only narrows the window in which two writers can race
+        if exclusive and self.exists(destination):
+            raise FileExistsError(f"{destination} already exists")
+        key = self.key_for(destination)
+        metadata = {"mtime": str(modified_time)} if modified_time is not None else {}
+        if len(content) <= self.part_size:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=content, Metadata=metadata)
+            logger.log(9, f"Uploaded {key} in a single request")
+            return
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, Metadata=metadata)["UploadId"]
+        try:
+            parts = []
+            view = memoryview(content)
+            for number, start in enumerate(range(0, len(content), self.part_size), start=1):
+                end = start + self.part_size
+                response = self.client.upload_part(
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=number,
+                    Body=view[start:end].tobytes(),
+                )
+                parts.append({"ETag": response["ETag"], "PartNumber": number})
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        logger.log(9, f"Uploaded {key} in {len(parts)} parts")
+
+    def link(self, destination: Path, target: Path):
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=self.key_for(destination),
+            CopySource={"Bucket": self.bucket, "Key": self.key_for(target)},
+        )
+
+    def hash_list(self) -> dict[str, Path]:
+        """Objects uploaded in a single request have their MD5 as the ETag; multipart objects are not included"""
+        out = {}
+        prefix_length = len(self.prefix) + 1 if self.prefix else 0
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}/" if self.prefix else ""):
+            for item in page.get("Contents", []):
+                etag = item["ETag"].strip('"')
+                if "-" in etag:
+                    continue
+                out[etag] = Path(self.directory, item["Key"][prefix_length:])
+        return out
+
+    @staticmethod
+    def _is_not_found(error: Exception) -> bool:
+        response = getattr(error, "response", None) or {}
+        return str(response.get("Error", {}).get("Code")) in ("404", "NoSuchKey", "NotFound")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from typing import Optional
+
+import praw.models
+
+logger = logging.getLogger(__name__)
+
+
+class SubmissionRecord:
+    """The fields of a submission that the BDFR needs once its resources have been found
+
+    A PRAW submission keeps the whole of its listing JSON and fetches any attribute that was not loaded when it is
+    read. A record copies the few fields used for naming and writing files once, so queued resources hold only plain
+    values and reading them can never make a request to Reddit.
+    """
+
+    __slots__ = ("id", "title", "subreddit", "author", "score", "upvote_ratio", "url", "link_flair_text", "created_utc")
+
+    def __init__(
+        self,
+        id: str,
+        title: str,
+        subreddit: str,
+        author: Optional[str],
+        score: int,
+        upvote_ratio: float,
+        url: str,
+        link_flair_text: Optional[str],
+        created_utc: float,
+    ):
+        self.id = id
+        self.title = title
+        self.subreddit = subreddit
+        self.author = author
+        self.score = score
+        self.upvote_ratio = upvote_ratio
+        self.url = url
+        self.link_flair_text = link_flair_text
+        self.created_utc = created_utc
+
+    @classmethod
+    def from_submission(cls, submission: praw.models.Submission) -> "SubmissionRecord":
+        # Every one of these is in the listing data, so none of them cause a fetch for a submission from a listing
+        author = submission.author
+        return cls(
+            id=submission.id,
+            title=submission.title,
+            subreddit=submission.subreddit.display_name,
+            author=author.name if author else None,
+            score=submission.score,
+            upvote_ratio=submission.upvote_ratio,
+            url=submission.url,
+            link_flair_text=submission.link_flair_text,
+            created_utc=submission.created_utc,
+        )
+
+    @classmethod
+    def from_id(cls, submission_id: str) -> "SubmissionRecord":
+        """Make a record holding only the ID, for naming schemes that use nothing else"""
+        return cls(
+            id=submission_id,
+            title="",
+            subreddit="",
+            author=None,
+            score=0,
+            upvote_ratio=0.0,
+            url="",
+            link_flair_text=None,
+            created_utc=0.0,
+        )
+
+    def __repr__(self) -> str:
+        return f"SubmissionRecord(id={self.id!r}, subreddit={self.subreddit!r})"
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from bdfr.digest_index import DigestIndex
+from bdfr.exceptions import BulkDownloaderException
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_file(path: Path, chunk_size: int = 1024 * 1024) -> Optional[str]:
+    """Hash a file in large sequential reads, telling the kernel not to keep the pages cached afterwards"""
+    md5_hash = hashlib.md5()
+    try:
+        with path.open("rb") as file:
+            fd = file.fileno()
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while chunk := file.read(chunk_size):
+                md5_hash.update(chunk)
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except FileNotFoundError:
+        return None
+    return md5_hash.hexdigest()
+
+
+def default_thread_count(directory: Path) -> int:
+    """Use few readers on spinning disks, where concurrent reads cause seeking, and more on solid state storage"""
+    cpu_threads = min(32, (os.cpu_count() or 1) * 2)
+    try:
+        device = os.stat(directory).st_dev
+        block_device = Path(f"/sys/dev/block/{os.major(device)}:{os.minor(device)}")
+        for queue in (Path(block_device, "queue"), Path(block_device, "..", "queue")):
+            rotational = Path(queue, "rotational")
+            if rotational.exists():
+                return 2 if rotational.read_text().strip() == "1" else cpu_threads
+    except (OSError, AttributeError):
+        pass
+    return cpu_threads
+
+
+class VerificationReport:
+    def __init__(self):
+        self.verified = 0
+        self.missing: list[Path] = []
+        self.changed: list[Path] = []
+        self.orphaned: list[Path] = []
+        self.duplicates: list[Path] = []
+
+    @property
+    def problems(self) -> int:
+        return len(self.missing) + len(self.changed) + len(self.orphaned)
+
+    def add(self, path: Path, status: str):
+        if status == "ok":
+            self.verified += 1
+        elif status == "missing":
+            self.missing.append(path)
+        elif status == "changed":
+            self.changed.append(path)
+
+
+class Verifier:
+    """Rehash the files recorded in a hash index and compare them against the stored digests
+
+    Every file checked is appended to a state file, so an interrupted verification continues where it stopped when
+    run again. The state file is removed once the whole index has been checked.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        hash_index: Path,
+        state_file: Optional[Path] = None,
+        threads: Optional[int] = None,
+    ):
+        self.directory = directory.resolve().expanduser()
+        self.hash_index_path = hash_index.resolve().expanduser()
+        if not self.hash_index_path.exists():
+            raise BulkDownloaderException(f"Hash index {self.hash_index_path} does not exist")
+        if state_file is None:
+            state_file = Path(self.hash_index_path.parent, f"{self.hash_index_path.name}.verify")
+        self.state_file = state_file.resolve().expanduser()
+        self.threads = threads or default_thread_count(self.directory)
+
+    def verify(self) -> VerificationReport:
+        report = VerificationReport()
+        hash_index = DigestIndex.load(self.hash_index_path)
+        try:
+            expected = {Path(path): digest for digest, path in hash_index.items()}
+        finally:
+            hash_index.close()
+        done = self._read_state()
+        for path, status in done.items():
+            report.add(path, status)
+        remaining = [path for path in expected if path not in done]
+        logger.info(
+            f"Verifying {len(remaining)} files with {self.threads} threads"
+            + (f", {len(done)} already checked" if done else "")
+        )
+        remaining.sort(key=self._inode)
+        with self.state_file.open("a") as state, ThreadPoolExecutor(self.threads) as executor:
+            for path, file_hash in zip(remaining, executor.map(_hash_file, remaining)):
+                if file_hash is None:
+                    status = "missing"
+                    logger.warning(f"Missing file {path}")
+                elif file_hash != expected[path]:
+                    status = "changed"
+                    logger.warning(f"Changed file {path}")
+                else:
+                    status = "ok"
+                report.add(path, status)
+                state.write(json.dumps({"path": str(path), "status": status}) + "\n")
+        report.orphaned, report.duplicates = self._find_orphans(expected)
+        for path in report.orphaned:
+            logger.warning(f"File {path} is not in the hash index")
+        for path in report.duplicates:
+            logger.debug(f"File {path} is not in the hash index but is a copy of an indexed file")
+        self.state_file.unlink()
+        logger.info(
+            f"Verified {report.verified} files: {len(report.missing)} missing, {len(report.changed)} changed,"
+            f" {len(report.orphaned)} not in the index"
+            + (f", {len(report.duplicates)} copies of indexed files" if report.duplicates else "")
+        )
+        return report
+
+    def _read_state(self) -> dict[Path, str]:
+        out = {}
+        if not self.state_file.exists():
+            return out
+        with self.state_file.open("r") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be incomplete if the previous run was killed while writing it
+                    continue
+                out[Path(entry["path"])] = entry["status"]
+        return out
+
+    @staticmethod
+    def _inode(path: Path) -> int:
+        # Files written together tend to have nearby inodes and nearby blocks, so this keeps the reads sequential
+        try:
+            return path.stat().st_ino
+        except OSError:
+            return 0
+
+    def _find_orphans(self, expected: dict[Path, str]) -> tuple[list[Path], list[Path]]:
+        """Find files that are not in the index, separating out links to and copies of indexed files
+
+        The index holds one path for each digest, so a file linked or downloaded again under a second name is left out
+        of it without being unknown.
+        """
+        index_lock = Path(self.hash_index_path.parent, f".{self.hash_index_path.name}.lock")
+        ignored = {self.hash_index_path, index_lock, self.state_file}
+        unindexed = []
+        for dirpath, _dirnames, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = Path(dirpath, filename)
+                if path not in expected and path not in ignored:
+                    unindexed.append(path)
+        if not unindexed:
+            return [], []
+        indexed_inodes = set()
+        indexed_sizes = set()
+        for path in expected:
+            try:
+                stats = path.stat()
+            except OSError:
+                continue
+            indexed_inodes.add((stats.st_dev, stats.st_ino))
+            indexed_sizes.add(stats.st_size)
+        orphans = []
+        duplicates = []
+        to_hash = []
+        for path in unindexed:
+            try:
+                stats = path.stat()
+            except OSError:
+                continue
+            if (stats.st_dev, stats.st_ino) in indexed_inodes:
+                duplicates.append(path)
+            elif stats.st_size in indexed_sizes:
+                to_hash.append(path)
+            else:
+                orphans.append(path)
+        # Only files the same size as an indexed file can be copies of one, so few files need to be read here
+        indexed_digests = set(expected.values())
+        with ThreadPoolExecutor(self.threads) as executor:
+            for path, file_hash in zip(to_hash, executor.map(_hash_file, to_hash)):
+                if file_hash is None:
+                    continue
+                (duplicates if file_hash in indexed_digests else orphans).append(path)
+        return sorted(orphans), sorted(duplicates)
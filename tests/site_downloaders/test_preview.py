@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from unittest.mock import Mock
+
+import pytest
+
+from bdfr.exceptions import NotADownloadableLinkError
+from bdfr.site_downloaders.preview import Preview
+
+
+def _make_image_submission() -> Mock:
+    submission = Mock()
+    submission.id = "aaaaaa"
+    submission.post_hint = "image"
+    submission.preview = {
+        "images": [
+            {
+                "source": {"url": "https://preview.redd.it/test.jpg?width=2000&amp;s=a", "width": 2000},
+                "resolutions": [
+                    {"url": "https://preview.redd.it/test.jpg?width=108&amp;s=b", "width": 108},
+                    {"url": "https://preview.redd.it/test.jpg?width=640&amp;s=c", "width": 640},
+                    {"url": "https://preview.redd.it/test.jpg?width=960&amp;s=d", "width": 960},
+                ],
+            }
+        ]
+    }
+    return submission
+
+
+@pytest.mark.parametrize(
+    ("test_width", "expected"),
+    (
+        (640, "https://preview.redd.it/test.jpg?width=640&s=c"),
+        (700, "https://preview.redd.it/test.jpg?width=640&s=c"),
+        (5000, "https://preview.redd.it/test.jpg?width=2000&s=a"),
+        (50, "https://preview.redd.it/test.jpg?width=108&s=b"),
+    ),
+)
+def test_image_preview_width(test_width: int, expected: str):
+    results = Preview(_make_image_submission(), test_width).find_resources()
+    assert [res.url for res in results] == [expected]
+    assert results[0].extension == ".jpg"
+
+
+def test_gallery_preview():
+    submission = Mock()
+    submission.id = "aaaaaa"
+    submission.is_gallery = True
+    submission.gallery_data = {"items": [{"media_id": "two"}, {"media_id": "one"}, {"media_id": "gone"}]}
+    submission.media_metadata = {
+        "one": {
+            "status": "valid",
+            "p": [{"x": 320, "u": "https://preview.redd.it/one.png?width=320&amp;s=a"}],
+            "s": {"x": 1000, "u": "https://preview.redd.it/one.png?width=1000&amp;s=b"},
+        },
+        "two": {
+            "status": "valid",
+            "p": [{"x": 320, "u": "https://preview.redd.it/two.jpg?width=320&amp;s=c"}],
+            "s": {"x": 400, "u": "https://preview.redd.it/two.jpg?width=400&amp;s=d"},
+        },
+        "gone": {"status": "failed"},
+    }
+    results = Preview(submission, 500).find_resources()
+    assert [res.url for res in results] == [
+        "https://preview.redd.it/two.jpg?width=400&s=d",
+        "https://preview.redd.it/one.png?width=320&s=a",
+    ]
+
+
+@pytest.mark.parametrize("test_hint", ("hosted:video", "link", None))
+def test_preview_not_image(test_hint: str):
+    submission = _make_image_submission()
+    submission.post_hint = test_hint
+    with pytest.raises(NotADownloadableLinkError):
+        Preview(submission, 640).find_resources()
+
+
+@pytest.mark.parametrize(
+    ("test_variants", "expected_url", "expected_extension"),
+    (
+        (
+            {"gif": {"source": {"url": "https://preview.redd.it/anim.gif?s=g", "width": 500}, "resolutions": []}},
+            "https://preview.redd.it/anim.gif?s=g",
+            ".gif",
+        ),
+        (
+            {
+                "mp4": {
+                    "source": {"url": "https://preview.redd.it/anim.gif?format=mp4&amp;s=m", "width": 500},
+                    "resolutions": [],
+                }
+            },
+            "https://preview.redd.it/anim.gif?format=mp4&s=m",
+            ".mp4",
+        ),
+    ),
+)
+def test_animated_image_preview(test_variants: dict, expected_url: str, expected_extension: str):
+    submission = _make_image_submission()
+    submission.preview["images"][0]["variants"] = test_variants
+    results = Preview(submission, 640).find_resources()
+    assert [res.url for res in results] == [expected_url]
+    assert results[0].extension == expected_extension
+
+
+def test_animated_gallery_preview():
+    submission = Mock()
+    submission.id = "aaaaaa"
+    submission.is_gallery = True
+    submission.gallery_data = {"items": [{"media_id": "one"}]}
+    submission.media_metadata = {
+        "one": {
+            "status": "valid",
+            "e": "AnimatedImage",
+            "p": [{"x": 320, "u": "https://preview.redd.it/one.gif?width=320&amp;format=png8&amp;s=a"}],
+            "s": {"x": 500, "gif": "https://i.redd.it/one.gif", "mp4": "https://preview.redd.it/one.gif?format=mp4"},
+        },
+    }
+    results = Preview(submission, 640).find_resources()
+    assert [res.url for res in results] == ["https://i.redd.it/one.gif"]
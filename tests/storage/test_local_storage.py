@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import stat
+import sys
+from pathlib import Path
+
+import pytest
+
+from bdfr.storage.local_storage import FILE_MODE, LocalStorage
+
+
+def test_write_creates_parents(tmp_path: Path):
+    storage = LocalStorage(tmp_path)
+    destination = Path(tmp_path, "a", "b", "test.png")
+    assert not storage.exists(destination)
+    storage.write(destination, b"content", 1600000000.0)
+    assert storage.exists(destination)
+    assert destination.read_bytes() == b"content"
+    assert destination.stat().st_mtime == 1600000000.0
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows does not have POSIX file modes")
+@pytest.mark.parametrize("test_exclusive", (True, False))
+def test_write_mode(test_exclusive: bool, tmp_path: Path):
+    destination = Path(tmp_path, "test.png")
+    LocalStorage(tmp_path).write(destination, b"content", exclusive=test_exclusive)
+    assert stat.S_IMODE(destination.stat().st_mode) == FILE_MODE
+    assert FILE_MODE == 0o666 & ~os.umask(os.umask(0o022))
+
+
+def test_link(tmp_path: Path):
+    storage = LocalStorage(tmp_path)
+    original = Path(tmp_path, "original.png")
+    storage.write(original, b"content")
+    storage.link(Path(tmp_path, "sub", "link.png"), original)
+    assert Path(tmp_path, "sub", "link.png").stat().st_ino == original.stat().st_ino
+    assert storage.hash_list() is None
+
+
+def test_exclusive_write(tmp_path: Path):
+    storage = LocalStorage(tmp_path)
+    destination = Path(tmp_path, "test.png")
+    storage.write(destination, b"first", exclusive=True)
+    with pytest.raises(FileExistsError):
+        storage.write(destination, b"second", exclusive=True)
+    assert destination.read_bytes() == b"first"
+    storage.write(destination, b"third")
+    assert destination.read_bytes() == b"third"
+    assert [path.name for path in tmp_path.iterdir()] == ["test.png"]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import tarfile
+import zipfile
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from bdfr.exceptions import BulkDownloaderException
+from bdfr.storage.pack_storage import PackStorage
+
+
+@pytest.mark.parametrize("test_format", ("tar", "zip"))
+def test_write_and_reload(test_format: str, tmp_path: Path):
+    writer = PackStorage(tmp_path, test_format)
+    writer.write(Path(tmp_path, "sub", "a.png"), b"first", 1600000000)
+    writer.write(Path(tmp_path, "sub", "b.png"), b"second", 1600000000)
+    writer.close()
+    assert not Path(tmp_path, "sub").exists()
+
+    reloaded = PackStorage(tmp_path, test_format)
+    assert reloaded.exists(Path(tmp_path, "sub", "a.png"))
+    assert not reloaded.exists(Path(tmp_path, "sub", "c.png"))
+    assert reloaded.hash_list() == {
+        hashlib.md5(b"first").hexdigest(): Path(tmp_path, "sub", "a.png"),
+        hashlib.md5(b"second").hexdigest(): Path(tmp_path, "sub", "b.png"),
+    }
+    reloaded.write(Path(tmp_path, "sub", "c.png"), b"third", 1600000000)
+    reloaded.close()
+
+    pack_path = Path(tmp_path, f"pack_00001.{test_format}")
+    if test_format == "tar":
+        with tarfile.open(pack_path) as pack:
+            assert pack.getnames() == ["sub/a.png", "sub/b.png", "sub/c.png"]
+            assert pack.extractfile("sub/c.png").read() == b"third"
+    else:
+        with zipfile.ZipFile(pack_path) as pack:
+            assert pack.namelist() == ["sub/a.png", "sub/b.png", "sub/c.png"]
+            assert pack.read("sub/c.png") == b"third"
+
+
+@pytest.mark.parametrize(("test_max_count", "test_max_size", "expected_packs"), ((2, None, 3), (None, 3500, 3)))
+def test_rolling_packs(test_max_count: int, test_max_size: int, expected_packs: int, tmp_path: Path):
+    writer = PackStorage(tmp_path, "tar", max_size=test_max_size, max_count=test_max_count)
+    for i in range(5):
+        writer.write(Path(tmp_path, f"{i}.jpg"), bytes(1000), 1600000000)
+    writer.close()
+    assert sorted(p.name for p in tmp_path.glob("pack_*.tar")) == [
+        f"pack_{i:05}.tar" for i in range(1, expected_packs + 1)
+    ]
+
+
+def test_link_member(tmp_path: Path):
+    writer = PackStorage(tmp_path, "zip")
+    writer.write(Path(tmp_path, "a.png"), b"content", 1600000000)
+    writer.link(Path(tmp_path, "b.png"), Path(tmp_path, "a.png"))
+    writer.close()
+    with zipfile.ZipFile(Path(tmp_path, "pack_00001.zip")) as pack:
+        assert pack.namelist() == ["a.png"]
+    reloaded = PackStorage(tmp_path, "zip")
+    assert reloaded.members["b.png"]["member"] == "a.png"
+    with pytest.raises(BulkDownloaderException):
+        reloaded.link(Path(tmp_path, "c.png"), Path(tmp_path, "missing.png"))
+
+
+def test_destination_outside_directory(tmp_path: Path):
+    writer = PackStorage(Path(tmp_path, "inner"), "tar")
+    with pytest.raises(BulkDownloaderException):
+        writer.exists(Path(tmp_path, "a.png"))
+
+
+@pytest.mark.parametrize("test_format", ("tar", "zip"))
+@pytest.mark.parametrize("test_cut", (0, 3))
+def test_recover_unfinished_pack(test_format: str, test_cut: int, tmp_path: Path):
+    crashed = PackStorage(tmp_path, test_format)
+    crashed.write(Path(tmp_path, "a.png"), b"first", 1600000000)
+    crashed.write(Path(tmp_path, "b.png"), b"second", 1600000000)
+    # Stop without closing the pack, as a killed process would, and lose the end of the last member
+    crashed._lock.release()
+    pack_path = Path(tmp_path, f"pack_00001.{test_format}")
+    if test_cut:
+        with pack_path.open("r+b") as file:
+            file.truncate(pack_path.stat().st_size - test_cut)
+
+    recovered = PackStorage(tmp_path, test_format)
+    assert recovered.exists(Path(tmp_path, "a.png"))
+    assert recovered.exists(Path(tmp_path, "b.png")) == (not test_cut)
+    recovered.write(Path(tmp_path, "c.png"), b"third", 1600000000)
+    recovered.close()
+
+    expected = ["a.png", "c.png"] if test_cut else ["a.png", "b.png", "c.png"]
+    if test_format == "tar":
+        with tarfile.open(pack_path) as pack:
+            assert pack.getnames() == expected
+            assert pack.extractfile("c.png").read() == b"third"
+    else:
+        with zipfile.ZipFile(pack_path) as pack:
+            assert pack.namelist() == expected
+            assert pack.read("a.png") == b"first"
+    assert sorted(PackStorage(tmp_path, test_format).members) == expected
+
+
+def test_recover_only_newest_pack(tmp_path: Path):
+    writer = PackStorage(tmp_path, "tar", max_count=1)
+    for i in range(3):
+        writer.write(Path(tmp_path, f"{i}.jpg"), bytes(100), 1600000000)
+    writer.close()
+    with patch.object(PackStorage, "_recover_tar", return_value=None) as recover:
+        PackStorage(tmp_path, "tar", max_count=1)
+    recover.assert_called_once_with(Path(tmp_path, "pack_00003.tar"))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import configparser
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from bdfr.exceptions import BulkDownloaderException
+from bdfr.storage.s3_storage import S3Storage
+
+
+class FakeClientError(Exception):
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Client:
+    """In-memory stand-in for the subset of the S3 API that MinIO and other compatible servers provide"""
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], dict] = {}
+        self.uploads: dict[str, dict] = {}
+        self.aborted: list[str] = []
+        self.fail_on_part = None
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, Metadata: dict):
+        self.objects[(Bucket, Key)] = {"Body": Body, "Metadata": Metadata, "ETag": hashlib.md5(Body).hexdigest()}
+
+    def head_object(self, Bucket: str, Key: str):
+        if (Bucket, Key) not in self.objects:
+            raise FakeClientError("404")
+        return {"Metadata": self.objects[(Bucket, Key)]["Metadata"]}
+
+    def create_multipart_upload(self, Bucket: str, Key: str, Metadata: dict):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {"Key": Key, "Metadata": Metadata, "Parts": {}}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes):
+        if PartNumber == self.fail_on_part:
+            raise FakeClientError("500")
+        self.uploads[UploadId]["Parts"][PartNumber] = Body
+        return {"ETag": hashlib.md5(Body).hexdigest()}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict):
+        upload = self.uploads.pop(UploadId)
+        body = b"".join(upload["Parts"][part["PartNumber"]] for part in MultipartUpload["Parts"])
+        etag = f"{hashlib.md5(body).hexdigest()}-{len(MultipartUpload['Parts'])}"
+        self.objects[(Bucket, Key)] = {"Body": body, "Metadata": upload["Metadata"], "ETag": etag}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str):
+        self.uploads.pop(UploadId)
+        self.aborted.append(UploadId)
+
+    def copy_object(self, Bucket: str, Key: str, CopySource: dict):
+        self.objects[(Bucket, Key)] = dict(self.objects[(CopySource["Bucket"], CopySource["Key"])])
+
+    def get_paginator(self, _operation: str):
+        client = self
+
+        class Paginator:
+            @staticmethod
+            def paginate(Bucket: str, Prefix: str):
+                contents = [
+                    {"Key": key, "ETag": f'"{item["ETag"]}"'}
+                    for (bucket, key), item in client.objects.items()
+                    if bucket == Bucket and key.startswith(Prefix)
+                ]
+                yield {"Contents": contents}
+
+        return Paginator()
+
+
+@pytest.fixture()
+def fake_client() -> FakeS3Client:
+    return FakeS3Client()
+
+
+def test_single_request_upload(fake_client: FakeS3Client, tmp_path: Path):
+    storage = S3Storage(tmp_path, "bucket", "library/", client=fake_client)
+    destination = Path(tmp_path, "sub", "test.png")
+    assert not storage.exists(destination)
+    storage.write(destination, b"content", 1600000000.0)
+    assert storage.exists(destination)
+    stored = fake_client.objects[("bucket", "library/sub/test.png")]
+    assert stored["Body"] == b"content"
+    assert stored["Metadata"] == {"mtime": "1600000000.0"}
+
+
+def test_multipart_upload(fake_client: FakeS3Client, tmp_path: Path):
+    storage = S3Storage(tmp_path, "bucket", client=fake_client)
+    content = bytes(range(256)) * (12 * 1024 * 1024 // 256)
+    storage.write(Path(tmp_path, "video.mp4"), content)
+    stored = fake_client.objects[("bucket", "video.mp4")]
+    assert stored["Body"] == content
+    assert stored["ETag"].endswith("-2")
+    assert not fake_client.uploads
+
+
+def test_multipart_upload_aborted(fake_client: FakeS3Client, tmp_path: Path):
+    fake_client.fail_on_part = 2
+    storage = S3Storage(tmp_path, "bucket", client=fake_client)
+    with pytest.raises(FakeClientError):
+        storage.write(Path(tmp_path, "video.mp4"), bytes(12 * 1024 * 1024))
+    assert fake_client.aborted == ["upload-0"]
+    assert ("bucket", "video.mp4") not in fake_client.objects
+
+
+def test_link_and_hash_list(fake_client: FakeS3Client, tmp_path: Path):
+    storage = S3Storage(tmp_path, "bucket", "prefix", client=fake_client)
+    storage.write(Path(tmp_path, "a.png"), b"content")
+    storage.link(Path(tmp_path, "b.png"), Path(tmp_path, "a.png"))
+    storage.write(Path(tmp_path, "big.mp4"), bytes(9 * 1024 * 1024))
+    assert fake_client.objects[("bucket", "prefix/b.png")]["Body"] == b"content"
+    hashes = storage.hash_list()
+    assert list(hashes.keys()) == [hashlib.md5(b"content").hexdigest()]
+    assert hashes[hashlib.md5(b"content").hexdigest()] in (Path(tmp_path, "a.png"), Path(tmp_path, "b.png"))
+
+
+def test_destination_outside_directory(fake_client: FakeS3Client, tmp_path: Path):
+    storage = S3Storage(Path(tmp_path, "inner"), "bucket", client=fake_client)
+    with pytest.raises(BulkDownloaderException):
+        storage.write(Path(tmp_path, "a.png"), b"content")
+
+
+def test_from_config_requires_section(tmp_path: Path):
+    with pytest.raises(BulkDownloaderException):
+        S3Storage.from_config(tmp_path, configparser.ConfigParser())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from collections.abc import Iterator
+from unittest.mock import MagicMock
+
+import prawcore
+import pytest
+
+from bdfr.batch_fetcher import BatchFetcher
+
+
+def make_item(fullname: str) -> MagicMock:
+    item = MagicMock()
+    item.fullname = fullname
+    return item
+
+
+def test_batches_keep_order_and_fall_back():
+    fullnames = [f"t3_{i:06}" for i in range(250)]
+    missing = {"t3_000007", "t3_000150"}
+    reddit_instance = MagicMock()
+    reddit_instance.info.side_effect = lambda fullnames: iter(
+        [make_item(fullname) for fullname in reversed(fullnames) if fullname not in missing]
+    )
+    fallback = MagicMock(side_effect=make_item)
+    fetcher = BatchFetcher(reddit_instance, fullnames, fallback)
+    assert len(fetcher) == 250
+    results = list(fetcher)
+    assert [item.fullname for item in results] == fullnames
+    assert reddit_instance.info.call_count == 3
+    assert sorted(len(call.kwargs["fullnames"]) for call in reddit_instance.info.call_args_list) == [50, 100, 100]
+    assert sorted(call.args[0] for call in fallback.call_args_list) == sorted(missing)
+
+
+def test_empty():
+    reddit_instance = MagicMock()
+    assert list(BatchFetcher(reddit_instance, [], MagicMock())) == []
+    reddit_instance.info.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ("test_error", "expected_calls"),
+    ((prawcore.ServerError(MagicMock(status_code=500)), 4), (prawcore.Forbidden(MagicMock(status_code=403)), 2)),
+)
+def test_failed_batch_falls_back(test_error: Exception, expected_calls: int):
+    fullnames = [f"t3_{i:06}" for i in range(150)]
+    reddit_instance = MagicMock()
+
+    def info(fullnames: list[str]) -> Iterator[MagicMock]:
+        if fullnames[0] == "t3_000000":
+            raise test_error
+        return iter([make_item(fullname) for fullname in fullnames])
+
+    reddit_instance.info.side_effect = info
+    fallback = MagicMock(side_effect=make_item)
+    fetcher = BatchFetcher(reddit_instance, fullnames, fallback)
+    fetcher.retry_delay = 0
+    assert [item.fullname for item in fetcher] == fullnames
+    assert reddit_instance.info.call_count == expected_calls
+    assert fallback.call_count == 100
+
+
+def test_resume_after_fallback_error():
+    fullnames = [f"t3_{i:06}" for i in range(3)]
+    reddit_instance = MagicMock()
+    reddit_instance.info.return_value = iter([make_item("t3_000000"), make_item("t3_000002")])
+    fallback = MagicMock(side_effect=[prawcore.ServerError(MagicMock(status_code=500)), make_item("t3_000001")])
+    fetcher = BatchFetcher(reddit_instance, fullnames, fallback)
+    assert next(fetcher).fullname == "t3_000000"
+    with pytest.raises(prawcore.ServerError):
+        next(fetcher)
+    assert [item.fullname for item in fetcher] == ["t3_000001", "t3_000002"]
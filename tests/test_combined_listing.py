@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from bdfr.combined_listing import CombinedListing, chunk_subreddit_names
+
+
+def make_submission(subreddit: str, submission_id: str) -> MagicMock:
+    submission = MagicMock()
+    submission.subreddit.display_name = subreddit
+    submission.id = submission_id
+    return submission
+
+
+@pytest.mark.parametrize(
+    ("names", "max_length", "max_subreddits", "expected"),
+    (
+        (["a", "b", "c"], 100, 100, [["a", "b", "c"]]),
+        (["a", "b", "c"], 100, 2, [["a", "b"], ["c"]]),
+        (["aaa", "bbb", "ccc"], 7, 100, [["aaa", "bbb"], ["ccc"]]),
+        (["aaa", "bbb", "ccc"], 6, 100, [["aaa"], ["bbb"], ["ccc"]]),
+        ([], 100, 100, []),
+    ),
+)
+def test_chunk_subreddit_names(names: list[str], max_length: int, max_subreddits: int, expected: list[list[str]]):
+    result = chunk_subreddit_names(names, max_length, max_subreddits)
+    assert result == expected
+    assert all(len("+".join(chunk)) <= max_length for chunk in result if len(chunk) > 1)
+
+
+def test_combined_listing_limits_each_subreddit():
+    listing = [make_submission(sub, str(i)) for i, sub in enumerate(["A", "a", "a", "b", "a", "B", "c"])]
+    results = list(CombinedListing(iter(listing), ["a", "b"], 2))
+    assert [s.id for s in results] == ["0", "1", "3", "5"]
+
+
+def test_combined_listing_stops_when_all_full():
+    listing = MagicMock()
+    listing.__iter__.return_value = iter([make_submission("a", "1"), make_submission("b", "2")])
+    combined = CombinedListing(listing, ["a", "b"], 1)
+    iterator = iter(combined)
+    assert [s.id for s in iterator] == ["1", "2"]
+
+
+def test_combined_listing_no_limit():
+    listing = [make_submission(sub, str(i)) for i, sub in enumerate(["a", "a", "a", "b"])]
+    assert len(list(CombinedListing(iter(listing), ["a", "b"], None))) == 4
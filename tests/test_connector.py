@@ -1,20 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import configparser
+import time
 from collections.abc import Iterator
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Optional
 from unittest.mock import MagicMock
 
 import praw
 import praw.models
 import pytest
 
+from bdfr.combined_listing import CombinedListing
 from bdfr.configuration import Configuration
 from bdfr.connector import RedditConnector, RedditTypes
 from bdfr.download_filter import DownloadFilter
 from bdfr.exceptions import BulkDownloaderException
 from bdfr.file_name_formatter import FileNameFormatter
+from bdfr.incremental_state import IncrementalState
+from bdfr.persistent_state import PersistentState
 from bdfr.site_authenticator import SiteAuthenticator
 
 
@@ -30,11 +36,20 @@ def downloader_mock(args: Configuration):
     downloader_mock = MagicMock()
     downloader_mock.args = args
     downloader_mock.sanitise_subreddit_name = RedditConnector.sanitise_subreddit_name
-    downloader_mock.create_filtered_listing_generator = lambda x: RedditConnector.create_filtered_listing_generator(
-        downloader_mock, x
+    downloader_mock.create_filtered_listing_generator = lambda *args: RedditConnector.create_filtered_listing_generator(
+        downloader_mock, *args
+    )
+    downloader_mock.create_subreddit_listing = lambda *args, **kwargs: RedditConnector.create_subreddit_listing(
+        downloader_mock, *args, **kwargs
     )
     downloader_mock.split_args_input = RedditConnector.split_args_input
     downloader_mock.master_hash_list = {}
+    downloader_mock.source_cache = None
+    downloader_mock.incremental_state = None
+    downloader_mock.reddit_pool = None
+    downloader_mock._read_source = lambda generator: RedditConnector._read_source(downloader_mock, generator)
+    downloader_mock.source_cache_ttl = 0
+    downloader_mock.check_sources = lambda kind, checks: RedditConnector.check_sources(downloader_mock, kind, checks)
     return downloader_mock
 
 
@@ -63,6 +78,23 @@ def test_determine_directories(tmp_path: Path, downloader_mock: MagicMock):
     assert Path(tmp_path / "test").exists()
 
 
+def test_create_file_logger_in_use(tmp_path: Path, downloader_mock: MagicMock):
+    downloader_mock.args.log = str(Path(tmp_path, "test_log.txt"))
+    downloader_mock.cfg_parser.getint.return_value = 3
+    downloader_mock._process_log_path = RedditConnector._process_log_path
+    Path(tmp_path, "test_log.txt").write_text("first process")
+    first = RedditConnector.create_file_logger(downloader_mock)
+    first_lock = downloader_mock.log_lock
+    second = RedditConnector.create_file_logger(downloader_mock)
+    assert Path(first.baseFilename).name == "test_log.txt"
+    assert Path(second.baseFilename) != Path(first.baseFilename)
+    assert Path(tmp_path, "test_log.txt.1").read_text() == "first process"
+    first.close()
+    second.close()
+    first_lock.release()
+    downloader_mock.log_lock.release()
+
+
 @pytest.mark.parametrize(
     ("skip_extensions", "skip_domains"),
     (
@@ -180,6 +212,21 @@ def test_get_submissions_from_link(
     assert len(results[0]) == len(test_submission_ids)
 
 
+@pytest.mark.parametrize(
+    ("test_link", "expected_fullname"),
+    (
+        ("lvpf4l", "t3_lvpf4l"),
+        ("1000000", "t3_1000000"),
+        ("https://www.reddit.com/r/Python/comments/lvpf4l/test/", "t3_lvpf4l"),
+        ("https://redd.it/lvpf4l", "t3_lvpf4l"),
+    ),
+)
+def test_get_submissions_from_link_fullnames(test_link: str, expected_fullname: str, downloader_mock: MagicMock):
+    downloader_mock.args.link = [test_link]
+    results = RedditConnector.get_submissions_from_link(downloader_mock)
+    assert results[0].fullnames == [expected_fullname]
+
+
 @pytest.mark.online
 @pytest.mark.reddit
 @pytest.mark.parametrize(
@@ -492,6 +539,154 @@ def test_check_user_existence_banned(
         RedditConnector.check_user_existence(downloader_mock, test_redditor_name)
 
 
+def test_get_subreddits_combined(downloader_mock: MagicMock):
+    downloader_mock.args.subreddit = ["one", "Two", "all", "three"]
+    downloader_mock.args.combine_subreddits = True
+    downloader_mock.args.limit = 5
+    downloader_mock.sort_filter = RedditTypes.SortType.NEW
+    downloader_mock.determine_sort_function.return_value = praw.models.Subreddit.new
+    downloader_mock.reddit_instance.subreddit.side_effect = lambda name: MagicMock(display_name=name)
+    results = RedditConnector.get_subreddits(downloader_mock)
+    assert len(results) == 2
+    combined = [res for res in results if isinstance(res, CombinedListing)]
+    assert len(combined) == 1
+    assert combined[0].names == ["one", "three", "Two"]
+    assert combined[0].limit == 5
+    assert combined[0].listing.limit == 15
+
+
+@pytest.mark.parametrize(
+    ("test_limit", "expected_sizes"), ((None, [1, 1, 1, 1]), (250, [4]), (400, [2, 2]), (600, [1, 1, 1, 1]))
+)
+def test_get_subreddits_combined_within_listing_cap(
+    test_limit: Optional[int], expected_sizes: list[int], downloader_mock: MagicMock
+):
+    downloader_mock.args.subreddit = ["a", "b", "c", "d"]
+    downloader_mock.args.combine_subreddits = True
+    downloader_mock.args.limit = test_limit
+    downloader_mock.sort_filter = RedditTypes.SortType.NEW
+    downloader_mock.determine_sort_function.return_value = praw.models.Subreddit.new
+    downloader_mock.reddit_instance.subreddit.side_effect = lambda name: MagicMock(display_name=name)
+    results = RedditConnector.get_subreddits(downloader_mock)
+    assert sorted(len(res.names) if isinstance(res, CombinedListing) else 1 for res in results) == expected_sizes
+    for res in results:
+        if isinstance(res, CombinedListing):
+            assert res.listing.limit <= 1000
+
+
+def test_iterate_submissions_skips_duplicates(downloader_mock: MagicMock):
+    def make_item(item_id: str, comment: bool = False) -> MagicMock:
+        item = MagicMock(spec=praw.models.Comment if comment else praw.models.Submission)
+        item.id = item_id
+        return item
+
+    downloader_mock.seen_ids = set()
+    downloader_mock.already_seen = lambda item: RedditConnector.already_seen(downloader_mock, item)
+    downloader_mock.reddit_lists = [
+        [make_item("abc123"), make_item("def456")],
+        [make_item("DEF456"), make_item("abc123", comment=True)],
+        [make_item("abc123"), make_item("ghi789")],
+    ]
+    results = list(RedditConnector.iterate_submissions(downloader_mock))
+    assert [(res.id, isinstance(res, praw.models.Comment)) for res in results] == [
+        ("abc123", False),
+        ("def456", False),
+        ("abc123", True),
+        ("ghi789", False),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("test_mark", "test_known_limit", "expected_ids", "expected_mark"),
+    (
+        (None, 3, ["e", "d", "c", "b", "a"], "e"),
+        ({"id": "c", "created_utc": 3}, 3, ["e", "d"], "e"),
+        ({"id": "z", "created_utc": 3}, 2, ["e", "d", "b"], "e"),
+        ({"id": "z", "created_utc": 3}, 1, ["e", "d"], "e"),
+        ({"id": "e", "created_utc": 5}, 3, [], "e"),
+    ),
+)
+def test_iterate_submissions_incremental(
+    test_mark: Optional[dict],
+    test_known_limit: int,
+    expected_ids: list[str],
+    expected_mark: str,
+    downloader_mock: MagicMock,
+    tmp_path: Path,
+):
+    items = [
+        MagicMock(id=item_id, created_utc=created)
+        for item_id, created in (("e", 5), ("d", 4), ("c", 3), ("b", 3.5), ("a", 2))
+    ]
+    downloader_mock.seen_ids = set()
+    downloader_mock.already_seen = lambda item: RedditConnector.already_seen(downloader_mock, item)
+    state = IncrementalState(Path(tmp_path, "state.json"), tmp_path, test_known_limit)
+    state.source_key = lambda generator: "source"
+    if test_mark:
+        state.record("source", MagicMock(**test_mark))
+    downloader_mock.incremental_state = state
+    downloader_mock.reddit_lists = [items]
+    results = list(RedditConnector.iterate_submissions(downloader_mock))
+    assert [res.id for res in results] == expected_ids
+    assert state.get("source")["id"] == expected_mark
+
+
+def test_create_reddit_pool(downloader_mock: MagicMock):
+    downloader_mock.cfg_parser = configparser.ConfigParser()
+    downloader_mock.cfg_parser.read_string(
+        "[DEFAULT]\nclient_id = main\nclient_secret = secret\n"
+        "[client.second]\nclient_id = second\nclient_secret = secret\n"
+        "[client.copy]\nclient_id = main\nclient_secret = secret\n"
+        "[other]\nvalue = 1\n"
+    )
+    downloader_mock.reddit_instance = MagicMock()
+    pool = RedditConnector.create_reddit_pool(downloader_mock)
+    assert len(pool) == 2
+    assert pool.instances[0] is downloader_mock.reddit_instance
+    assert pool.instances[1].config.client_id == "second"
+
+
+def test_create_reddit_pool_single_app(downloader_mock: MagicMock):
+    downloader_mock.cfg_parser = configparser.ConfigParser()
+    downloader_mock.cfg_parser.read_string("[DEFAULT]\nclient_id = main\nclient_secret = secret\n")
+    assert RedditConnector.create_reddit_pool(downloader_mock) is None
+
+
+def test_check_sources_uses_cache(tmp_path: Path, downloader_mock: MagicMock):
+    downloader_mock.source_cache = PersistentState(Path(tmp_path, "source_cache.json"))
+    downloader_mock.source_cache_ttl = 60 * 60
+    downloader_mock.source_cache["subreddit:cached"] = time.time()
+    checked = []
+
+    def good():
+        checked.append("good")
+
+    def bad():
+        checked.append("bad")
+        raise BulkDownloaderException("bad")
+
+    results = RedditConnector.check_sources(
+        downloader_mock,
+        "subreddit",
+        {"Cached": lambda: checked.append("cached"), "Good": good, "Bad": bad},
+    )
+    assert sorted(checked) == ["bad", "good"]
+    assert list(results.keys()) == ["Bad"]
+    assert isinstance(results["Bad"], BulkDownloaderException)
+    saved = PersistentState(Path(tmp_path, "source_cache.json"))
+    assert "subreddit:good" in saved
+    assert "subreddit:bad" not in saved
+
+
+def test_check_sources_expired_cache(tmp_path: Path, downloader_mock: MagicMock):
+    downloader_mock.source_cache = PersistentState(Path(tmp_path, "source_cache.json"))
+    downloader_mock.source_cache_ttl = 60 * 60
+    downloader_mock.source_cache["user:old"] = time.time() - 2 * 60 * 60
+    checked = []
+    RedditConnector.check_sources(downloader_mock, "user", {"old": lambda: checked.append("old")})
+    assert checked == ["old"]
+
+
 @pytest.mark.online
 @pytest.mark.reddit
 @pytest.mark.parametrize(
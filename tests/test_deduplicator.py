@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import pytest
+
+from bdfr.deduplicator import Deduplicator
+
+
+@pytest.fixture()
+def library(tmp_path: Path) -> Path:
+    Path(tmp_path, "a").mkdir()
+    Path(tmp_path, "b").mkdir()
+    Path(tmp_path, "a", "one.txt").write_text("duplicate")
+    Path(tmp_path, "b", "two.txt").write_text("duplicate")
+    Path(tmp_path, "b", "three.txt").write_text("duplicate")
+    Path(tmp_path, "b", "same_size.txt").write_text("different")
+    Path(tmp_path, "b", "empty.txt").touch()
+    Path(tmp_path, "b", "empty_too.txt").touch()
+    Path(tmp_path, "b", "linked.txt").hardlink_to(Path(tmp_path, "b", "three.txt"))
+    return tmp_path
+
+
+def test_find_duplicates(library: Path):
+    groups = Deduplicator(library).find_duplicates()
+    assert groups == [
+        [
+            [Path(library, "b", "linked.txt"), Path(library, "b", "three.txt")],
+            [Path(library, "a", "one.txt")],
+            [Path(library, "b", "two.txt")],
+        ]
+    ]
+
+
+def test_deduplicate(library: Path):
+    report = Deduplicator(library).deduplicate()
+    assert report.duplicate_groups == 1
+    assert report.replaced == 2
+    assert report.reclaimed_bytes == 2 * len("duplicate")
+    assert Path(library, "a", "one.txt").stat().st_nlink == 4
+    assert Path(library, "a", "one.txt").read_text() == "duplicate"
+    assert Path(library, "b", "same_size.txt").stat().st_nlink == 1
+    assert not list(library.rglob(".*"))
+
+
+def test_deduplicate_dry_run(library: Path):
+    report = Deduplicator(library, dry_run=True).deduplicate()
+    assert report.replaced == 2
+    assert report.reclaimed_bytes == 2 * len("duplicate")
+    assert Path(library, "a", "one.txt").stat().st_nlink == 1
+
+
+def test_partial_hash_match(tmp_path: Path):
+    common_start = b"0" * Deduplicator.partial_hash_size
+    Path(tmp_path, "first").write_bytes(common_start + b"a")
+    Path(tmp_path, "second").write_bytes(common_start + b"b")
+    assert Deduplicator(tmp_path).find_duplicates() == []
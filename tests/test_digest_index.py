@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from bdfr.digest_index import DigestIndex
+from bdfr.exceptions import BulkDownloaderException
+
+
+def _digest(content: str) -> str:
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+@pytest.fixture()
+def saved_index(tmp_path: Path) -> Path:
+    index_path = Path(tmp_path, "hashes.idx")
+    entries = {_digest(str(i)): Path(tmp_path, f"file_{i}.png") for i in range(100)}
+    DigestIndex(entries).save(index_path)
+    return index_path
+
+
+def test_load_lookup(saved_index: Path, tmp_path: Path):
+    index = DigestIndex.load(saved_index)
+    assert len(index) == 100
+    assert index[_digest("42")] == Path(tmp_path, "file_42.png")
+    assert _digest("100") not in index
+    assert "not a hash" not in index
+    assert set(index.keys()) == {_digest(str(i)) for i in range(100)}
+
+
+def test_changes_saved(saved_index: Path, tmp_path: Path):
+    index = DigestIndex.load(saved_index)
+    index[_digest("new")] = Path(tmp_path, "new.png")
+    index[_digest("1")] = Path(tmp_path, "moved.png")
+    del index[_digest("2")]
+    assert len(index) == 100
+    assert index[_digest("1")] == Path(tmp_path, "moved.png")
+    with pytest.raises(KeyError):
+        index[_digest("2")]
+    index.save(saved_index)
+
+    reloaded = DigestIndex.load(saved_index)
+    assert len(reloaded) == 100
+    assert reloaded[_digest("new")] == Path(tmp_path, "new.png")
+    assert reloaded[_digest("1")] == Path(tmp_path, "moved.png")
+    assert _digest("2") not in reloaded
+    assert list(reloaded.keys()) == sorted(reloaded.keys())
+
+
+def test_save_merges_replaced_file(saved_index: Path, tmp_path: Path):
+    first = DigestIndex.load(saved_index)
+    second = DigestIndex.load(saved_index)
+    first[_digest("first")] = Path(tmp_path, "first.png")
+    del first[_digest("3")]
+    second[_digest("second")] = Path(tmp_path, "second.png")
+    second.save(saved_index, merge=True)
+    first.save(saved_index, merge=True)
+    merged = DigestIndex.load(saved_index)
+    assert len(merged) == 101
+    assert merged[_digest("first")] == Path(tmp_path, "first.png")
+    assert merged[_digest("second")] == Path(tmp_path, "second.png")
+    assert _digest("3") not in merged
+
+
+def test_empty_index(tmp_path: Path):
+    index_path = Path(tmp_path, "sub", "empty.idx")
+    DigestIndex().save(index_path)
+    index = DigestIndex.load(index_path)
+    assert len(index) == 0
+    assert _digest("a") not in index
+
+
+def test_not_an_index(tmp_path: Path):
+    index_path = Path(tmp_path, "bad.idx")
+    index_path.write_bytes(b"\x00" * 64)
+    with pytest.raises(BulkDownloaderException):
+        DigestIndex.load(index_path)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+from bdfr.download_index import DownloadIndex
+
+
+def test_record_and_reload(tmp_path: Path):
+    index_path = Path(tmp_path, "sub", "downloads.db")
+    index = DownloadIndex(index_path)
+    index.record_file("aaaaaa", "https://example.com/1.png", Path(tmp_path, "1.png"))
+    index.record_file("aaaaaa", "https://example.com/2.png", Path(tmp_path, "2.png"))
+    index.record_file("aaaaaa", "https://example.com/2.png", Path(tmp_path, "2.png"))
+    assert not index.is_complete("aaaaaa")
+    index.mark_complete("aaaaaa")
+    index.close()
+
+    reloaded = DownloadIndex(index_path)
+    assert reloaded.is_complete("aaaaaa")
+    assert not reloaded.is_complete("bbbbbb")
+    assert reloaded.get_files("aaaaaa") == [
+        ("https://example.com/1.png", Path(tmp_path, "1.png")),
+        ("https://example.com/2.png", Path(tmp_path, "2.png")),
+    ]
+    assert reloaded.get_files("bbbbbb") == []
+    reloaded.close()
+
+
+def test_record_url(tmp_path: Path):
+    index = DownloadIndex(Path(tmp_path, "downloads.db"))
+    assert index.get_url("https://example.com/1.png") is None
+    index.record_url("https://example.com/1.png", "abc", Path(tmp_path, "1.png"), '"etag"', 10)
+    index.record_url("https://example.com/1.png", "def", Path(tmp_path, "2.png"))
+    seen = index.get_url("https://example.com/1.png")
+    assert seen.hash == "def"
+    assert seen.path == Path(tmp_path, "2.png")
+    assert seen.etag is None
+    index.close()
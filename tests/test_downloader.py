@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import hashlib
 import logging
 import re
 from pathlib import Path
@@ -11,7 +12,11 @@ import pytest
 from bdfr.__main__ import make_console_logging_handler
 from bdfr.configuration import Configuration
 from bdfr.connector import RedditConnector
+from bdfr.download_index import DownloadIndex
 from bdfr.downloader import RedditDownloader
+from bdfr.resource import Resource
+from bdfr.storage.local_storage import LocalStorage
+from bdfr.storage.pack_storage import PackStorage
 
 
 def add_console_handler():
@@ -32,6 +37,9 @@ def downloader_mock(args: Configuration):
     downloader_mock._sanitise_subreddit_name = RedditConnector.sanitise_subreddit_name
     downloader_mock._split_args_input = RedditConnector.split_args_input
     downloader_mock.master_hash_list = {}
+    downloader_mock.storage = LocalStorage(Path())
+    downloader_mock.download_index = None
+    downloader_mock.excluded_hashes = set()
     return downloader_mock
 
 
@@ -69,6 +77,108 @@ def test_excluded_ids(
     assert mock_function.call_count == expected_len
 
 
+@pytest.mark.parametrize(("test_post_hint", "expected_lever_calls"), (("image", 0), ("hosted:video", 1)))
+@patch("bdfr.site_downloaders.download_factory.DownloadFactory.pull_lever")
+def test_preview_width_skips_factory(
+    mock_function: MagicMock,
+    test_post_hint: str,
+    expected_lever_calls: int,
+    downloader_mock: MagicMock,
+    tmp_path: Path,
+):
+    mock_function.return_value = MagicMock()
+    mock_function.return_value.__name__ = "test"
+    mock_function.return_value.return_value.find_resources.return_value = []
+    downloader_mock.args.preview_width = 640
+    downloader_mock._find_preview_resources = lambda s: RedditDownloader._find_preview_resources(downloader_mock, s)
+    downloader_mock.excluded_submission_ids = set()
+    downloader_mock.file_name_formatter.format_resource_paths.return_value = []
+    downloader_mock.file_name_formatter.requires_content_hash = False
+    submission = MagicMock()
+    submission.__class__ = praw.models.Submission
+    submission.id = "aaaaaa"
+    submission.score = 10
+    submission.post_hint = test_post_hint
+    submission.preview = {"images": [{"source": {"url": "https://preview.redd.it/a.jpg", "width": 600}}]}
+    RedditDownloader._download_submission(downloader_mock, submission)
+    assert mock_function.call_count == expected_lever_calls
+    resources = downloader_mock.file_name_formatter.format_resource_paths.call_args.args[0]
+    if expected_lever_calls == 0:
+        assert [res.url for res in resources] == ["https://preview.redd.it/a.jpg"]
+
+
+@pytest.mark.parametrize(("test_url", "expected_downloaded"), (("https://example.com/a.png", 1), ("", 0)))
+def test_download_before_formatting(
+    test_url: str,
+    expected_downloaded: int,
+    downloader_mock: MagicMock,
+):
+    downloader_mock.download_filter.check_resource.side_effect = lambda res: bool(res.url)
+    submission = MagicMock()
+    resource = Resource(submission, test_url, lambda _: b"content", ".png")
+    results = RedditDownloader._download_before_formatting(downloader_mock, [resource], submission, "test")
+    assert len(results) == expected_downloaded
+    if expected_downloaded:
+        assert results[0].hash.hexdigest() == "9a0364b9e99bb480dd25e1f0284c8555"
+
+
+@pytest.mark.parametrize(
+    ("test_complete", "test_file_exists", "expected_lever_calls"),
+    ((True, True, 0), (True, False, 1), (False, True, 1)),
+)
+@patch("bdfr.site_downloaders.download_factory.DownloadFactory.pull_lever")
+def test_download_index_skips_submission(
+    mock_function: MagicMock,
+    test_complete: bool,
+    test_file_exists: bool,
+    expected_lever_calls: int,
+    downloader_mock: MagicMock,
+    tmp_path: Path,
+):
+    mock_function.return_value = MagicMock()
+    mock_function.return_value.__name__ = "test"
+    downloader_mock.excluded_submission_ids = set()
+    downloader_mock.download_index = DownloadIndex(Path(tmp_path, "downloads.db"))
+    downloader_mock._recorded_as_downloaded = lambda s: RedditDownloader._recorded_as_downloaded(downloader_mock, s)
+    downloader_mock._known_url_excluded = lambda u: RedditDownloader._known_url_excluded(downloader_mock, u)
+    downloader_mock._stored = lambda p: RedditDownloader._stored(downloader_mock, p)
+    existing_file = Path(tmp_path, "renamed.png")
+    if test_file_exists:
+        existing_file.touch()
+    downloader_mock.download_index.record_file("aaaaaa", "https://example.com/a.png", existing_file)
+    if test_complete:
+        downloader_mock.download_index.mark_complete("aaaaaa")
+    submission = MagicMock()
+    submission.__class__ = praw.models.Submission
+    submission.id = "aaaaaa"
+    submission.score = 10
+    RedditDownloader._download_submission(downloader_mock, submission)
+    assert mock_function.call_count == expected_lever_calls
+
+
+@pytest.mark.parametrize(("test_hard_links", "test_reflinks"), ((True, False), (False, True), (False, False)))
+def test_reuse_seen_url(test_hard_links: bool, test_reflinks: bool, downloader_mock: MagicMock, tmp_path: Path):
+    downloader_mock.download_index = DownloadIndex(Path(tmp_path, "downloads.db"))
+    downloader_mock.args.make_hard_links = test_hard_links
+    downloader_mock.args.make_reflinks = test_reflinks
+    downloader_mock._link_duplicate = lambda d, t, h: RedditDownloader._link_duplicate(downloader_mock, d, t, h)
+    downloader_mock.master_hash_list = {}
+    downloader_mock._stored = lambda p: RedditDownloader._stored(downloader_mock, p)
+    stored_file = Path(tmp_path, "stored.png")
+    stored_file.write_bytes(b"test")
+    downloader_mock.download_index.record_url("https://example.com/a.png", "abc", stored_file)
+    submission = MagicMock()
+    submission.id = "aaaaaa"
+    res = Resource(submission, "https://example.com/a.png", MagicMock())
+    destination = Path(tmp_path, "new.png")
+    assert RedditDownloader._reuse_seen_url(downloader_mock, submission, res, destination)
+    res.download_function.assert_not_called()
+    assert destination.exists() == (test_hard_links or test_reflinks)
+    assert downloader_mock.master_hash_list == {"abc": stored_file}
+    res = Resource(submission, "https://example.com/b.png", MagicMock())
+    assert not RedditDownloader._reuse_seen_url(downloader_mock, submission, res, destination)
+
+
 @pytest.mark.online
 @pytest.mark.reddit
 @pytest.mark.parametrize("test_submission_id", ("m1hqw6",))
@@ -126,6 +236,112 @@ def test_search_existing_files():
     assert len(results.keys()) != 0
 
 
+def test_read_hash_files(tmp_path: Path):
+    hash_file = Path(tmp_path, "hashes.md5")
+    hash_file.write_text(
+        "# known spam\n"
+        "\n"
+        "D41D8CD98F00B204E9800998ECF8427E\n"
+        "a912af8905ae468e0121e9940f797ad7  some/file.jpg\n"
+        "not a hash\n"
+    )
+    results = RedditDownloader.read_hash_files([str(hash_file), str(Path(tmp_path, "missing.md5"))])
+    assert results == {"d41d8cd98f00b204e9800998ecf8427e", "a912af8905ae468e0121e9940f797ad7"}
+
+
+def test_excluded_hash_not_written(downloader_mock: MagicMock, tmp_path: Path):
+    downloader_mock.excluded_hashes = {hashlib.md5(b"blocked").hexdigest()}
+    downloader_mock.excluded_submission_ids = set()
+    downloader_mock.args.preview_width = 100
+    downloader_mock.file_name_formatter.requires_content_hash = False
+    destination = Path(tmp_path, "blocked.png")
+    submission = MagicMock()
+    submission.__class__ = praw.models.Submission
+    submission.id = "aaaaaa"
+    submission.score = 10
+    res = Resource(submission, "https://example.com/blocked.png", lambda _: b"blocked")
+    downloader_mock._find_preview_resources.return_value = [res]
+    downloader_mock.file_name_formatter.format_resource_paths.return_value = [(destination, res)]
+    RedditDownloader._download_submission(downloader_mock, submission)
+    assert not destination.exists()
+    assert downloader_mock.master_hash_list == {}
+
+
+def test_excluded_hash_recorded(downloader_mock: MagicMock, tmp_path: Path):
+    downloader_mock.download_index = DownloadIndex(Path(tmp_path, "downloads.db"))
+    downloader_mock.excluded_hashes = {hashlib.md5(b"blocked").hexdigest()}
+    downloader_mock.excluded_submission_ids = set()
+    downloader_mock.args.preview_width = 100
+    downloader_mock._record_url = lambda r, d: RedditDownloader._record_url(downloader_mock, r, d)
+    downloader_mock._known_url_excluded = lambda u: RedditDownloader._known_url_excluded(downloader_mock, u)
+    downloader_mock.file_name_formatter.requires_content_hash = False
+    downloader_mock.download_filter.check_resource.return_value = True
+    destination = Path(tmp_path, "blocked.png")
+    submission = MagicMock()
+    submission.__class__ = praw.models.Submission
+    submission.id = "aaaaaa"
+    submission.score = 10
+    res = Resource(submission, "https://example.com/blocked.png", lambda _: b"blocked")
+    downloader_mock._find_preview_resources.return_value = [res]
+    downloader_mock.file_name_formatter.format_resource_paths.return_value = [(destination, res)]
+    downloader_mock._recorded_as_downloaded.return_value = False
+    downloader_mock._reuse_seen_url.return_value = False
+    RedditDownloader._download_submission(downloader_mock, submission)
+    assert not destination.exists()
+    assert downloader_mock._known_url_excluded(res.url)
+    assert RedditDownloader._recorded_as_downloaded(downloader_mock, submission)
+
+
+def test_recorded_in_foreign_directory(downloader_mock: MagicMock, tmp_path: Path):
+    downloader_mock.storage = PackStorage(Path(tmp_path, "own"), "tar")
+    downloader_mock.download_index = DownloadIndex(Path(tmp_path, "downloads.db"))
+    downloader_mock._stored = lambda p: RedditDownloader._stored(downloader_mock, p)
+    downloader_mock._known_url_excluded = lambda u: RedditDownloader._known_url_excluded(downloader_mock, u)
+    downloader_mock.download_index.record_file("aaaaaa", "https://example.com/a.png", Path(tmp_path, "other", "a.png"))
+    downloader_mock.download_index.mark_complete("aaaaaa")
+    submission = MagicMock(id="aaaaaa")
+    assert not RedditDownloader._recorded_as_downloaded(downloader_mock, submission)
+
+
+def test_link_to_foreign_root_writes_pack(downloader_mock: MagicMock, tmp_path: Path):
+    own_directory = Path(tmp_path, "own")
+    other_file = Path(tmp_path, "other", "shared.png")
+    downloader_mock.storage = PackStorage(own_directory, "tar")
+    downloader_mock.master_hash_list = {hashlib.md5(b"shared").hexdigest(): other_file}
+    downloader_mock.excluded_submission_ids = set()
+    downloader_mock.args.make_hard_links = True
+    downloader_mock.args.preview_width = 100
+    downloader_mock._link_duplicate = lambda d, t, h: RedditDownloader._link_duplicate(downloader_mock, d, t, h)
+    downloader_mock.file_name_formatter.requires_content_hash = False
+    destination = Path(own_directory, "shared.png")
+    submission = MagicMock()
+    submission.__class__ = praw.models.Submission
+    submission.id = "aaaaaa"
+    submission.score = 10
+    res = Resource(submission, "https://example.com/shared.png", lambda _: b"shared")
+    downloader_mock._find_preview_resources.return_value = [res]
+    downloader_mock.file_name_formatter.format_resource_paths.return_value = [(destination, res)]
+    RedditDownloader._download_submission(downloader_mock, submission)
+    downloader_mock.storage.close()
+    assert downloader_mock.storage.members["shared.png"]["member"] == "shared.png"
+
+
+def test_find_existing_hashes_index_roots(downloader_mock: MagicMock, tmp_path: Path):
+    own_directory = Path(tmp_path, "own")
+    other_library = Path(tmp_path, "other")
+    for directory in (own_directory, other_library):
+        directory.mkdir()
+        Path(directory, "shared.txt").write_text("shared")
+    Path(other_library, "other.txt").write_text("other")
+    downloader_mock.args.index_root = [str(other_library)]
+    downloader_mock.download_directory = own_directory
+    downloader_mock.storage = LocalStorage(own_directory)
+    downloader_mock.scan_existing_files = RedditDownloader.scan_existing_files
+    results = RedditDownloader.find_existing_hashes(downloader_mock)
+    assert len(results) == 2
+    assert set(results.values()) == {Path(own_directory, "shared.txt"), Path(other_library, "other.txt")}
+
+
 @pytest.mark.online
 @pytest.mark.reddit
 @pytest.mark.parametrize(("test_submission_id", "test_hash"), (("m1hqw6", "a912af8905ae468e0121e9940f797ad7"),))
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+from bdfr.file_lock import FileLock
+
+
+def test_lock_excludes_other_holders(tmp_path: Path):
+    lock_path = Path(tmp_path, "test.lock")
+    first = FileLock(lock_path)
+    second = FileLock(lock_path)
+    assert first.acquire(blocking=False)
+    assert first.held
+    assert not second.acquire(blocking=False)
+    assert not second.held
+    first.release()
+    assert second.acquire(blocking=False)
+    second.release()
+
+
+def test_lock_context_manager(tmp_path: Path):
+    lock_path = Path(tmp_path, "sub", "test.lock")
+    with FileLock(lock_path) as lock:
+        assert lock.held
+        assert not FileLock(lock_path).acquire(blocking=False)
+    assert not lock.held
@@ -12,6 +12,7 @@ from unittest.mock import MagicMock
 import praw.models
 import pytest
 
+from bdfr.exceptions import BulkDownloaderException
 from bdfr.file_name_formatter import FileNameFormatter
 from bdfr.resource import Resource
 from bdfr.site_downloaders.base_downloader import BaseDownloader
@@ -92,6 +93,8 @@ def test_format_name_mock(test_format_string: str, expected: str, submission: Ma
         ("{POSTID}_test", True),
         ("test_{TITLE}", True),
         ("TITLE_POSTID", False),
+        ("{POSTID_SHARD:2}", True),
+        ("{hash_shard}", True),
     ),
 )
 def test_check_format_string_validity(test_string: str, expected: bool):
@@ -228,6 +231,68 @@ def test_format_multiple_resources():
     assert results == expected
 
 
+@pytest.mark.parametrize(
+    ("test_folder_scheme", "expected"),
+    (
+        ("{POSTID_SHARD}", "test/82/12345.png"),
+        ("{POSTID_SHARD:3}", "test/827/12345.png"),
+        ("{SUBREDDIT}/{postid_shard:1}", "test/randomreddit/8/12345.png"),
+        ("{HASH_SHARD:2}", "test/9a/12345.png"),
+        ("{HASH_SHARD:4}/{POSTID_SHARD:1}", "test/9a03/8/12345.png"),
+    ),
+)
+def test_format_shard_keys(test_folder_scheme: str, expected: str, submission: MagicMock):
+    test_resource = Resource(submission, "https://example.com/test.png", lambda _: b"content")
+    test_resource.download()
+    test_formatter = FileNameFormatter("{POSTID}", test_folder_scheme, "ISO")
+    result = test_formatter.format_path(test_resource, Path("test"))
+    assert do_test_path_equality(result, expected)
+
+
+@pytest.mark.parametrize(
+    ("test_folder_scheme", "expected"),
+    (("{POSTID_SHARD:2}", False), ("{SUBREDDIT}/{HASH_SHARD}", True), ("{HASH_SHARD:3}", True)),
+)
+def test_requires_content_hash(test_folder_scheme: str, expected: bool):
+    test_formatter = FileNameFormatter("{POSTID}", test_folder_scheme, "ISO")
+    assert test_formatter.requires_content_hash == expected
+
+
+@pytest.mark.parametrize(
+    ("test_file_scheme", "test_folder_scheme", "expected"),
+    (
+        ("{POSTID}", "{POSTID_SHARD}/{HASH_SHARD:3}", False),
+        ("{postid}", "", False),
+        ("{POSTID}", "{SUBREDDIT}", True),
+        ("{title}_{POSTID}", "{POSTID_SHARD}", True),
+    ),
+)
+def test_requires_submission_details(test_file_scheme: str, test_folder_scheme: str, expected: bool):
+    test_formatter = FileNameFormatter(test_file_scheme, test_folder_scheme, "ISO")
+    assert test_formatter.requires_submission_details == expected
+
+
+def test_hash_shard_without_content(submission: MagicMock):
+    test_resource = Resource(submission, "https://example.com/test.png", lambda _: None)
+    test_formatter = FileNameFormatter("{POSTID}", "{HASH_SHARD}", "ISO")
+    with pytest.raises(BulkDownloaderException):
+        test_formatter.format_path(test_resource, Path("test"))
+
+
+def test_shard_keys_in_title_left_alone(submission: MagicMock):
+    submission.title = "nice {HASH_SHARD} pic {postid_shard:3}"
+    test_resource = Resource(submission, "https://example.com/test.png", lambda _: None)
+    test_formatter = FileNameFormatter("{TITLE}_{POSTID}", "{POSTID_SHARD}", "ISO")
+    result = test_formatter.format_path(test_resource, Path("test"))
+    assert do_test_path_equality(result, "test/82/nice {HASH_SHARD} pic {postid_shard:3}_12345.png")
+
+
+@pytest.mark.parametrize("test_folder_scheme", ("{POSTID_SHARD:0}", "{HASH_SHARD:9}"))
+def test_shard_length_bounds(test_folder_scheme: str):
+    with pytest.raises(BulkDownloaderException):
+        FileNameFormatter("{POSTID}", test_folder_scheme, "ISO")
+
+
 @pytest.mark.parametrize(
     ("test_filename", "test_ending"),
     (
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import praw
+import pytest
+
+from bdfr.combined_listing import CombinedListing
+from bdfr.incremental_state import IncrementalState
+
+
+@pytest.fixture()
+def state(tmp_path: Path) -> IncrementalState:
+    return IncrementalState(Path(tmp_path, "incremental_state.json"), Path("/downloads"), 3)
+
+
+@pytest.fixture(scope="module")
+def offline_reddit() -> praw.Reddit:
+    return praw.Reddit(client_id="test", client_secret="test", user_agent="test")
+
+
+def make_item(item_id: str, created: float) -> MagicMock:
+    item = MagicMock()
+    item.id = item_id
+    item.created_utc = created
+    return item
+
+
+def test_source_key(state: IncrementalState, offline_reddit: praw.Reddit):
+    subreddit = offline_reddit.subreddit("python")
+    assert state.source_key(subreddit.new(limit=10)) == "/downloads|r/python/new"
+    assert state.source_key(subreddit.new(limit=10)) == state.source_key(subreddit.new(limit=500))
+    assert state.source_key(subreddit.hot(limit=10)) is None
+    assert state.source_key(offline_reddit.redditor("someone").submissions.new()).startswith(
+        "/downloads|user/someone/submitted?"
+    )
+    assert state.source_key(offline_reddit.redditor("someone").saved()) is None
+    assert state.source_key([]) is None
+    combined = CombinedListing(offline_reddit.subreddit("a+b").new(limit=10), ["a", "b"], 5)
+    assert state.source_key(combined) == "/downloads|r/a+b/new"
+
+
+def test_record_only_moves_forward(state: IncrementalState, tmp_path: Path):
+    state.record("source", make_item("bbbbbb", 200))
+    state.record("source", make_item("aaaaaa", 100))
+    reloaded = IncrementalState(Path(tmp_path, "incremental_state.json"), Path("/downloads"), 3)
+    assert reloaded.get("source") == {"id": "bbbbbb", "created_utc": 200}
+
+
+def test_record_keeps_other_runs(state: IncrementalState, tmp_path: Path):
+    other = IncrementalState(Path(tmp_path, "incremental_state.json"), Path("/other"), 3)
+    other.record("other", make_item("cccccc", 300))
+    state.record("source", make_item("bbbbbb", 200))
+    assert state.get("other") == {"id": "cccccc", "created_utc": 300}
+
+
+@pytest.mark.parametrize(
+    ("test_id", "test_created", "expected"),
+    (
+        ("bbbbbb", 250, True),
+        ("cccccc", 200, True),
+        ("cccccc", 150, True),
+        ("cccccc", 201, False),
+    ),
+)
+def test_is_known(test_id: str, test_created: float, expected: bool):
+    assert IncrementalState.is_known(make_item(test_id, test_created), {"id": "bbbbbb", "created_utc": 200}) is expected
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+from bdfr.index_watcher import IN_CLOSE_WRITE, IN_CREATE, IN_DELETE, IndexWatcher
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is only available on Linux")
+
+
+def _digest(content: str) -> str:
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+def wait_for(condition: Callable[[], bool]) -> bool:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture()
+def watched(tmp_path: Path):
+    existing = Path(tmp_path, "existing.txt")
+    existing.write_text("existing")
+    hash_list = {_digest("existing"): existing}
+    watcher = IndexWatcher(tmp_path, hash_list)
+    watcher.start()
+    yield tmp_path, hash_list
+    watcher.stop()
+
+
+def test_watch_file_changes(watched: tuple[Path, dict]):
+    directory, hash_list = watched
+    new_file = Path(directory, "new.txt")
+    new_file.write_text("new")
+    assert wait_for(lambda: hash_list.get(_digest("new")) == new_file)
+
+    moved_file = Path(directory, "moved.txt")
+    new_file.rename(moved_file)
+    assert wait_for(lambda: hash_list.get(_digest("new")) == moved_file)
+
+    Path(directory, "existing.txt").unlink()
+    assert wait_for(lambda: _digest("existing") not in hash_list)
+
+    Path(directory, "link.txt").hardlink_to(moved_file)
+    moved_file.unlink()
+    assert wait_for(lambda: hash_list.get(_digest("new")) == Path(directory, "link.txt"))
+
+
+def test_watch_new_directories(watched: tuple[Path, dict]):
+    directory, hash_list = watched
+    subdirectory = Path(directory, "sub", "deeper")
+    subdirectory.mkdir(parents=True)
+    time.sleep(0.2)
+    Path(subdirectory, "nested.txt").write_text("nested")
+    assert wait_for(lambda: hash_list.get(_digest("nested")) == Path(subdirectory, "nested.txt"))
+
+    Path(subdirectory, ".bdfr-temp.part").write_text("ignored")
+    Path(directory, "sub").rename(Path(directory, "renamed"))
+    expected = Path(directory, "renamed", "deeper", "nested.txt")
+    assert wait_for(lambda: hash_list.get(_digest("nested")) == expected)
+    assert _digest("ignored") not in hash_list
+
+
+def test_watch_expected_writes(tmp_path: Path):
+    existing = Path(tmp_path, "existing.txt")
+    existing.write_text("existing")
+    hash_list = {_digest("existing"): existing}
+    watcher = IndexWatcher(tmp_path, hash_list)
+    assert watcher._paths == {}
+    (watch,) = watcher._watches
+    expected_file = Path(tmp_path, "expected.txt")
+    watcher.expect(expected_file, _digest("written"))
+    expected_file.touch()
+    watcher._handle_events([(watch, IN_CREATE, "expected.txt")])
+    expected_file.write_text("written")
+    watcher._handle_events([(watch, IN_CLOSE_WRITE, "expected.txt")])
+    assert _digest("written") not in hash_list
+    hash_list[_digest("written")] = expected_file
+    watcher._handle_events([(watch, IN_DELETE, "expected.txt"), (watch, IN_DELETE, "existing.txt")])
+    assert hash_list == {}
+    watcher.stop()
+
+
+class CountingDict(dict):
+    def __init__(self, *args):
+        super(CountingDict, self).__init__(*args)
+        self.scans = 0
+
+    def items(self):
+        self.scans += 1
+        return super(CountingDict, self).items()
+
+
+def test_watch_one_scan_per_batch(tmp_path: Path):
+    hash_list = CountingDict({_digest(str(i)): Path(tmp_path, f"{i}.txt") for i in range(5)})
+    watcher = IndexWatcher(tmp_path, hash_list)
+    (watch,) = watcher._watches
+    Path(tmp_path, "new.txt").write_text("new")
+    watcher._handle_events([(watch, IN_CREATE, "new.txt"), (watch, IN_CLOSE_WRITE, "new.txt")])
+    assert hash_list.scans == 0
+    watcher._handle_events([(watch, IN_DELETE, f"{i}.txt") for i in range(4)] + [(watch, IN_DELETE, "new.txt")])
+    assert hash_list.scans == 1
+    assert dict(hash_list) == {_digest("4"): Path(tmp_path, "4.txt")}
+    watcher.stop()
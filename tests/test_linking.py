@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from bdfr.linking import clone_file, hard_link, reflink, replace_with_link
+
+
+def test_replace_with_hard_link(tmp_path: Path):
+    original = Path(tmp_path, "original")
+    duplicate = Path(tmp_path, "duplicate")
+    original.write_text("content")
+    duplicate.write_text("content")
+    replace_with_link(duplicate, original)
+    assert duplicate.samefile(original)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["duplicate", "original"]
+
+
+def test_replace_with_link_failure_keeps_file(tmp_path: Path):
+    duplicate = Path(tmp_path, "duplicate")
+    duplicate.write_text("content")
+    with pytest.raises(OSError):
+        replace_with_link(duplicate, Path(tmp_path, "missing"))
+    assert duplicate.read_text() == "content"
+    assert [p.name for p in tmp_path.iterdir()] == ["duplicate"]
+
+
+def test_reflink(tmp_path: Path):
+    original = Path(tmp_path, "original")
+    original.write_text("content")
+    clone = Path(tmp_path, "clone")
+    try:
+        reflink(clone, original)
+    except OSError:
+        # Most test filesystems cannot clone, but nothing should be left behind
+        assert not clone.exists()
+    else:
+        assert clone.read_text() == "content"
+        assert not clone.samefile(original)
+
+
+@pytest.mark.parametrize(
+    ("reflink_fails", "hard_link_fails", "expected_kind"),
+    (
+        (False, False, "Reflink"),
+        (True, False, "Hard link"),
+        (True, True, "Copy"),
+    ),
+)
+def test_clone_file_fallback(reflink_fails: bool, hard_link_fails: bool, expected_kind: str, tmp_path: Path):
+    original = Path(tmp_path, "original")
+    original.write_text("content")
+    destination = Path(tmp_path, "destination")
+
+    def fake_link(link_destination: Path, target: Path, fails: bool):
+        if fails:
+            raise OSError("Not supported")
+        link_destination.write_text(target.read_text())
+
+    with patch("bdfr.linking.reflink", lambda d, t: fake_link(d, t, reflink_fails)):
+        with patch("bdfr.linking.hard_link", lambda d, t: fake_link(d, t, hard_link_fails)):
+            assert clone_file(destination, original) == expected_kind
+    assert destination.read_text() == "content"
+
+
+@pytest.mark.parametrize("test_fallback", (False, True))
+def test_clone_file_keeps_existing(test_fallback: bool, tmp_path: Path):
+    original = Path(tmp_path, "original")
+    original.write_text("orig")
+    destination = Path(tmp_path, "destination")
+    destination.write_text("other")
+
+    def fails(_destination: Path, _target: Path):
+        raise OSError("Not supported")
+
+    with patch("bdfr.linking.reflink", fails if test_fallback else reflink):
+        with patch("bdfr.linking.hard_link", fails if test_fallback else hard_link):
+            with pytest.raises(FileExistsError):
+                clone_file(destination, original)
+    assert destination.read_text() == "other"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["destination", "original"]
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import praw.models
+import prawcore
+import pytest
+
+from bdfr.combined_listing import CombinedListing
+from bdfr.connector import RedditConnector
+from bdfr.listing_checkpoints import ListingCheckpoints, listing_key, unwrap_listing
+from bdfr.reddit_instance_pool import RedditInstancePool
+
+PAGES = {None: (["a", "b"], "t3_b"), "t3_b": (["c", "d"], "t3_d"), "t3_d": (["e"], None)}
+
+
+class FakePage:
+    def __init__(self, items: list, after: str):
+        self.items = items
+        self.after = after
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, index: int):
+        return self.items[index]
+
+
+def make_listing(failures: dict, error: type = prawcore.ServerError) -> praw.models.ListingGenerator:
+    def get(_url: str, params: dict) -> FakePage:
+        after = params.get("after")
+        if failures.get(after):
+            failures[after] -= 1
+            raise error(MagicMock(status_code=500))
+        ids, next_after = PAGES[after]
+        return FakePage([MagicMock(id=item_id, spec=praw.models.Submission) for item_id in ids], next_after)
+
+    reddit = MagicMock()
+    reddit.get.side_effect = get
+    return praw.models.ListingGenerator(reddit, "r/test/new", limit=None)
+
+
+@pytest.fixture()
+def connector_mock(tmp_path: Path) -> MagicMock:
+    connector_mock = MagicMock()
+    connector_mock.args.listing_threads = 1
+    connector_mock.download_directory = tmp_path
+    connector_mock.incremental_state = None
+    connector_mock.reddit_pool = None
+    connector_mock.listing_retries = 1
+    connector_mock.listing_checkpoints = ListingCheckpoints(Path(tmp_path, "checkpoints.json"))
+    connector_mock.seen_ids = set()
+    connector_mock.already_seen = lambda item: RedditConnector.already_seen(connector_mock, item)
+    connector_mock._read_source = lambda generator: RedditConnector._read_source(connector_mock, generator)
+    connector_mock._read_sources_concurrently = lambda threads: RedditConnector._read_sources_concurrently(
+        connector_mock, threads
+    )
+    return connector_mock
+
+
+def test_unwrap_listing():
+    listing = make_listing({})
+    assert unwrap_listing(listing) is listing
+    assert unwrap_listing(CombinedListing(listing, ["a", "b"], 1)) is listing
+    assert unwrap_listing([]) is None
+
+
+def test_listing_key_ignores_paging():
+    listing = make_listing({})
+    key = listing_key(listing, Path("/downloads"))
+    listing.params["after"] = "t3_b"
+    listing.params["count"] = 100
+    assert listing_key(listing, Path("/downloads")) == key == "/downloads|r/test/new"
+
+
+def test_checkpoint_round_trip(tmp_path: Path):
+    checkpoints = ListingCheckpoints(Path(tmp_path, "checkpoints.json"))
+    checkpoints.save("key", "t3_b", 2)
+    listing = make_listing({})
+    assert ListingCheckpoints(Path(tmp_path, "checkpoints.json")).restore("key", listing)
+    assert listing.params["after"] == "t3_b"
+    assert listing.yielded == 2
+    checkpoints.clear("key")
+    assert not ListingCheckpoints(Path(tmp_path, "checkpoints.json")).restore("key", make_listing({}))
+
+
+@patch("bdfr.connector.sleep", return_value=None)
+def test_iterate_retries_failed_page(_sleep: MagicMock, connector_mock: MagicMock):
+    connector_mock.reddit_lists = [make_listing({"t3_b": 1})]
+    results = [res.id for res in RedditConnector.iterate_submissions(connector_mock)]
+    assert results == ["a", "b", "c", "d", "e"]
+    assert len(connector_mock.listing_checkpoints.checkpoints) == 0
+
+
+@patch("bdfr.connector.sleep", return_value=None)
+def test_iterate_gives_up_and_resumes(_sleep: MagicMock, connector_mock: MagicMock):
+    connector_mock.reddit_lists = [make_listing({"t3_d": 5})]
+    results = [res.id for res in RedditConnector.iterate_submissions(connector_mock)]
+    assert results == ["a", "b", "c", "d"]
+    assert connector_mock.listing_checkpoints.checkpoints[str(connector_mock.download_directory) + "|r/test/new"] == {
+        "after": "t3_d",
+        "yielded": 4,
+    }
+    connector_mock.seen_ids = set()
+    connector_mock.reddit_lists = [make_listing({})]
+    results = [res.id for res in RedditConnector.iterate_submissions(connector_mock)]
+    assert results == ["e"]
+    assert len(connector_mock.listing_checkpoints.checkpoints) == 0
+
+
+@patch("bdfr.connector.sleep", return_value=None)
+def test_iterate_gives_up_on_lasting_error(sleep: MagicMock, connector_mock: MagicMock):
+    failures = {"t3_b": 5}
+    connector_mock.reddit_lists = [make_listing(failures, prawcore.Forbidden), make_listing({})]
+    results = [res.id for res in RedditConnector.iterate_submissions(connector_mock)]
+    assert results == ["a", "b", "c", "d", "e"]
+    assert failures == {"t3_b": 4}
+    sleep.assert_not_called()
+
+
+@pytest.mark.parametrize("test_threads", (1, 2, 4))
+def test_iterate_concurrently(test_threads: int, connector_mock: MagicMock):
+    connector_mock.args.listing_threads = test_threads
+    sources = [[MagicMock(id=f"{source}{item}") for item in range(50)] for source in "abc"]
+    sources.append([MagicMock(id="a1"), MagicMock(id="zz")])
+    connector_mock.reddit_lists = sources + [make_listing({})]
+    results = [res.id for res in RedditConnector.iterate_submissions(connector_mock)]
+    assert sorted(results) == sorted({item.id for source in sources for item in source} | {"a", "b", "c", "d", "e"})
+    assert len(connector_mock.listing_checkpoints.checkpoints) == 0
+
+
+def test_iterate_concurrently_raises(connector_mock: MagicMock):
+    connector_mock.args.listing_threads = 2
+    broken = MagicMock()
+    broken.__iter__.side_effect = ValueError("broken")
+    connector_mock.reddit_lists = [[MagicMock(id="aaaaaa")], broken]
+    with pytest.raises(ValueError):
+        list(RedditConnector.iterate_submissions(connector_mock))
+
+
+def test_iterate_resumes_after_crash(connector_mock: MagicMock):
+    connector_mock.reddit_lists = [make_listing({})]
+    iterator = RedditConnector.iterate_submissions(connector_mock)
+    assert [next(iterator).id for _ in range(3)] == ["a", "b", "c"]
+    iterator.close()
+    connector_mock.seen_ids = set()
+    connector_mock.reddit_lists = [make_listing({})]
+    results = [res.id for res in RedditConnector.iterate_submissions(connector_mock)]
+    assert results == ["c", "d", "e"]
+
+
+def test_iterate_spreads_pages_across_pool(connector_mock: MagicMock):
+    listing = make_listing({})
+    first_reddit = listing._reddit
+    second_reddit = MagicMock()
+    get = first_reddit.get.side_effect
+    for reddit in (first_reddit, second_reddit):
+        reddit.auth.limits = {"remaining": 600, "reset_timestamp": time.time() + 600, "used": 0}
+
+        def counted_get(url: str, params: dict, reddit: MagicMock = reddit) -> FakePage:
+            # Reddit reports one fewer request remaining after each one made
+            reddit.auth.limits["remaining"] -= 1
+            return get(url, params)
+
+        reddit.get.side_effect = counted_get
+    connector_mock.reddit_pool = RedditInstancePool([first_reddit, second_reddit])
+    connector_mock.reddit_lists = [listing]
+    results = list(RedditConnector.iterate_submissions(connector_mock))
+    assert [res.id for res in results] == ["a", "b", "c", "d", "e"]
+    assert first_reddit.get.call_count + second_reddit.get.call_count == 3
+    assert first_reddit.get.call_count > 0 and second_reddit.get.call_count > 0
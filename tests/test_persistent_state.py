@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+from bdfr.persistent_state import PersistentState
+
+
+def test_persistent_state_round_trip(tmp_path: Path):
+    state_path = Path(tmp_path, "state.json")
+    state = PersistentState(state_path)
+    assert len(state) == 0
+    state["a"] = 1
+    state["b"] = {"c": [1, 2]}
+    state.save()
+    state = PersistentState(state_path)
+    assert dict(state) == {"a": 1, "b": {"c": [1, 2]}}
+    del state["a"]
+    state.save()
+    assert dict(PersistentState(state_path)) == {"b": {"c": [1, 2]}}
+    assert list(tmp_path.iterdir()) == [state_path]
+
+
+def test_persistent_state_corrupt_file(tmp_path: Path):
+    state_path = Path(tmp_path, "state.json")
+    state_path.write_text('{"a": ')
+    state = PersistentState(state_path)
+    assert len(state) == 0
+    state["a"] = 2
+    state.save()
+    assert PersistentState(state_path)["a"] == 2
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+from typing import Optional
+from unittest.mock import MagicMock
+
+import pytest
+
+from bdfr.reddit_instance_pool import RedditInstancePool
+
+
+def make_instance(remaining: Optional[float], reset_timestamp: Optional[float] = None) -> MagicMock:
+    instance = MagicMock()
+    instance.auth.limits = {"remaining": remaining, "reset_timestamp": reset_timestamp, "used": None}
+    return instance
+
+
+def test_pool_requires_instances():
+    with pytest.raises(ValueError):
+        RedditInstancePool([])
+
+
+def test_unused_instances_chosen_in_turn():
+    instances = [make_instance(None) for _ in range(3)]
+    pool = RedditInstancePool(instances)
+    assert [pool.choose() for _ in range(6)] == instances * 2
+
+
+def test_most_remaining_chosen():
+    instances = [make_instance(10, time.time() + 300), make_instance(500, time.time() + 300), make_instance(20)]
+    pool = RedditInstancePool(instances)
+    assert pool.choose() is instances[1]
+    instances[1].auth.limits["remaining"] = 5
+    assert pool.choose() is instances[2]
+
+
+def test_reset_window_counts_as_full():
+    instances = [make_instance(500, time.time() + 300), make_instance(0, time.time() - 1)]
+    pool = RedditInstancePool(instances)
+    assert pool.choose() is instances[1]
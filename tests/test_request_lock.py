@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import praw
+
+from bdfr.request_lock import lock_requests
+
+
+def test_lock_requests():
+    reddit_instance = praw.Reddit(client_id="test", client_secret="test", user_agent="test")
+    active = []
+    overlaps = []
+    counter_lock = threading.Lock()
+
+    def call(request_function, _set_header_callback, *args, **kwargs):
+        with counter_lock:
+            active.append(1)
+            overlaps.append(len(active))
+        time.sleep(0.01)
+        with counter_lock:
+            active.pop()
+        return request_function(*args, **kwargs)
+
+    reddit_instance._core._rate_limiter.call = call
+    lock_requests(reddit_instance)
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda i: reddit_instance._core._rate_limiter.call(lambda: i, dict), range(20)))
+    assert results == list(range(20))
+    assert max(overlaps) == 1
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from unittest.mock import MagicMock
+import hashlib
+from unittest.mock import MagicMock, patch
 
 import pytest
 
+from bdfr.exceptions import ContentMismatchError
 from bdfr.resource import Resource
 
 
@@ -38,3 +40,96 @@ def test_download_online_resource(test_url: str, expected_hash: str):
     test_resource = Resource(MagicMock(), test_url, Resource.retry_download(test_url))
     test_resource.download()
     assert test_resource.hash.hexdigest() == expected_hash
+
+
+@pytest.mark.parametrize(
+    ("test_bytes", "test_extension"),
+    (
+        (b"\xff\xd8\xff\xe0\x00\x10JFIF", ".jpg"),
+        (b"\x89PNG\r\n\x1a\n\x00\x00", ".png"),
+        (b"GIF89a\x01\x00", ".gif"),
+        (b"\x00\x00\x00\x18ftypmp42", ".mp4"),
+        (b"\x00\x00\x00\x18ftypmp42", ".gif"),
+        (b"<!DOCTYPE html><html>", ".txt"),
+        (b"<!DOCTYPE html><html>", None),
+        (b"unrecognised bytes", ".png"),
+    ),
+)
+def test_check_content_accepts(test_bytes: bytes, test_extension: str):
+    Resource.check_content(test_bytes, test_extension)
+
+
+@pytest.mark.parametrize(
+    ("test_bytes", "test_extension"),
+    (
+        (b"<!DOCTYPE html><html>", ".jpg"),
+        (b"\n  <html><head>", ".mp4"),
+        (b'{"error": 404}', ".png"),
+        (b"\x89PNG\r\n\x1a\n\x00\x00", ".mp4"),
+    ),
+)
+def test_check_content_rejects(test_bytes: bytes, test_extension: str):
+    with pytest.raises(ContentMismatchError):
+        Resource.check_content(test_bytes, test_extension)
+
+
+@pytest.mark.parametrize(
+    ("test_content_type", "test_extension", "expected"),
+    (
+        ("text/html; charset=utf-8", ".jpg", True),
+        ("application/json", ".mp4", True),
+        ("image/jpeg", ".jpg", False),
+        ("text/html", ".txt", False),
+        (None, ".jpg", False),
+    ),
+)
+def test_check_content_type(test_content_type: str, test_extension: str, expected: bool):
+    if expected:
+        with pytest.raises(ContentMismatchError):
+            Resource.check_content_type(test_content_type, test_extension)
+    else:
+        Resource.check_content_type(test_content_type, test_extension)
+
+
+@patch("bdfr.resource.requests.get")
+def test_http_download_aborts_on_mismatch(mock_get: MagicMock):
+    response = mock_get.return_value.__enter__.return_value
+    response.status_code = 200
+    response.headers = {"Content-Type": "image/png"}
+    response.iter_content.return_value = iter([b"<html>" + b" " * 1024, b"never read"])
+    with pytest.raises(ContentMismatchError):
+        Resource.http_download("https://example.com/test.png", {"expected_extension": ".png"})
+
+
+@patch("bdfr.resource.requests.get")
+def test_http_download_records_response_info(mock_get: MagicMock):
+    response = mock_get.return_value.__enter__.return_value
+    response.status_code = 200
+    response.headers = {"Content-Type": "image/png", "ETag": '"abc"'}
+    response.iter_content.return_value = iter([b"\x89PNG\r\n\x1a\n" + b"\x00" * 100])
+    test_url = "https://example.com/test.png"
+    test_resource = Resource(MagicMock(), test_url, Resource.retry_download(test_url))
+    test_resource.download()
+    assert test_resource.response_info == {"etag": '"abc"', "size": 108}
+
+
+@pytest.mark.parametrize(
+    ("test_etag", "test_status", "expected"),
+    (
+        ('"abc"', 304, True),
+        ('"abc"', 200, False),
+        (None, 304, False),
+    ),
+)
+@patch("bdfr.resource.requests.get")
+def test_revalidate(mock_get: MagicMock, test_etag: str, test_status: int, expected: bool):
+    mock_get.return_value.__enter__.return_value.status_code = test_status
+    assert Resource.revalidate("https://example.com/test.png", test_etag) == expected
+
+
+def test_placeholder_hash_rejected():
+    test_resource = Resource(MagicMock(), "https://example.com/test.png", lambda _: b"placeholder")
+    test_resource.placeholder_hashes = {hashlib.md5(b"placeholder").hexdigest()}
+    with pytest.raises(ContentMismatchError):
+        test_resource.download()
+    assert test_resource.content is None
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from unittest.mock import MagicMock
+
+import praw.models
+import pytest
+
+from bdfr.configuration import Configuration
+from bdfr.download_index import DownloadIndex
+from bdfr.exceptions import BulkDownloaderException
+from bdfr.file_name_formatter import FileNameFormatter
+from bdfr.scheme_migrator import MigrationEntry, SchemeMigrator
+from bdfr.submission_record import SubmissionRecord
+
+
+@pytest.fixture()
+def submission() -> MagicMock:
+    test = MagicMock()
+    test.title = "name"
+    test.subreddit.display_name = "randomreddit"
+    test.author.name = "person"
+    test.id = "abc123"
+    test.score = 1000
+    test.link_flair_text = "test_flair"
+    test.created_utc = datetime(2021, 4, 21, 9, 30, 0).timestamp()
+    test.__class__ = praw.models.Submission
+    return test
+
+
+@pytest.fixture()
+def migrator_mock(submission: MagicMock, tmp_path: Path) -> MagicMock:
+    migrator_mock = MagicMock()
+    migrator_mock.args = Configuration()
+    migrator_mock.download_directory = tmp_path
+    migrator_mock.file_name_formatter = FileNameFormatter("{POSTID}", "{SUBREDDIT}/{REDDITOR}", "ISO")
+    migrator_mock._submission_cache = {submission.id: submission}
+    migrator_mock._created_directories = set()
+    return migrator_mock
+
+
+@pytest.mark.parametrize(
+    ("test_file_scheme", "test_folder_scheme", "test_path", "expected_id", "expected_index"),
+    (
+        ("{REDDITOR}_{TITLE}_{POSTID}", "{SUBREDDIT}", "pics/person_a title_with_extras_abc123.jpg", "abc123", None),
+        ("{REDDITOR}_{TITLE}_{POSTID}", "{SUBREDDIT}", "pics/person_title_abc123_2.png", "abc123", 2),
+        ("{POSTID}", "{POSTID_SHARD}/{SUBREDDIT}", "0f/pics/abc123.jpg", "abc123", None),
+        ("[{DATE}] {POSTID}", "", "[2021-04-21T09:30:00] abc123_12.mp4", "abc123", 12),
+        ("{REDDITOR}_{TITLE}_{POSTID}", "{SUBREDDIT}", "person_title_abc123.jpg", None, None),
+        ("{POSTID}", "{SUBREDDIT}", "pics/abc123", None, None),
+    ),
+)
+def test_scheme_pattern(
+    test_file_scheme: str,
+    test_folder_scheme: str,
+    test_path: str,
+    expected_id: Optional[str],
+    expected_index: Optional[int],
+):
+    match = SchemeMigrator.scheme_pattern(test_file_scheme, test_folder_scheme).match(test_path)
+    if expected_id is None:
+        assert match is None
+    else:
+        assert match.group("postid") == expected_id
+        assert match.group("index") == (str(expected_index) if expected_index else None)
+
+
+def test_scheme_pattern_requires_postid():
+    with pytest.raises(BulkDownloaderException):
+        SchemeMigrator.scheme_pattern("{TITLE}", "{SUBREDDIT}")
+
+
+@pytest.mark.parametrize(("test_hard_links", "expected_old_exists"), ((False, False), (True, True)))
+def test_migrate_entry(test_hard_links: bool, expected_old_exists: bool, migrator_mock: MagicMock, tmp_path: Path):
+    migrator_mock.args.make_hard_links = test_hard_links
+    old_path = Path(tmp_path, "randomreddit", "person_name_abc123_2.jpg")
+    old_path.parent.mkdir()
+    old_path.write_text("content")
+    entry = MigrationEntry("abc123", old_path, "", 2)
+    result = SchemeMigrator._migrate_entry(migrator_mock, entry)
+    new_path = Path(tmp_path, "randomreddit", "person", "abc123_2.jpg")
+    assert result == (old_path, new_path)
+    assert new_path.read_text() == "content"
+    assert old_path.exists() == expected_old_exists
+    assert SchemeMigrator._migrate_entry(migrator_mock, MigrationEntry("abc123", new_path, "", 2)) is None
+
+
+def test_migrate_entry_conflict(migrator_mock: MagicMock, tmp_path: Path):
+    old_path = Path(tmp_path, "old.jpg")
+    old_path.write_text("old")
+    new_path = Path(tmp_path, "randomreddit", "person", "abc123.jpg")
+    new_path.parent.mkdir(parents=True)
+    new_path.write_text("something else")
+    assert SchemeMigrator._migrate_entry(migrator_mock, MigrationEntry("abc123", old_path, "", None)) is None
+    assert old_path.exists()
+
+
+def test_entries_from_index(migrator_mock: MagicMock, tmp_path: Path):
+    migrator_mock.download_index = DownloadIndex(Path(tmp_path, "downloads.db"))
+    migrator_mock._index_group = SchemeMigrator._index_group
+    migrator_mock.download_index.record_file("bbbbbb", "https://example.com/1", Path(tmp_path, "b1.jpg"))
+    migrator_mock.download_index.record_file("bbbbbb", "https://example.com/2", Path(tmp_path, "b2.jpg"))
+    migrator_mock.download_index.record_file("aaaaaa", "https://example.com/3", Path(tmp_path, "a.jpg"))
+    migrator_mock.download_index.record_file("cccccc", "https://example.com/4", Path("/elsewhere/c.jpg"))
+    entries = list(SchemeMigrator._entries_from_index(migrator_mock))
+    assert entries == [
+        MigrationEntry("aaaaaa", Path(tmp_path, "a.jpg"), "https://example.com/3", None),
+        MigrationEntry("bbbbbb", Path(tmp_path, "b1.jpg"), "https://example.com/1", 1),
+        MigrationEntry("bbbbbb", Path(tmp_path, "b2.jpg"), "https://example.com/2", 2),
+    ]
+
+
+def test_move_files_in_download_index(tmp_path: Path):
+    index = DownloadIndex(Path(tmp_path, "downloads.db"))
+    index.record_file("aaaaaa", "https://example.com/1", Path(tmp_path, "old.jpg"))
+    index.record_url("https://example.com/1", "abc", Path(tmp_path, "old.jpg"))
+    index.move_files([(Path(tmp_path, "old.jpg"), Path(tmp_path, "new.jpg"))])
+    assert index.get_files("aaaaaa") == [("https://example.com/1", Path(tmp_path, "new.jpg"))]
+    assert index.get_url("https://example.com/1").path == Path(tmp_path, "new.jpg")
+
+
+def test_link_files_in_download_index(tmp_path: Path):
+    index = DownloadIndex(Path(tmp_path, "downloads.db"))
+    index.record_file("aaaaaa", "https://example.com/1", Path(tmp_path, "old.jpg"))
+    index.record_file("bbbbbb", "https://example.com/2", Path(tmp_path, "other.jpg"))
+    index.link_files([(Path(tmp_path, "old.jpg"), Path(tmp_path, "new.jpg"))])
+    assert index.get_files("aaaaaa") == [
+        ("https://example.com/1", Path(tmp_path, "old.jpg")),
+        ("https://example.com/1", Path(tmp_path, "new.jpg")),
+    ]
+    assert index.get_files("bbbbbb") == [("https://example.com/2", Path(tmp_path, "other.jpg"))]
+
+
+def test_migrate_entry_moved_before_interruption(migrator_mock: MagicMock, tmp_path: Path):
+    old_path = Path(tmp_path, "old.jpg")
+    new_path = Path(tmp_path, "randomreddit", "person", "abc123.jpg")
+    new_path.parent.mkdir(parents=True)
+    new_path.write_text("content")
+    assert SchemeMigrator._migrate_entry(migrator_mock, MigrationEntry("abc123", old_path, "", None)) == (
+        old_path,
+        new_path,
+    )
+    new_path.unlink()
+    assert SchemeMigrator._migrate_entry(migrator_mock, MigrationEntry("abc123", old_path, "", None)) is None
+    migrator_mock.download_index = None
+    new_path.write_text("content")
+    assert SchemeMigrator._migrate_entry(migrator_mock, MigrationEntry("abc123", old_path, "", None)) is None
+
+
+@pytest.mark.parametrize(
+    ("test_file_scheme", "test_folder_scheme", "expected_requests"),
+    (
+        ("{POSTID}", "{POSTID_SHARD}", 0),
+        ("{POSTID}", "{SUBREDDIT}", 2),
+    ),
+)
+def test_fetch_submissions(
+    test_file_scheme: str,
+    test_folder_scheme: str,
+    expected_requests: int,
+    migrator_mock: MagicMock,
+    submission: MagicMock,
+):
+    migrator_mock.file_name_formatter = FileNameFormatter(test_file_scheme, test_folder_scheme, "ISO")
+    migrator_mock._submission_cache = {}
+    migrator_mock.reddit_instance.info.side_effect = lambda fullnames: [submission]
+    SchemeMigrator._fetch_submissions(migrator_mock, ["abc123"])
+    SchemeMigrator._fetch_submissions(migrator_mock, ["abc123"])
+    SchemeMigrator._fetch_submissions(migrator_mock, ["def456"])
+    assert migrator_mock.reddit_instance.info.call_count == expected_requests
+    # Reddit is asked for def456 but returns the test submission, abc123, in its place
+    assert list(migrator_mock._submission_cache) == (["abc123"] if expected_requests else ["def456"])
+    assert all(isinstance(record, SubmissionRecord) for record in migrator_mock._submission_cache.values())
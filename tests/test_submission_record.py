@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import praw.models
+import pytest
+
+from bdfr.file_name_formatter import FileNameFormatter
+from bdfr.submission_record import SubmissionRecord
+
+
+@pytest.fixture()
+def submission() -> MagicMock:
+    test = MagicMock()
+    test.title = "name"
+    test.subreddit.display_name = "randomreddit"
+    test.author.name = "person"
+    test.id = "12345"
+    test.score = 1000
+    test.upvote_ratio = 0.9
+    test.url = "https://example.com/a.png"
+    test.link_flair_text = "test_flair"
+    test.created_utc = datetime(2021, 4, 21, 9, 30, 0).timestamp()
+    test.__class__ = praw.models.Submission
+    return test
+
+
+def test_from_submission(submission: MagicMock):
+    record = SubmissionRecord.from_submission(submission)
+    assert record.id == "12345"
+    assert record.subreddit == "randomreddit"
+    assert record.author == "person"
+    assert record.score == 1000
+    assert record.url == "https://example.com/a.png"
+    assert not hasattr(record, "__dict__")
+
+
+def test_from_submission_deleted_author(submission: MagicMock):
+    submission.author = None
+    assert SubmissionRecord.from_submission(submission).author is None
+
+
+def test_record_names_match_submission(submission: MagicMock):
+    formatter = FileNameFormatter("{REDDITOR}_{TITLE}_{POSTID}", "{SUBREDDIT}/{FLAIR}", "ISO")
+    record = SubmissionRecord.from_submission(submission)
+    for format_string in ("{REDDITOR}_{TITLE}_{POSTID}_{UPVOTES}_{DATE}", "{SUBREDDIT}_{FLAIR}"):
+        assert formatter._format_name(record, format_string) == formatter._format_name(submission, format_string)
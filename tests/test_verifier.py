@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+from pathlib import Path
+
+import pytest
+
+from bdfr.digest_index import DigestIndex
+from bdfr.exceptions import BulkDownloaderException
+from bdfr.verifier import Verifier
+
+
+@pytest.fixture()
+def library(tmp_path: Path) -> Path:
+    entries = {}
+    for name in ("a", "b", "c", "d"):
+        path = Path(tmp_path, "library", f"{name}.txt")
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(name)
+        entries[hashlib.md5(name.encode("utf-8")).hexdigest()] = path
+    DigestIndex(entries).save(Path(tmp_path, "hashes.idx"))
+    return Path(tmp_path, "library")
+
+
+def test_verify_reports_problems(library: Path, tmp_path: Path):
+    Path(library, "b.txt").unlink()
+    Path(library, "c.txt").write_text("bitrot")
+    Path(library, "extra.txt").write_text("extra")
+    verifier = Verifier(library, Path(tmp_path, "hashes.idx"), threads=2)
+    report = verifier.verify()
+    assert report.verified == 2
+    assert report.missing == [Path(library, "b.txt")]
+    assert report.changed == [Path(library, "c.txt")]
+    assert report.orphaned == [Path(library, "extra.txt")]
+    assert report.problems == 3
+    assert not verifier.state_file.exists()
+
+
+def test_verify_separates_copies(library: Path, tmp_path: Path):
+    Path(library, "linked.txt").hardlink_to(Path(library, "a.txt"))
+    Path(library, "copied.txt").write_text("b")
+    Path(library, "same_size.txt").write_text("e")
+    verifier = Verifier(library, Path(tmp_path, "hashes.idx"), threads=2)
+    report = verifier.verify()
+    assert report.orphaned == [Path(library, "same_size.txt")]
+    assert report.duplicates == [Path(library, "copied.txt"), Path(library, "linked.txt")]
+    assert report.problems == 1
+
+
+def test_verify_resumes(library: Path, tmp_path: Path):
+    verifier = Verifier(library, Path(tmp_path, "hashes.idx"), threads=2)
+    verifier.state_file.write_text(
+        json.dumps({"path": str(Path(library, "a.txt")), "status": "changed"}) + "\n" + '{"path": "trunc'
+    )
+    Path(library, "a.txt").write_text("changed after being checked")
+    report = verifier.verify()
+    assert report.verified == 3
+    assert report.changed == [Path(library, "a.txt")]
+
+
+def test_missing_hash_index(tmp_path: Path):
+    with pytest.raises(BulkDownloaderException):
+        Verifier(tmp_path, Path(tmp_path, "missing.idx"))